@@ -0,0 +1,26 @@
+# config/__init__.py
+
+import os
+import threading
+
+import yaml
+
+SETTINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.yaml")
+
+_settings = None
+_lock = threading.Lock()
+
+
+def load_settings(reload: bool = False) -> dict:
+    """Parse config/settings.yaml once and return it as a plain dict."""
+    global _settings
+    with _lock:
+        if _settings is None or reload:
+            with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
+                _settings = yaml.safe_load(f) or {}
+        return _settings
+
+
+def get_section(name: str) -> dict:
+    """Return one top-level section of the settings (empty dict if missing)."""
+    return load_settings().get(name) or {}
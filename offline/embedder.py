@@ -1,22 +1,145 @@
 # offline/embedder.py
 
+import os
+import sys
 import json
+import hashlib
 from pathlib import Path
+
+import numpy as np
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
 
-def load_chunk_documents(data_dir: str):
+# make sure project root is importable (online/retrieval/)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from config import get_section
+from online.retrieval.chunk_store import ChunkStore
+
+CHUNK_STORE_FILE = "chunks.jsonl"
+
+def iter_chunk_documents(data_dir: str):
     """
-    Reads every chunk_NNNN.json from data/chunks, and
-    returns a list of Document(page_content, metadata) objects.
+    Yields the chunk Documents of data_dir, from the packed store
+    data/chunks.jsonl when it exists, else from the legacy per-chunk
+    data/chunks/chunk_NNNN.json files.
     """
+    store_path = Path(data_dir) / CHUNK_STORE_FILE
+    if store_path.exists():
+        with ChunkStore(str(store_path)) as store:
+            yield from store
+        return
+
     chunks_dir = Path(data_dir) / "chunks"
-    docs = []
     for chunk_file in sorted(chunks_dir.glob("chunk_*.json")):
         payload = json.loads(chunk_file.read_text(encoding="utf-8"))
-        docs.append(
-            Document(
-                page_content=payload["page_content"],
-                metadata=payload["metadata"]
-            )
+        yield Document(
+            page_content=payload["page_content"],
+            metadata=payload["metadata"]
         )
-    return docs
+
+def load_chunk_documents(data_dir: str):
+    """
+    Reads every chunk of data_dir (packed store or data/chunks), and
+    returns a list of Document(page_content, metadata) objects.
+    """
+    return list(iter_chunk_documents(data_dir))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Disk-backed embedding cache in front of another Embeddings object.
+
+    Vectors are keyed by sha256(text) in a per-model directory and stored as
+    float16 rows appended to vectors.f16, with the matching keys appended to
+    keys.txt, so re-indexing after a chunking tweak only embeds text that
+    has actually changed. Every vector handed out is float16-rounded, cached
+    or not, so a build gives the same index whatever the cache held.
+    """
+
+    KEYS_FILE    = "keys.txt"
+    VECTORS_FILE = "vectors.f16"
+
+    def __init__(self, inner: Embeddings, model_name: str, cache_dir: str = "db/embedding_cache"):
+        self.inner = inner
+        self.dir   = os.path.join(cache_dir, model_name.replace("/", "__"))
+        os.makedirs(self.dir, exist_ok=True)
+        self.hits = self.misses = 0
+        self._keys_path    = os.path.join(self.dir, self.KEYS_FILE)
+        self._vectors_path = os.path.join(self.dir, self.VECTORS_FILE)
+        self._load()
+
+    def _load(self):
+        keys = []
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "r", encoding="ascii") as f:
+                keys = [parts for parts in map(str.split, f) if len(parts) == 2]
+        # keys.txt lines are "<sha256> <dim>"; vectors are written before
+        # keys, so an interrupted append leaves at most orphan vector bytes
+        self.dim = int(keys[0][1]) if keys else None
+        self._rows = {key: row for row, (key, _) in enumerate(keys)}
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if self.dim and size // (2 * self.dim) < len(keys):
+            raise ValueError(f"Embedding cache at '{self.dir}' is truncated; delete it to rebuild")
+        if self.dim and size != 2 * self.dim * len(keys):
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(2 * self.dim * len(keys))
+        self._matrix = None
+
+    def _vectors(self):
+        if self._matrix is None and self._rows:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float16, mode="r", shape=(len(self._rows), self.dim)
+            )
+        return self._matrix
+
+    def _append(self, keys, matrix):
+        with open(self._vectors_path, "ab") as f:
+            f.write(matrix.astype(np.float16).tobytes())
+        with open(self._keys_path, "a", encoding="ascii") as f:
+            f.writelines(f"{key} {self.dim}\n" for key in keys)
+        for key in keys:
+            self._rows[key] = len(self._rows)
+        self._matrix = None  # remap to pick up the new rows
+
+    def embed_documents(self, texts):
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self._rows and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        self.hits   += len(texts) - len(missing)
+
+        if missing:
+            fresh = np.asarray(self.inner.embed_documents(list(missing.values())), dtype=np.float32)
+            if self.dim is None:
+                self.dim = int(fresh.shape[1])
+            elif fresh.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {fresh.shape[1]} != cached dim {self.dim}")
+            self._append(list(missing), fresh)
+
+        matrix = self._vectors()
+        return [matrix[self._rows[key]].astype(np.float32).tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+
+def build_embeddings(model_name: str) -> Embeddings:
+    """
+    HuggingFace embeddings configured from the `embedding` settings
+    section: encode batch size, multi-process encoding across CPU cores,
+    and the on-disk cache in front of it all.
+    """
+    cfg = get_section("embedding")
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        encode_kwargs={"batch_size": cfg.get("batch_size", 32)},
+        multi_process=bool(cfg.get("multi_process", False)),
+    )
+    if not cfg.get("cache", True):
+        return embeddings
+    return CachedEmbeddings(embeddings, model_name, cfg.get("cache_dir", "db/embedding_cache"))
@@ -1,17 +1,32 @@
 # offline/indexer.py
 
+import os
+import sys
+import json
+import hashlib
 import warnings
 import shutil
-from pathlib import Path
+from datetime import datetime
+
+import numpy as np
 
 # silence LangChain deprecation notices
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+# make sure project root is importable (config/, online/retrieval/)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
 # use the community packages to avoid deprecation warnings
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 
-from embedder import load_chunk_documents  # your loader for data/chunks
+from config import get_section
+from online.cache import atomic_write_json
+from online.retrieval.numpy_index import NumpyIndexWriter, load_matrix
+from online.retrieval.bm25 import BM25Builder
+from online.retrieval.retriever import resolve_backend, CHROMA_SPACE
+from online.retrieval.versions import resolve_index_dir, new_version_dir, publish
+from embedder import iter_chunk_documents, build_embeddings  # your loader for data/chunks.jsonl
 
 def sanitize_metadata(documents):
     """
@@ -25,35 +40,264 @@ def sanitize_metadata(documents):
     return documents
 
 
+MANIFEST_FILE = "manifest.json"
+ADD_BATCH_SIZE = 256
+
+
+def iter_batches(items, batch_size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_id(doc) -> str:
+    """Content address of a chunk: sha256 over its text and (sorted) metadata."""
+    payload = doc.page_content + "\0" + json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(index_dir: str):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(index_dir: str, backend: str, model_name: str, ids, space: str = None):
+    manifest = {
+        "backend":    backend,
+        "model_name": model_name,
+        "count":      len(ids),
+        "ids":        list(ids),
+        "built_at":   datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    }
+    if space:
+        manifest["space"] = space  # distance function of the vector store
+    atomic_write_json(os.path.join(index_dir, MANIFEST_FILE), manifest)
+
+
+def reusable_manifest(persist_dir: str, backend: str, model_name: str, space: str = None):
+    """The live manifest if it was built with the same backend, model and distance, else None."""
+    manifest = load_manifest(resolve_index_dir(persist_dir))
+    if (
+        manifest and manifest.get("backend") == backend and manifest.get("model_name") == model_name
+        and manifest.get("space") == space
+    ):
+        return manifest
+    return None
+
+
+class IndexBuilder:
+    """
+    Brings one live index in line with a stream of chunk batches.
+
+    add() may be called any number of times (chunks are addressed by content
+    hash, repeats are skipped) and returns the chunks it accepted; commit() deletes chunks that were not seen,
+    writes the manifest and publishes the staged version (see online/retrieval/versions.py).
+    """
+
+    backend = None
+    space   = None
+
+    def __init__(self, persist_dir: str, embeddings, model_name: str):
+        self.persist_dir = persist_dir
+        self.embeddings  = embeddings
+        self.model_name  = model_name
+        self.manifest    = reusable_manifest(persist_dir, self.backend, model_name, self.space)
+        self.old_ids     = self.manifest["ids"] if self.manifest else []
+        self.ids: list   = []
+        self.added       = 0
+        self._seen: set  = set()
+
+    def _accept(self, docs):
+        """Drop repeats; return [(chunk_id, doc), ...] for chunks not seen yet."""
+        fresh = []
+        for doc in docs:
+            cid = chunk_id(doc)
+            if cid in self._seen:
+                continue
+            self._seen.add(cid)
+            self.ids.append(cid)
+            fresh.append((cid, doc))
+        return fresh
+
+    def stale_ids(self):
+        return sorted(set(self.old_ids) - self._seen)
+
+
+class ChromaIndexBuilder(IndexBuilder):
+    """Upserts new chunks into a staged copy of the live Chroma index."""
+
+    backend = "chroma"
+    space   = CHROMA_SPACE
+
+    def __init__(self, persist_dir: str, embeddings, model_name: str):
+        super().__init__(persist_dir, embeddings, model_name)
+        self._old_set = set(self.old_ids)
+        self._staging = None
+        self._db = None
+
+    def _staged_db(self):
+        # copy the live index lazily: a run with no changes never touches disk
+        if self._db is None:
+            self._staging = new_version_dir(self.persist_dir)
+            if self.manifest:
+                shutil.copytree(resolve_index_dir(self.persist_dir), self._staging)
+            self._db = Chroma(
+                persist_directory=self._staging,
+                embedding_function=self.embeddings,
+                collection_metadata={"hnsw:space": self.space},
+            )
+        return self._db
+
+    def add(self, docs):
+        accepted = self._accept(docs)
+        new = [(cid, doc) for cid, doc in accepted if cid not in self._old_set]
+        if new:
+            self._staged_db().add_documents([doc for _, doc in new], ids=[cid for cid, _ in new])
+            self.added += len(new)
+        return [doc for _, doc in accepted]
+
+    def commit(self):
+        stale = self.stale_ids()
+        if self.manifest and not self.added and not stale:
+            return 0, 0
+        db = self._staged_db()
+        if stale:
+            db.delete(ids=stale)
+        self._db = None
+        write_manifest(self._staging, self.backend, self.model_name, self.ids, self.space)
+        publish(self._staging, self.persist_dir)
+        return self.added, len(stale)
+
+
+class NumpyIndexBuilder(IndexBuilder):
+    """
+    Streams rows into a fresh NumPy index, reusing stored vectors for
+    unchanged chunks. The live matrix is only memory-mapped and read row by
+    row (manifest ids give the rows), so reuse costs no more than one batch.
+    """
+
+    backend = "numpy"
+
+    def __init__(self, persist_dir: str, embeddings, model_name: str, dtype: str = "float16"):
+        super().__init__(persist_dir, embeddings, model_name)
+        self._old_rows = {cid: row for row, cid in enumerate(self.old_ids)}
+        self._old_matrix = load_matrix(resolve_index_dir(persist_dir)) if self._old_rows else None
+        if self._old_matrix is not None and self._old_matrix.shape[0] != len(self.old_ids):
+            print(f"⚠️  '{persist_dir}' does not match its manifest; re-embedding every chunk")
+            self._old_rows, self._old_matrix = {}, None
+        self._staging = new_version_dir(persist_dir)
+        self._writer = NumpyIndexWriter(self._staging, dtype=dtype)
+
+    def add(self, docs):
+        accepted = self._accept(docs)
+        if not accepted:
+            return []
+        new = [i for i, (cid, _) in enumerate(accepted) if cid not in self._old_rows]
+        fresh = self.embeddings.embed_documents([accepted[i][1].page_content for i in new]) if new else []
+        fresh = dict(zip(new, fresh))
+        vectors = [
+            fresh[i] if i in fresh else np.asarray(self._old_matrix[self._old_rows[cid]], dtype=np.float32)
+            for i, (cid, _) in enumerate(accepted)
+        ]
+        self._writer.add([doc for _, doc in accepted], vectors)
+        self.added += len(new)
+        return [doc for _, doc in accepted]
+
+    def commit(self):
+        stale = self.stale_ids()
+        self._writer.close(self.model_name)
+        self._old_matrix = None  # release the memory map so a pruned version can be deleted
+        if self.manifest and not self.added and not stale and self.ids == self.old_ids:
+            shutil.rmtree(self._staging, ignore_errors=True)
+            return 0, 0
+        write_manifest(self._staging, self.backend, self.model_name, self.ids)
+        publish(self._staging, self.persist_dir)
+        return self.added, len(stale)
+
+
+def build_indexes(
+    batches,
+    persist_dir: str = None,
+    model_name: str = "multi-qa-mpnet-base-dot-v1",
+    backend: str = None,
+    embeddings=None,
+):
+    """
+    Feed an iterable of chunk batches (lists of Documents) into the BM25 index
+    and the vector index in one pass; returns (chunks, embedded, removed).
+    """
+    cfg = get_section("vector_db")
+    backend, persist_dir = resolve_backend(backend, persist_dir)
+    embeddings = embeddings or build_embeddings(model_name)
+
+    bm25_dir = cfg.get("bm25_dir", "db/bm25_index")
+    bm25_staging = new_version_dir(bm25_dir)
+    bm25 = BM25Builder(bm25_staging)
+
+    if backend == "numpy":
+        vectors = NumpyIndexBuilder(
+            persist_dir, embeddings, model_name, dtype=cfg.get("numpy_dtype", "float16")
+        )
+    else:
+        vectors = ChromaIndexBuilder(persist_dir, embeddings, model_name)
+
+    for batch in batches:
+        accepted = vectors.add(sanitize_metadata(batch))
+        # BM25 rows follow the deduplicated chunk order of the vector index
+        bm25.add(accepted)
+
+    stats = bm25.close()
+    publish(bm25_staging, bm25_dir)
+    print(f"🔤 Built BM25 index over {stats['count']} chunks ({stats['terms']} terms) at '{bm25_dir}'")
+
+    added, removed = vectors.commit()
+    if hasattr(embeddings, "hits"):
+        print(f"🧠 Embedding cache: {embeddings.hits} reused, {embeddings.misses} computed")
+    return len(vectors.ids), added, removed
+
+
 def create_vectorstore(
     data_dir: str,
-    persist_dir: str = "db/chroma_index",
+    persist_dir: str = None,
     model_name: str = "multi-qa-mpnet-base-dot-v1",
+    backend: str = None,
 ):
-    # 0) remove old index if present
-    idx_path = Path(persist_dir)
-    if idx_path.exists():
-        print(f"🗑️  Removing existing index at '{persist_dir}'")
-        shutil.rmtree(persist_dir)
-
-    # 1) Load your pre-chunked JSON docs
-    docs = load_chunk_documents(data_dir)
-    print(f"📄 Loaded {len(docs)} chunk Documents from '{data_dir}/chunks/'")
-
-    # 2) Sanitize metadata
-    docs = sanitize_metadata(docs)
-
-    # 3) Embed & index
-    print(f"🔗 Embedding & indexing {len(docs)} docs with '{model_name}'…")
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
-    vectordb = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory=persist_dir,
+    """
+    Bring the index in line with the chunk store: only new or changed chunks are
+    embedded, vanished ones are deleted, and the result is built as a new
+    version beside the live index and published atomically. Writes either a Chroma index or a
+    compact NumPy index (embeddings.npy + chunks.jsonl), per vector_db.type.
+    """
+    backend, persist_dir = resolve_backend(backend, persist_dir)
+
+    # 1) Stream the pre-chunked docs, never holding more than one batch
+    docs = iter_chunk_documents(data_dir)
+    print(f"📄 Streaming chunk Documents from '{data_dir}'")
+
+    # 2-4) BM25 + embed & upsert only what changed, in fixed-size batches
+    print(f"🔗 Updating {backend} index at '{persist_dir}' with '{model_name}'…")
+    total, added, removed = build_indexes(
+        iter_batches(docs, ADD_BATCH_SIZE), persist_dir, model_name, backend
     )
+    report(persist_dir, total, added, removed)
+
 
-    print(f"✅ Indexed {len(docs)} documents into Chroma at '{persist_dir}'")
+def report(persist_dir: str, total: int, added: int, removed: int):
+    if not added and not removed:
+        print(f"✅ Index at '{persist_dir}' is already up to date ({total} chunks)")
+    else:
+        print(f"✅ Indexed {total} chunks at '{persist_dir}': "
+              f"{added} embedded, {removed} removed, {total - added} reused")
 
 
 if __name__ == "__main__":
-    create_vectorstore("data")
+    # python offline/indexer.py [chroma|numpy]
+    create_vectorstore("data", backend=sys.argv[1] if len(sys.argv) > 1 else None)
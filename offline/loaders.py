@@ -1,50 +1,177 @@
+import os
+import sys
+import time
+import argparse
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
 from pptx import Presentation
 from langchain.schema import Document
 
-def load_documents(data_dir: str) -> list[Document]:
+# make sure project root is importable (config/)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from config import get_section
+
+# ——— Workers (top-level so a process pool can pickle them) ———
+
+def _pymupdf():
+    # optional fast backend; older PyMuPDF releases only ship the `fitz` name
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+
+def _pdf_page_count(path: str, backend: str) -> int:
+    if backend == "pymupdf":
+        with _pymupdf().open(path) as pdf:
+            return pdf.page_count
+    return len(PdfReader(path).pages)
+
+
+def _load_pdf_pages(path: str, start: int, stop: int, backend: str) -> list[Document]:
+    """Text of pages [start, stop) as one Document per page (page numbers 1-based)."""
+    name = Path(path).name
+    if backend == "pymupdf":
+        with _pymupdf().open(path) as pdf:
+            texts = [pdf[i].get_text().strip() for i in range(start, stop)]
+    else:
+        reader = PdfReader(path)
+        # same extraction (and strip) as langchain's PyPDFLoader
+        texts = [(reader.pages[i].extract_text() or "").strip() for i in range(start, stop)]
+    return [
+        Document(page_content=text, metadata={"source": name, "page": start + offset + 1})
+        for offset, text in enumerate(texts)
+    ]
+
+
+def _load_pptx(path: str) -> list[Document]:
+    prs = Presentation(path)
+    ppt_docs: list[Document] = []
+    for slide_idx, slide in enumerate(prs.slides, start=1):
+        texts = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text.strip():
+                texts.append(shape.text.strip())
+        content = "\n".join(texts)
+        metadata = {
+            "source": Path(path).name,
+            "slide_number": slide_idx,
+        }
+        ppt_docs.append(Document(page_content=content, metadata=metadata))
+    return ppt_docs
+
+
+def _run_task(task):
+    kind, path, start, stop, backend = task
+    t0 = time.perf_counter()
+    if kind == "pdf":
+        docs = _load_pdf_pages(path, start, stop, backend)
+    else:
+        docs = _load_pptx(path)
+    return docs, time.perf_counter() - t0
+
+
+# ——— Task planning ———
+
+def _plan_tasks(raw_folder: Path, pdf_backend: str, pages_per_task: int):
     """
-    Scans data_dir/raw for .pdf and .pptx files,
-    loads them into Document objects, and returns a combined list.
+    One task per .pptx and one per page range of each PDF, in a fixed order
+    (PDFs then slides, each sorted by name) so results are deterministic.
     """
-    docs: list[Document] = []
+    tasks = []
+    for pdf_path in sorted(raw_folder.glob("*.pdf")):
+        n_pages = _pdf_page_count(str(pdf_path), pdf_backend)
+        step = max(1, pages_per_task)
+        for start in range(0, n_pages, step):
+            tasks.append(("pdf", str(pdf_path), start, min(start + step, n_pages), pdf_backend))
+    for ppt_path in sorted(raw_folder.glob("*.pptx")):
+        tasks.append(("pptx", str(ppt_path), 0, 0, None))
+    return tasks
+
+
+def _iter_results(tasks, workers: int):
+    """
+    Yield each task's result in task order. In pool mode at most 2×workers
+    tasks are in flight, so parsed pages never pile up faster than they are
+    consumed.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _run_task(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_run_task, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_documents(
+    data_dir: str,
+    workers: int = None,
+    pdf_backend: str = None,
+    pages_per_task: int = None,
+):
+    """
+    Stream page/slide Documents from data_dir/raw in a deterministic order.
+
+    workers > 1 parses files (and page ranges of large PDFs) in a process
+    pool; output order and metadata are the same as with workers=1.
+    pdf_backend is "pypdf" or "pymupdf" (faster). Defaults come from the
+    ingest: section of config/settings.yaml.
+    """
+    cfg = get_section("ingest")
+    workers        = workers or cfg.get("workers", 1)
+    pdf_backend    = pdf_backend or cfg.get("pdf_backend", "pypdf")
+    pages_per_task = pages_per_task or cfg.get("pdf_pages_per_task", 25)
+
     raw_folder = Path(data_dir) / "raw"
+    tasks = _plan_tasks(raw_folder, pdf_backend, pages_per_task)
+
+    # report each file once its last task has been consumed
+    remaining: dict = {}
+    for _, path, *_ in tasks:
+        remaining[path] = remaining.get(path, 0) + 1
+    totals: dict = {}
+    for (kind, path, *_), (task_docs, seconds) in zip(tasks, _iter_results(tasks, workers)):
+        yield from task_docs
+        count, elapsed = totals.get(path, (0, 0.0))
+        totals[path] = (count + len(task_docs), elapsed + seconds)
+        remaining[path] -= 1
+        if not remaining[path]:
+            unit = "pages" if kind == "pdf" else "slides"
+            count, elapsed = totals.pop(path)
+            print(f"Loaded {count} {unit} from {Path(path).name} in {elapsed:.2f}s")
 
-    # ——— Load PDFs via PyPDFLoader ———
-    for pdf_path in raw_folder.glob("*.pdf"):
-        loader = PyPDFLoader(str(pdf_path))
-        pdf_docs = loader.load()
-        for page_num, doc in enumerate(pdf_docs, start=1):
-            # annotate metadata
-            doc.metadata.update({
-                "source": pdf_path.name,
-                "page": page_num,
-            })
-        docs.extend(pdf_docs)
-        print(f"Loaded {len(pdf_docs)} pages from {pdf_path.name}")
-
-    # ——— Load PPTX via python-pptx ———
-    for ppt_path in raw_folder.glob("*.pptx"):
-        prs = Presentation(str(ppt_path))
-        ppt_docs: list[Document] = []
-        for slide_idx, slide in enumerate(prs.slides, start=1):
-            texts = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    texts.append(shape.text.strip())
-            content = "\n".join(texts)
-            metadata = {
-                "source": ppt_path.name,
-                "slide_number": slide_idx,
-            }
-            ppt_docs.append(Document(page_content=content, metadata=metadata))
-        docs.extend(ppt_docs)
-        print(f"Loaded {len(ppt_docs)} slides from {ppt_path.name}")
-
-    return docs
+
+def load_documents(
+    data_dir: str,
+    workers: int = None,
+    pdf_backend: str = None,
+    pages_per_task: int = None,
+) -> list[Document]:
+    """
+    Scans data_dir/raw for .pdf and .pptx files,
+    loads them into Document objects, and returns a combined list.
+    See iter_documents() for the options.
+    """
+    return list(iter_documents(data_dir, workers, pdf_backend, pages_per_task))
 
 if __name__ == "__main__":
-    docs = load_documents("data")
-    print(f"Total documents loaded: {len(docs)}")
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load data/raw into page/slide Documents.")
+    parser.add_argument("--workers", type=int, default=None, help="process-pool size (default: settings.yaml)")
+    parser.add_argument("--pdf-backend", choices=["pypdf", "pymupdf"], default=None)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    docs = load_documents("data", workers=args.workers, pdf_backend=args.pdf_backend)
+    print(f"Total documents loaded: {len(docs)} in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,113 @@
+# offline/pipeline.py
+
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+
+# make sure project root is importable (config/)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from splitter import iter_chunks, persist_chunks
+from indexer import build_indexes, iter_batches, report, resolve_backend
+from config import get_section
+
+_DONE = object()
+
+
+def _put(out_q, item, stop) -> bool:
+    """Put item, waiting while the queue is full; False if the consumer stopped first."""
+    while not stop.is_set():
+        try:
+            out_q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(data_dir, batch_size, out_q, stop, split_kwargs):
+    """Load → group → split → persist on a background thread, one batch at a time."""
+    try:
+        chunks = persist_chunks(iter_chunks(data_dir, **split_kwargs), data_dir)
+        for batch in iter_batches(chunks, batch_size):
+            # blocks while the embedder is behind: this is the backpressure
+            if not _put(out_q, batch, stop):
+                return
+        _put(out_q, _DONE, stop)
+    except BaseException as e:
+        _put(out_q, e, stop)
+
+
+def _consume(out_q):
+    while True:
+        item = out_q.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def run_pipeline(
+    data_dir: str = "data",
+    persist_dir: str = None,
+    model_name: str = "multi-qa-mpnet-base-dot-v1",
+    backend: str = None,
+    batch_size: int = None,
+    queue_size: int = None,
+    **split_kwargs,
+):
+    """
+    Raw files → indexed chunks without materializing the corpus.
+
+    A producer thread streams pages through grouping and splitting (writing
+    data/chunks.jsonl as it goes) into a bounded queue of fixed-size batches; the
+    main thread embeds each batch and writes it to the BM25 and vector
+    indexes. At most queue_size + 2 batches are alive at any time.
+    """
+    cfg = get_section("ingest")
+    batch_size = batch_size or cfg.get("batch_size", 64)
+    queue_size = queue_size or cfg.get("queue_size", 4)
+    backend, persist_dir = resolve_backend(backend, persist_dir)
+
+    out_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce,
+        args=(data_dir, batch_size, out_q, stop, split_kwargs),
+        daemon=True,
+    )
+
+    t0 = time.perf_counter()
+    print(f"🚰 Streaming '{data_dir}/raw' into the {backend} index at '{persist_dir}' "
+          f"(batches of {batch_size}, queue of {queue_size})…")
+    producer.start()
+    try:
+        total, added, removed = build_indexes(_consume(out_q), persist_dir, model_name, backend)
+    finally:
+        stop.set()
+        producer.join(timeout=5)
+    report(persist_dir, total, added, removed)
+    print(f"⏱️  Pipeline finished in {time.perf_counter() - t0:.1f}s")
+    return total, added, removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream data/raw through split → embed → index.")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--queue-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="loader process-pool size")
+    args = parser.parse_args()
+
+    run_pipeline(
+        "data",
+        backend=args.backend,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        workers=args.workers,
+    )
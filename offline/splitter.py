@@ -1,60 +1,92 @@
 # offline/splitter.py
 
-import json
+import os
+import sys
 from pathlib import Path
 
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from loaders import load_documents  # your existing loader
+from loaders import iter_documents  # your existing loader
+
+# make sure project root is importable (online/retrieval/)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from online.retrieval.chunk_store import ChunkStoreWriter
+
+CHUNK_STORE_FILE = "chunks.jsonl"
+
+def iter_grouped_documents(docs, pages_per_chunk=1):
+    """
+    Batch together consecutive page-documents into multi-page Documents,
+    consuming any iterable and holding at most pages_per_chunk pages.
+    With slides, we want 1 slide per chunk.
+    """
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == pages_per_chunk:
+            yield _merge_pages(batch)
+            batch = []
+    if batch:
+        yield _merge_pages(batch)
+
+def _merge_pages(batch):
+    content = "\n\n".join(d.page_content for d in batch)
+    # keep the same metadata grouping
+    sources = [f"{d.metadata['source']} (page {d.metadata.get('page', d.metadata.get('slide_number', '?'))})"
+               for d in batch]
+    return Document(page_content=content, metadata={"sources": sources})
 
 def group_documents(docs, pages_per_chunk=1):
     """
     Batch together consecutive page-documents into multi-page Documents.
     With slides, we want 1 slide per chunk.
     """
-    grouped = []
-    for i in range(0, len(docs), pages_per_chunk):
-        batch = docs[i : i + pages_per_chunk]
-        content = "\n\n".join(d.page_content for d in batch)
-        # keep the same metadata grouping
-        sources = [f"{d.metadata['source']} (page {d.metadata.get('page', d.metadata.get('slide_number', '?'))})"
-                   for d in batch]
-        grouped.append(Document(page_content=content, metadata={"sources": sources}))
-    return grouped
+    return list(iter_grouped_documents(docs, pages_per_chunk))
 
-def split_documents(
+def iter_chunks(
     data_dir: str,
-    pages_per_chunk: int = 1,     # one slide per super-doc
-    chunk_size: int = 600,        # ~600 chars ≈ 1–2 paragraphs
-    chunk_overlap: int = 120      # overlap by ~120 chars (~1–2 sentences)
+    pages_per_chunk: int = 1,
+    chunk_size: int = 600,
+    chunk_overlap: int = 120,
+    **load_kwargs,
 ):
-    # 1. Load every single-page Document
-    docs = load_documents(data_dir)
-
-    # 2. Group N pages into one bigger Document
-    grouped = group_documents(docs, pages_per_chunk=pages_per_chunk)
-
-    # 3. Split each grouped Document into character-based chunks
+    """Stream chunk Documents: load → group → split, one super-doc at a time."""
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
-    chunked_docs = splitter.split_documents(grouped)
+    pages = iter_documents(data_dir, **load_kwargs)
+    for grouped in iter_grouped_documents(pages, pages_per_chunk=pages_per_chunk):
+        yield from splitter.split_documents([grouped])
+
+def persist_chunks(chunks, data_dir: str):
+    """
+    Append each chunk to the packed store data_dir/chunks.jsonl (plus its
+    chunks.idx offset index) as it passes through, yielding it on. The new
+    store replaces the old one only once the stream has been fully consumed.
+    """
+    writer = ChunkStoreWriter(str(Path(data_dir) / CHUNK_STORE_FILE))
+    for doc in chunks:
+        writer.add(doc)
+        yield doc
+    writer.close()
+
+def split_documents(
+    data_dir: str,
+    pages_per_chunk: int = 1,     # one slide per super-doc
+    chunk_size: int = 600,        # ~600 chars ≈ 1–2 paragraphs
+    chunk_overlap: int = 120      # overlap by ~120 chars (~1–2 sentences)
+):
+    # 1-3. Load every single-page Document, group N pages into one bigger
+    #      Document and split each into character-based chunks
+    chunks = iter_chunks(data_dir, pages_per_chunk, chunk_size, chunk_overlap)
 
     # 4. Persist
-    chunks_dir = Path(data_dir) / "chunks"
-    chunks_dir.mkdir(exist_ok=True, parents=True)
-    for idx, doc in enumerate(chunked_docs):
-        payload = {
-            "page_content": doc.page_content,
-            "metadata": doc.metadata
-        }
-        (chunks_dir / f"chunk_{idx:04d}.json").write_text(
-            json.dumps(payload, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
-
-    print(f"Grouped into {len(grouped)} slide-docs; split into {len(chunked_docs)} chunks.")
+    chunked_docs = list(persist_chunks(chunks, data_dir))
+
+    print(f"Split into {len(chunked_docs)} chunks.")
     return chunked_docs
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+# online/janitor.py
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+AUDIO_URL_PREFIX = "/audio/"
+
+
+class AudioJanitor:
+    """
+    Keeps online/temp/audio bounded.
+
+    Upload files (*_in.*) left behind are swept after input_grace seconds.
+    Voiced answers and translations expire after `ttl` unless a session
+    history still links to them, and the directory is held under max_bytes
+    by deleting the oldest files, unreferenced ones first. Sub-directories
+    (the caches under cache/) bound themselves and are never touched, nor
+    are files younger than min_age, which may still be in use. The server
+    never puts cache/ URLs in a history: cached audio is linked to a
+    top-level file first, so the protection here covers all of it.
+    """
+
+    def __init__(
+        self,
+        audio_dir: str,
+        history_dir: str,
+        ttl: float = 24 * 3600,
+        max_bytes: int = 2 * 1024 ** 3,
+        input_grace: float = 600,
+        min_age: float = 120,
+    ):
+        self.audio_dir   = audio_dir
+        self.history_dir = history_dir
+        self.ttl         = ttl
+        self.max_bytes   = max_bytes
+        self.input_grace = input_grace
+        self.min_age     = min_age
+        self._refs: dict = {}   # history file -> (mtime, {audio file names})
+        self._lock = threading.Lock()
+        self.sweeps = 0
+        self.files_removed = self.bytes_removed = 0
+        self.inputs_removed = self.expired = self.over_quota = self.referenced_evicted = 0
+        self.files = self.bytes = 0
+
+    def _remove(self, path: str, counter: str) -> bool:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        with self._lock:
+            self.files_removed += 1
+            self.bytes_removed += size
+            setattr(self, counter, getattr(self, counter) + 1)
+        return True
+
+    # ─ history references ─
+    def referenced(self) -> set:
+        """Names of audio files some session history still links to."""
+        seen, refs = set(), set()
+        for path in glob.glob(os.path.join(self.history_dir, "*", "*.json")):
+            name = os.path.basename(path)
+            if name == "metadata.json" or "." in name[: -len(".json")]:
+                continue   # metadata and <sid>.*.json sidecars
+            seen.add(path)
+            try:
+                mtime = os.path.getmtime(path)
+                cached = self._refs.get(path)
+                if cached is None or cached[0] != mtime:
+                    with open(path, "r", encoding="utf-8") as f:
+                        turns = json.load(f)
+                    cached = (mtime, {
+                        t["audio_url"][len(AUDIO_URL_PREFIX):]
+                        for t in turns
+                        if isinstance(t, dict) and str(t.get("audio_url") or "").startswith(AUDIO_URL_PREFIX)
+                    })
+                    self._refs[path] = cached
+            except (OSError, ValueError) as e:
+                log.warning(f"Janitor could not read history {path}: {e}")
+                continue
+            refs |= cached[1]
+        for path in set(self._refs) - seen:
+            del self._refs[path]   # deleted sessions no longer protect their audio
+        return refs
+
+    # ─ sweeping ─
+    def sweep(self):
+        now = time.time()
+        refs = self.referenced()
+        files = []
+        for entry in os.scandir(self.audio_dir):
+            if not entry.is_file():
+                continue   # cache/ and other self-managed directories
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry.name, entry.path))
+
+        kept = []
+        for mtime, size, name, path in files:
+            age = now - mtime
+            if "_in." in name and age > self.input_grace:
+                self._remove(path, "inputs_removed")
+            elif age > max(self.ttl, self.min_age) and name not in refs:
+                self._remove(path, "expired")
+            else:
+                kept.append((mtime, size, name, path))
+
+        total = sum(size for _, size, _, _ in kept)
+        if self.max_bytes and total > self.max_bytes:
+            # oldest first, files a history still links to last
+            for mtime, size, name, path in sorted(kept, key=lambda f: (f[2] in refs, f[0])):
+                if total <= self.max_bytes:
+                    break
+                if now - mtime < self.min_age:
+                    continue
+                if self._remove(path, "over_quota"):
+                    total -= size
+                    kept.remove((mtime, size, name, path))
+                    if name in refs:
+                        self.referenced_evicted += 1
+            if total > self.max_bytes:
+                log.warning(f"Audio dir still over quota after sweep ({total} > {self.max_bytes} bytes)")
+
+        with self._lock:
+            self.files, self.bytes = len(kept), total
+            self.sweeps += 1
+
+    async def run(self, interval: float = 300):
+        """Sweep every `interval` seconds, off the event loop."""
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                log.error(f"Audio janitor sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "files":              self.files,
+            "bytes":              self.bytes,
+            "max_bytes":          self.max_bytes,
+            "sweeps":             self.sweeps,
+            "files_removed":      self.files_removed,
+            "bytes_removed":      self.bytes_removed,
+            "inputs_removed":     self.inputs_removed,
+            "expired":            self.expired,
+            "over_quota":         self.over_quota,
+            "referenced_evicted": self.referenced_evicted,
+        }
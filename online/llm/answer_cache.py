@@ -0,0 +1,246 @@
+# online/llm/answer_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from online.cache import atomic_write_json, link_or_copy
+
+log = logging.getLogger(__name__)
+
+ENTRIES_FILE = "entries.json"
+VECTORS_FILE = "vectors.npy"
+
+
+def chunk_key(chunks) -> str:
+    """Order-independent fingerprint of the retrieved chunk set."""
+    digests = sorted(
+        hashlib.sha1(chunk.page_content.encode("utf-8")).hexdigest() for chunk in chunks
+    )
+    return hashlib.sha1("|".join(digests).encode("ascii")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Semantic cache of finished answers (text, citation and rendered audio).
+
+    A lookup hits when a stored question has the same language and the same
+    retrieved chunk set, and its embedding is within `similarity` (cosine) of
+    the new question. Entries expire after `ttl` seconds and the least
+    recently used ones are evicted beyond `max_entries`. Everything lives in
+    cache_dir: entries.json, vectors.npy (row-aligned) and the audio files.
+
+    Changes are written back by a timer thread at most every
+    `flush_interval` seconds (and by save()), never by lookup() or store(),
+    so callers only pay for the in-memory update.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        max_entries: int = 500,
+        similarity: float = 0.92,
+        ttl: float = 30 * 24 * 3600,
+        flush_interval: float = 5.0,
+    ):
+        self.cache_dir   = cache_dir
+        self.model_name  = model_name
+        self.max_entries = max_entries
+        self.similarity  = similarity
+        self.ttl         = ttl
+        self.flush_interval = flush_interval
+        self.hits   = 0
+        self.misses = 0
+        self._entries: list = []
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # one writer at a time
+        self._timer = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    # ─ persistence ─
+    def _load(self):
+        entries_path = os.path.join(self.cache_dir, ENTRIES_FILE)
+        vectors_path = os.path.join(self.cache_dir, VECTORS_FILE)
+        if not (os.path.exists(entries_path) and os.path.exists(vectors_path)):
+            return
+        try:
+            with open(entries_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            vectors = np.load(vectors_path)
+        except Exception as e:
+            log.error(f"Answer cache at '{self.cache_dir}' is unreadable ({e}), starting empty.")
+            return
+        entries = payload.get("entries", [])
+        if not entries:
+            return
+        if payload.get("model_name") != self.model_name or len(entries) != len(vectors):
+            log.info("Answer cache was built with another embedding model, starting empty.")
+            return
+        self._entries, self._vectors = entries, vectors.astype(np.float32)
+        self._expire(time.time())
+
+    def save(self):
+        """Write entries.json and vectors.npy now, each through a temp file and os.replace."""
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                entries = [dict(e) for e in self._entries]
+                vectors = self._vectors
+            self._write(entries, vectors)
+
+    def _write(self, entries, vectors):
+        if vectors is None:
+            vectors = np.zeros((0, 0), np.float32)
+        tmp = os.path.join(self.cache_dir, VECTORS_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp, os.path.join(self.cache_dir, VECTORS_FILE))
+        atomic_write_json(
+            os.path.join(self.cache_dir, ENTRIES_FILE),
+            {"model_name": self.model_name, "entries": entries},
+        )
+
+    def _schedule_save(self):
+        """Arm the write-back timer (call with self._lock held)."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        try:
+            self.save()
+        except Exception as e:
+            log.error(f"Answer cache write-back to '{self.cache_dir}' failed: {e}")
+
+    # ─ eviction ─
+    def _drop(self, rows):
+        rows = set(rows)
+        if not rows:
+            return
+        for row in rows:
+            path = self.audio_path(self._entries[row])
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        keep = [i for i in range(len(self._entries)) if i not in rows]
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+    def _expire(self, now: float):
+        if self.ttl:
+            self._drop(i for i, e in enumerate(self._entries) if now - e["created"] > self.ttl)
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            by_age = sorted(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+            self._drop(by_age[:overflow])
+
+    # ─ public API ─
+    def audio_path(self, entry: dict):
+        """The entry's cached audio file, or None when it has none or the file is gone."""
+        if not entry.get("audio_file"):
+            return None
+        path = os.path.join(self.cache_dir, entry["audio_file"])
+        return path if os.path.exists(path) else None
+
+    def copy_audio(self, entry: dict, target: str):
+        """
+        Link (or copy) the entry's audio to target, a file the caller owns, so
+        evicting the entry cannot break a URL already handed out. Returns
+        target, or None when the cached audio is gone. Blocking.
+        """
+        path = self.audio_path(entry)
+        if path is None:
+            return None
+        try:
+            link_or_copy(path, target)
+        except OSError as e:
+            log.error(f"Copying cached audio '{path}' failed: {e}")
+            return None
+        return target
+
+    def lookup(self, vector, lang: str, chunks):
+        """Return the cached entry for a near-duplicate question, or None."""
+        key = chunk_key(chunks)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        now = time.time()
+        with self._lock:
+            rows = [
+                i for i, e in enumerate(self._entries)
+                if e["lang"] == lang and e["chunk_key"] == key
+                and (not self.ttl or now - e["created"] <= self.ttl)
+            ]
+            if rows:
+                scores = self._vectors[rows] @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    entry = self._entries[rows[best]]
+                    entry["last_used"] = now
+                    entry["hits"] = entry.get("hits", 0) + 1
+                    self.hits += 1
+                    self._schedule_save()
+                    return dict(entry)
+            self.misses += 1
+            return None
+
+    def store(self, vector, question: str, lang: str, chunks, answer: str, citation: str, audio_path: str = None):
+        """
+        Remember a generated answer; the audio file is linked or copied into
+        the cache. Blocking (file copy): async callers use asyncio.to_thread.
+        """
+        entry_id = uuid.uuid4().hex
+        audio_file = None
+        if audio_path and os.path.exists(audio_path):
+            audio_file = f"{entry_id}{os.path.splitext(audio_path)[1]}"
+            link_or_copy(audio_path, os.path.join(self.cache_dir, audio_file))
+
+        vec = np.asarray(vector, dtype=np.float32)
+        vec = vec / (np.linalg.norm(vec) or 1.0)
+        now = time.time()
+        entry = {
+            "id":         entry_id,
+            "question":   question,
+            "lang":       lang,
+            "chunk_key":  chunk_key(chunks),
+            "answer":     answer,
+            "citation":   citation,
+            "audio_file": audio_file,
+            "created":    now,
+            "last_used":  now,
+            "hits":       0,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self._vectors = vec[None, :] if self._vectors is None else np.vstack([self._vectors, vec])
+            self._expire(now)
+            self._schedule_save()
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._drop(range(len(self._entries)))
+        self.save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size":     len(self._entries),
+            "maxsize":  self.max_entries,
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
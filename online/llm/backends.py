@@ -0,0 +1,108 @@
+# online/llm/backends.py
+
+import asyncio
+import hashlib
+import re
+from typing import AsyncIterator
+
+
+class LLMBackend:
+    """
+    What the serving path needs from a language model: a blocking call,
+    an async call and an async token stream, all taking a plain prompt.
+
+    Only invoke() is required. ainvoke() runs it in a worker thread and
+    astream() yields the whole ainvoke() result as one token; backends
+    override either when the model offers something better.
+    """
+
+    name = None
+
+    def invoke(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.invoke, prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        yield await self.ainvoke(prompt)
+
+
+class OllamaBackend(LLMBackend):
+    """A local Ollama model through langchain-ollama."""
+
+    name = "ollama"
+
+    def __init__(self, model: str = "llama3.1:8b", temperature: float = 0, base_url: str = None, **_):
+        from langchain_ollama import OllamaLLM
+
+        kwargs = {"model": model, "temperature": temperature}
+        if base_url:
+            kwargs["base_url"] = base_url
+        self.model = model
+        self.llm = OllamaLLM(**kwargs)
+
+    def invoke(self, prompt: str) -> str:
+        return self.llm.invoke(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await self.llm.ainvoke(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        async for token in self.llm.astream(prompt):
+            yield token
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic offline stand-in: the same prompt always produces the same
+    few sentences, streamed word by word with an optional per-token delay,
+    so the serving path (scheduling, streaming, TTS pipelining, caches) can
+    be exercised without a model.
+    """
+
+    name = "fake"
+
+    QUESTION_RE = re.compile(r"Student's new question:\s*(.+)")
+
+    def __init__(self, delay: float = 0.0, **_):
+        self.delay = delay
+
+    def respond(self, prompt: str) -> str:
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        match = self.QUESTION_RE.search(prompt)
+        lines = prompt.strip().splitlines()
+        topic = (match.group(1) if match else lines[-1] if lines else "nothing").strip()
+        return (
+            f"This is an offline answer about {topic.rstrip('?.! ')}. "
+            f"It comes from the fake backend and is identical for identical prompts. "
+            f"Reference {digest}."
+        )
+
+    def invoke(self, prompt: str) -> str:
+        return self.respond(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        await asyncio.sleep(self.delay)
+        return self.respond(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        words = self.respond(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+BACKENDS = {
+    OllamaBackend.name: OllamaBackend,
+    FakeBackend.name:   FakeBackend,
+}
+
+
+def create_backend(cfg: dict) -> LLMBackend:
+    """Instantiate the backend named by llm.backend in settings.yaml (default: ollama)."""
+    name = cfg.get("backend", "ollama")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown llm.backend '{name}' (expected one of {sorted(BACKENDS)})")
+    options = {k: v for k, v in cfg.items() if k != "backend"}
+    return BACKENDS[name](**options)
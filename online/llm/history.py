@@ -0,0 +1,151 @@
+# online/llm/history.py
+
+import os
+import sys
+import json
+import asyncio
+import logging
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from online.cache import atomic_write_json
+from online.llm.inference import complete
+from online.llm.scheduler import SUMMARY
+
+log = logging.getLogger(__name__)
+
+SUMMARY_SUFFIX = ".summary.json"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough llama-style token count: ~4 Latin characters per token, ~2 Arabic."""
+    text = text or ""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def summary_path(hist_path: str) -> str:
+    """<sid>.json -> <sid>.summary.json, next to the session file."""
+    return hist_path[: -len(".json")] + SUMMARY_SUFFIX
+
+
+class HistoryManager:
+    """
+    Keeps the prompt's conversation history bounded.
+
+    The most recent turns go into the prompt verbatim, at most max_turns
+    of them and within token_budget; everything older is represented by a
+    rolling summary stored beside the session file. The summary records how
+    many turns it covers and is extended in the background with only the
+    turns that have since fallen out of the verbatim window.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 8,
+        token_budget: int = 1200,
+        summarize: bool = True,
+        min_fold: int = 4,
+        timeout: float = 60,
+    ):
+        self.max_turns    = max_turns
+        self.token_budget = token_budget
+        self.summarize    = summarize
+        self.min_fold     = min_fold
+        self.timeout      = timeout
+        self._busy: set   = set()
+
+    def window_start(self, turns) -> int:
+        """Index of the first turn that still fits the verbatim window."""
+        start, used = len(turns), 0
+        while start > 0 and len(turns) - start < self.max_turns:
+            cost = estimate_tokens(turns[start - 1].get("text", ""))
+            if used + cost > self.token_budget:
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def load_summary(self, hist_path: str) -> dict:
+        path = summary_path(hist_path)
+        if not os.path.exists(path):
+            return {"summary": "", "covered": 0}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {"summary": "", "covered": 0}
+
+    def load_turns(self, hist_path: str):
+        """The saved session turns, or None when there is no readable session file."""
+        if not hist_path or not os.path.exists(hist_path):
+            return None
+        try:
+            with open(hist_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def context(self, hist_path: str, turns):
+        """
+        Return (summary_text, recent_turns) to put in the prompt. The saved
+        session is the source of truth when it exists (the summary's covered
+        count indexes it), and turns that left the window but are not folded
+        yet stay verbatim. Without one (a new session) the client's turns are
+        cut to the window, since nothing of them can be summarized.
+        """
+        saved = self.load_turns(hist_path)
+        turns = list(saved if saved is not None else turns or [])
+        start = self.window_start(turns)
+        if start == 0:
+            return "", turns
+        if saved is None or not self.summarize:
+            return "", turns[start:]
+        state = self.load_summary(hist_path)
+        covered = min(state.get("covered", 0), len(turns))
+        return state.get("summary", ""), turns[min(start, covered):]
+
+    async def refresh(self, hist_path: str):
+        """
+        Fold turns that have left the verbatim window into the summary. Runs
+        after an answer is saved; a session is only refreshed by one task at
+        a time, and nothing happens until min_fold new turns have aged out.
+        """
+        if not self.summarize or hist_path in self._busy:
+            return
+        turns = self.load_turns(hist_path)
+        if turns is None:
+            return
+        self._busy.add(hist_path)
+        try:
+            state = self.load_summary(hist_path)
+            covered = min(state.get("covered", 0), len(turns))
+            # the next question will see these turns as its prior history
+            start = self.window_start(turns)
+            if start - covered < self.min_fold:
+                return
+            summary = await self._fold(state.get("summary", ""), turns[covered:start])
+            atomic_write_json(summary_path(hist_path), {"summary": summary, "covered": start})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"History summary update failed for {hist_path}: {e}")
+        finally:
+            self._busy.discard(hist_path)
+
+    async def _fold(self, summary: str, turns) -> str:
+        lines = [
+            f"{'Student' if t.get('role') == 'user' else 'Tutor'}: {t.get('text', '')}"
+            for t in turns
+        ]
+        prompt = (
+            "You maintain a running summary of a tutoring conversation. "
+            "Update the summary with the new turns below. Keep the topics asked about, "
+            "key facts explained and any open questions, in at most 120 words. "
+            "Write it in the language the conversation is in. Only return the summary.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            "New turns:\n" + "\n".join(lines) + "\n\nUpdated summary:"
+        )
+        return await complete(prompt, SUMMARY, timeout=self.timeout)
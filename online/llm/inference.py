@@ -1,31 +1,65 @@
 import os
 import sys
-from typing import Tuple
+from typing import AsyncIterator, Tuple
 
 # make sure project root is importable
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 sys.path.insert(0, project_root)
 
-from langchain_ollama import OllamaLLM  
 from online.retrieval.retriever import get_relevant_chunks
+from online.llm.backends import create_backend
+from online.llm.scheduler import LLMScheduler, SingleFlight, INTERACTIVE
+from config import get_section
+
+llm_cfg = get_section("llm")
+
+# instantiate your LLM backend (llm.backend: ollama | fake)
+llm = create_backend({
+    **(llm_cfg.get("backend_options") or {}),
+    "backend":     llm_cfg.get("backend", "ollama"),
+    "model":       llm_cfg.get("model", "llama3.1:8b"),
+    "temperature": llm_cfg.get("temperature", 0),
+})
+
+# every async LLM call goes through here: capped concurrency, priorities, deadlines
+scheduler = LLMScheduler(
+    max_concurrent=llm_cfg.get("max_concurrent", 1),
+    timeout=llm_cfg.get("timeout", 120),
+)
+
+# concurrent identical prompts share one generation
+inflight = SingleFlight()
+COALESCE = llm_cfg.get("coalesce", True)
+
+async def complete(prompt: str, priority: int, timeout: float = None, abandon=None) -> str:
+    """Run one prompt on the LLM without blocking the event loop; returns the stripped text."""
+    call = lambda: scheduler.run(priority, lambda: llm.ainvoke(prompt), timeout=timeout)
+    if COALESCE:
+        text = await inflight.do(prompt, call, abandon=abandon)
+    else:
+        text = await scheduler.run(priority, lambda: llm.ainvoke(prompt), timeout=timeout, abandon=abandon)
+    return text.strip()
 
-# instantiate your local LLM
-llm = OllamaLLM(model="llama3.1:8b", temperature=0)
+def complete_stream(prompt: str, priority: int, timeout: float = None):
+    """Async token stream for one prompt, shared with identical concurrent prompts."""
+    make_stream = lambda: scheduler.stream(priority, lambda: llm.astream(prompt), timeout=timeout)
+    return inflight.stream(prompt, make_stream) if COALESCE else make_stream()
 
-def generate_answer(
+NO_ANSWER = "Sorry, I don’t know."
+
+def build_prompt(
     chunks,
     question: str,
     chat_history=None,
-    target_lang: str = "en"
-) -> Tuple[str, str]:
+    target_lang: str = "en",
+    summary: str = ""
+) -> str:
     """
-    Returns (answer_text, citation_text).
+    The tutor prompt for a question over its retrieved chunks.
     target_lang: "en" or "ar"
     chat_history: list of dicts [{"role":"user"|"bot","text":...}]
+    summary: rolling summary of turns older than chat_history, if any
     """
-    if not chunks:
-        return "Sorry, I don’t know.", ""
-
     # Build context from chunks
     context = "\n".join(f"- {chunk.page_content.strip()}" for chunk in chunks)
 
@@ -37,6 +71,8 @@ def generate_answer(
             prefix = "Student:" if turn.get("role") == "user" else "Tutor:"
             lines.append(f"{prefix} {turn.get('text')}")
         history_str = "\n".join(lines)
+    if summary:
+        history_str = f"(Earlier, in summary: {summary})\n{history_str}".strip()
 
     # Instruction based on target language
     if target_lang == "ar":
@@ -45,7 +81,7 @@ def generate_answer(
         instr = "Answer (in English only):"
 
     # Construct prompt
-    prompt_text = f"""
+    return f"""
 You are a knowledgeable AI tutor. Use only the information in the bullets below to answer the student's question.
 Restate or summarize as needed, but do not introduce new concepts.
 
@@ -60,11 +96,8 @@ Student's new question: {question}
 {instr}
 """.strip()
 
-    # Call LLM
-    response = llm.generate([prompt_text])
-    answer = response.generations[0][0].text.strip()
-
-    # Build citations from chunk metadata
+def format_citations(chunks) -> str:
+    """Build citations from chunk metadata, one "- source (page N)" line each."""
     sources = []
     for chunk in chunks:
         md = chunk.metadata
@@ -77,9 +110,60 @@ Student's new question: {question}
             src = f"{md.get('source')} (page {md.get('page')})"
             if src not in sources:
                 sources.append(src)
-    citation_text = "\n".join(f"- {s}" for s in sources)
+    return "\n".join(f"- {s}" for s in sources)
+
+def generate_answer(
+    chunks,
+    question: str,
+    chat_history=None,
+    target_lang: str = "en"
+) -> Tuple[str, str]:
+    """
+    Returns (answer_text, citation_text).
+    target_lang: "en" or "ar"
+    chat_history: list of dicts [{"role":"user"|"bot","text":...}]
+    """
+    if not chunks:
+        return NO_ANSWER, ""
+
+    # Call LLM
+    prompt_text = build_prompt(chunks, question, chat_history, target_lang)
+    answer = llm.invoke(prompt_text).strip()
+
+    return answer, format_citations(chunks)
 
-    return answer, citation_text
+async def agenerate_answer(
+    chunks,
+    question: str,
+    chat_history=None,
+    target_lang: str = "en",
+    abandon=None,
+    summary: str = ""
+) -> Tuple[str, str]:
+    """Async generate_answer, queued as an interactive call on the scheduler."""
+    if not chunks:
+        return NO_ANSWER, ""
+    prompt_text = build_prompt(chunks, question, chat_history, target_lang, summary)
+    answer = await complete(prompt_text, INTERACTIVE, abandon=abandon)
+    return answer, format_citations(chunks)
+
+async def stream_answer(
+    chunks,
+    question: str,
+    chat_history=None,
+    target_lang: str = "en",
+    summary: str = ""
+) -> AsyncIterator[str]:
+    """
+    Streaming twin of generate_answer: yields answer text pieces as the
+    LLM produces them. Citations come from format_citations(chunks).
+    """
+    if not chunks:
+        yield NO_ANSWER
+        return
+    prompt_text = build_prompt(chunks, question, chat_history, target_lang, summary)
+    async for token in complete_stream(prompt_text, INTERACTIVE):
+        yield token
 
 
 if __name__ == "__main__":
@@ -0,0 +1,268 @@
+# online/llm/scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+
+log = logging.getLogger(__name__)
+
+# lower value = served first
+INTERACTIVE = 0   # /chat/, /ask/ answers
+TRANSLATE   = 1   # /translate/
+TITLE       = 2   # session auto-titles
+SUMMARY     = 3   # rolling history summaries
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", TRANSLATE: "translate", TITLE: "title", SUMMARY: "summary"}
+
+
+class LLMScheduler:
+    """
+    Bounded-concurrency gate in front of the LLM.
+
+    At most max_concurrent calls run at once; the rest wait in a priority
+    queue (interactive answers, then translations, titles and history
+    summaries, FIFO within a priority). Every call has a deadline, and a
+    call whose waiter goes away (client disconnect, task cancellation)
+    gives its slot back.
+    """
+
+    def __init__(self, max_concurrent: int = 1, timeout: float = 120.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.timeout = timeout
+        self._active = 0
+        self._waiters: list = []   # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self.completed = self.timeouts = self.cancelled = self.failed = 0
+
+    # ─── slots ───
+    async def _acquire(self, priority: int):
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just as we were cancelled: pass it on
+                self._release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)   # the slot moves straight to the next waiter
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE):
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # ─── calls ───
+    async def run(self, priority: int, call, timeout: float = None, abandon=None):
+        """
+        Await call() (a coroutine factory) under a slot and a deadline that
+        covers queueing and generation. If the awaitable made by abandon()
+        finishes first (e.g. the client disconnected), the call is cancelled
+        and asyncio.CancelledError is raised.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        async def guarded():
+            async with self.slot(priority):
+                return await call()
+
+        task = asyncio.ensure_future(asyncio.wait_for(guarded(), timeout))
+        watcher = asyncio.ensure_future(abandon()) if abandon is not None else None
+        try:
+            if watcher is not None:
+                await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)  # slot is free on return
+                    self.cancelled += 1
+                    log.info(f"LLM call ({PRIORITY_NAMES.get(priority, priority)}) abandoned by client")
+                    raise asyncio.CancelledError()
+            result = await task
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+        self.completed += 1
+        return result
+
+    async def stream(self, priority: int, make_stream, timeout: float = None):
+        """
+        Iterate make_stream() (an async-iterator factory) under a slot. The
+        deadline covers queueing and the whole stream; closing the consumer
+        (client disconnect) frees the slot.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            await asyncio.wait_for(self._acquire(priority), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        try:
+            it = make_stream().__aiter__()
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    item = await asyncio.wait_for(it.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                yield item
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, fut in self._waiters:
+            if not fut.done():
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active":         self._active,
+            "waiting":        waiting,
+            "completed":      self.completed,
+            "timeouts":       self.timeouts,
+            "cancelled":      self.cancelled,
+            "failed":         self.failed,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests into one in-flight call.
+
+    The first caller for a key starts the call as its own task; callers
+    arriving while it runs share its result (or, for streams, replay its
+    tokens from the start and follow along). The shared call is cancelled
+    only when every caller has gone away, so one disconnecting client
+    does not fail the others.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self._streams: dict = {}
+        self.leaders = self.coalesced = 0
+
+    async def do(self, key, make_call, abandon=None):
+        """Await make_call() (a coroutine factory), shared with concurrent callers of key."""
+        call = self._calls.get(key)
+        if call is None:
+            call = {"task": asyncio.ensure_future(make_call()), "waiters": 0}
+            self._calls[key] = call
+            call["task"].add_done_callback(lambda _, key=key, call=call: self._forget(self._calls, key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        task = call["task"]
+        call["waiters"] += 1
+        watcher = asyncio.ensure_future(abandon()) if abandon is not None else None
+        try:
+            if watcher is not None:
+                await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not task.done():
+                    raise asyncio.CancelledError()
+            return await asyncio.shield(task)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not task.done():
+                task.cancel()
+
+    async def stream(self, key, make_stream):
+        """Iterate make_stream() (an async-iterator factory), shared with concurrent callers of key."""
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = {"items": [], "done": False, "error": None,
+                      "changed": asyncio.Event(), "listeners": 0}
+            shared["task"] = asyncio.ensure_future(self._pump(shared, make_stream))
+            shared["task"].add_done_callback(lambda _, key=key, s=shared: self._forget(self._streams, key, s))
+            self._streams[key] = shared
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        shared["listeners"] += 1
+        try:
+            i = 0
+            while True:
+                while i < len(shared["items"]):
+                    yield shared["items"][i]
+                    i += 1
+                if shared["done"]:
+                    if shared["error"] is not None:
+                        raise shared["error"]
+                    return
+                changed = shared["changed"]
+                await changed.wait()
+        finally:
+            shared["listeners"] -= 1
+            if shared["listeners"] == 0 and not shared["task"].done():
+                shared["task"].cancel()
+
+    @staticmethod
+    async def _pump(shared, make_stream):
+        try:
+            async for item in make_stream():
+                shared["items"].append(item)
+                changed, shared["changed"] = shared["changed"], asyncio.Event()
+                changed.set()
+        except asyncio.CancelledError:
+            shared["error"] = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            shared["error"] = e
+        finally:
+            shared["done"] = True
+            shared["changed"].set()
+
+    @staticmethod
+    def _forget(table: dict, key, entry):
+        if table.get(key) is entry:
+            del table[key]
+
+    def stats(self) -> dict:
+        return {
+            "leaders":   self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
@@ -0,0 +1,136 @@
+# online/llm/titles.py
+
+import os
+import sys
+import json
+import asyncio
+import logging
+from collections import Counter
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from online.cache import atomic_write_json
+from online.retrieval.normalize import tokenize
+from online.llm.inference import complete
+from online.llm.scheduler import TITLE
+
+log = logging.getLogger(__name__)
+
+TITLE_SUFFIX = ".title.json"
+
+
+def title_state_path(hist_path: str) -> str:
+    """<sid>.json -> <sid>.title.json, next to the session file."""
+    return hist_path[: -len(".json")] + TITLE_SUFFIX
+
+
+def topic_keywords(turns, top_n: int = 12) -> list:
+    """Most frequent content words of the student's messages: a cheap topic fingerprint."""
+    counts = Counter()
+    for turn in turns:
+        if turn.get("role") == "user":
+            counts.update(tokenize(turn.get("text", "")))
+    return [word for word, _ in counts.most_common(top_n)]
+
+
+def overlap(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+class SessionTitler:
+    """
+    Background session titles from a bounded window of messages.
+
+    A session is first titled once it has min_messages messages, from its
+    first `window` messages. After that it is only looked at again every
+    recheck_every new messages, and retitled (from those new messages, at
+    most `window` of them) only if their topic keywords overlap the titled
+    ones by less than topic_overlap. Titles a user set by hand are never overwritten.
+    A forced refresh (an explicit request) skips all of that and titles
+    the latest window. State lives beside the session file in <sid>.title.json.
+    """
+
+    def __init__(
+        self,
+        min_messages: int = 3,
+        window: int = 6,
+        recheck_every: int = 4,
+        topic_overlap: float = 0.2,
+        timeout: float = 30,
+    ):
+        self.min_messages  = min_messages
+        self.window        = window
+        self.recheck_every = recheck_every
+        self.topic_overlap = topic_overlap
+        self.timeout       = timeout
+        self._busy: set    = set()
+
+    def load_state(self, hist_path: str):
+        path = title_state_path(hist_path)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    async def refresh(self, hist_path: str, current_name: str = None, force: bool = False):
+        """Return a new title for the session if one is due (or forced), else None."""
+        if hist_path in self._busy or not os.path.exists(hist_path):
+            return None
+        self._busy.add(hist_path)
+        try:
+            with open(hist_path, "r", encoding="utf-8") as f:
+                turns = json.load(f)
+            if not turns or (len(turns) < self.min_messages and not force):
+                return None
+
+            state = self.load_state(hist_path)
+            sid = os.path.basename(hist_path)[: -len(".json")]
+            if force:
+                window = turns[-self.window:]
+            elif current_name and current_name not in (sid[:8], (state or {}).get("title")):
+                return None  # renamed by the user
+            elif state is None:
+                window = turns[: self.window]
+            else:
+                seen = min(state.get("messages", 0), len(turns))
+                if len(turns) - seen < self.recheck_every:
+                    return None
+                # only the messages since the last look say whether the topic moved on
+                window = turns[seen:][-self.window:]
+                if overlap(topic_keywords(window), state.get("keywords", [])) >= self.topic_overlap:
+                    atomic_write_json(title_state_path(hist_path), {**state, "messages": len(turns)})
+                    return None
+
+            title = await self._title(window)
+            if not title:
+                return None
+            atomic_write_json(title_state_path(hist_path), {
+                "title":    title,
+                "messages": len(turns),
+                "keywords": topic_keywords(window),
+            })
+            return title
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"Auto-title failed for {hist_path}: {e}")
+            return None
+        finally:
+            self._busy.discard(hist_path)
+
+    async def _title(self, turns) -> str:
+        transcript = "\n".join(f"{m['role'].title()}: {m['text']}" for m in turns)
+        prompt = (
+            "Please provide a very short, descriptive title (5 words or fewer) "
+            "for the following conversation:\n\n"
+            f"{transcript}\n\nTitle:"
+        )
+        title = await complete(prompt, TITLE, timeout=self.timeout)
+        title = title.splitlines()[0] if title else ""
+        return title.strip().strip('"“”\'*').removeprefix("Title:").strip()[:80]
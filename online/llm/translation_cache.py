@@ -0,0 +1,170 @@
+# online/llm/translation_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from online.cache import atomic_write_json
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE = "translations.json"
+
+
+def translation_key(text: str, target: str) -> str:
+    return f"{hashlib.sha256(text.strip().encode('utf-8')).hexdigest()}:{target}"
+
+
+class TranslationCache:
+    """
+    Persistent cache of finished translations, keyed by (sha256 of the
+    source text, target language). Each entry keeps the translated text and
+    its rendered audio, so a repeated translate click costs no LLM or TTS
+    work. Entries expire after `ttl` seconds and the least recently used are
+    evicted beyond `max_entries`. Everything lives in cache_dir:
+    translations.json and the audio files.
+
+    As with the answer cache, translations.json is written back by a timer
+    thread at most every `flush_interval` seconds (and by save()), never by
+    get() or put().
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_entries: int = 2000,
+        ttl: float = 90 * 24 * 3600,
+        flush_interval: float = 5.0,
+    ):
+        self.cache_dir   = cache_dir
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self.flush_interval = flush_interval
+        self.hits   = 0
+        self.misses = 0
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # one writer at a time
+        self._timer = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    # ─ persistence ─
+    def _load(self):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            log.error(f"Translation cache at '{self.cache_dir}' is unreadable ({e}), starting empty.")
+            self._entries = {}
+        self._expire(time.time())
+
+    def save(self):
+        """Write translations.json now, through a temp file and os.replace."""
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                entries = {key: dict(entry) for key, entry in self._entries.items()}
+            atomic_write_json(os.path.join(self.cache_dir, INDEX_FILE), entries)
+
+    def _schedule_save(self):
+        """Arm the write-back timer (call with self._lock held)."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        try:
+            self.save()
+        except Exception as e:
+            log.error(f"Translation cache write-back to '{self.cache_dir}' failed: {e}")
+
+    # ─ eviction ─
+    def _drop(self, keys):
+        for key in list(keys):
+            entry = self._entries.pop(key, None)
+            path = self.audio_path(entry) if entry else None
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _expire(self, now: float):
+        if self.ttl:
+            self._drop(k for k, e in self._entries.items() if now - e["created"] > self.ttl)
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            by_age = sorted(self._entries, key=lambda k: self._entries[k]["last_used"])
+            self._drop(by_age[:overflow])
+
+    # ─ public API ─
+    def audio_path(self, entry: dict):
+        """Path of the entry's audio, or None if it has none (or it was removed)."""
+        if not entry.get("audio_file"):
+            return None
+        path = os.path.join(self.cache_dir, entry["audio_file"])
+        return path if os.path.exists(path) else None
+
+    def get(self, text: str, target: str):
+        key = translation_key(text, target)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (not self.ttl or now - entry["created"] <= self.ttl):
+                entry["last_used"] = now
+                self.hits += 1
+                self._schedule_save()
+                return dict(entry)
+            self.misses += 1
+            return None
+
+    def put(self, text: str, target: str, translation: str, audio_path: str = None) -> dict:
+        """
+        Remember a translation; its audio file is linked (or copied) into the
+        cache. Blocking (file copy): async callers use asyncio.to_thread.
+        """
+        key = translation_key(text, target)
+        audio_file = None
+        if audio_path and os.path.exists(audio_path):
+            audio_file = f"{key.replace(':', '_')}{os.path.splitext(audio_path)[1]}"
+            target_path = os.path.join(self.cache_dir, audio_file)
+            try:
+                if os.path.exists(target_path):
+                    os.remove(target_path)
+                os.link(audio_path, target_path)
+            except OSError:
+                shutil.copyfile(audio_path, target_path)
+        now = time.time()
+        entry = {
+            "target":      target,
+            "translation": translation,
+            "audio_file":  audio_file,
+            "created":     now,
+            "last_used":   now,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._expire(now)
+            self._schedule_save()
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size":     len(self._entries),
+            "maxsize":  self.max_entries,
+            "hits":     self.hits,
+            "misses":   self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,113 @@
+# online/retrieval/bm25.py
+
+import json
+import math
+import os
+from collections import Counter
+
+from langchain.schema import Document
+
+from online.retrieval.normalize import tokenize
+
+# A BM25 index directory holds:
+#   bm25.json   k1/b, token count per row, and postings term -> flat [row, tf, ...]
+#   docs.jsonl  row-aligned {"page_content", "metadata"} records
+INDEX_FILE = "bm25.json"
+DOCS_FILE  = "docs.jsonl"
+
+
+class BM25Builder:
+    """
+    Incremental inverted-index builder: add() batches as they are produced,
+    then close(). Chunk texts are streamed to docs.jsonl; only the postings
+    (integers) are kept in memory.
+    """
+
+    def __init__(self, out_dir: str, k1: float = 1.5, b: float = 0.75):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir  = out_dir
+        self.k1, self.b = k1, b
+        self.postings: dict = {}
+        self.doc_len: list = []
+        self._docs = open(os.path.join(out_dir, DOCS_FILE), "w", encoding="utf-8")
+
+    def add(self, docs):
+        for doc in docs:
+            row = len(self.doc_len)
+            counts = Counter(tokenize(doc.page_content))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).extend((row, tf))
+            record = {"page_content": doc.page_content, "metadata": doc.metadata}
+            self._docs.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self) -> dict:
+        self._docs.close()
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_len": self.doc_len,
+            "postings": self.postings,
+        }
+        tmp = os.path.join(self.out_dir, INDEX_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, os.path.join(self.out_dir, INDEX_FILE))
+        return {"count": len(self.doc_len), "terms": len(self.postings)}
+
+
+def build_bm25_index(out_dir: str, docs, k1: float = 1.5, b: float = 0.75):
+    """Tokenize every chunk and write an inverted index to out_dir."""
+    builder = BM25Builder(out_dir, k1=k1, b=b)
+    builder.add(docs)
+    return builder.close()
+
+
+class BM25Index:
+    """Okapi BM25 over the chunk texts, using the server's Arabic-aware tokenizer."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        self.k1 = payload.get("k1", 1.5)
+        self.b  = payload.get("b", 0.75)
+        with open(os.path.join(index_dir, DOCS_FILE), "r", encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        self.doc_len  = payload["doc_len"]
+        self.postings = payload["postings"]
+        n = len(self.records)
+        self.avgdl = (sum(self.doc_len) / n) if n else 0.0
+        # BM25+ style idf that never goes negative for very common terms
+        self.idf = {
+            term: math.log(1 + (n - len(p) / 2 + 0.5) / (len(p) / 2 + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.records)
+
+    def document(self, row: int) -> Document:
+        record = self.records[row]
+        return Document(page_content=record["page_content"], metadata=dict(record["metadata"]))
+
+    def scores(self, query: str) -> dict:
+        """Return {row: bm25_score} for every chunk sharing a term with the query."""
+        k1, b, avgdl = self.k1, self.b, self.avgdl or 1.0
+        scores: dict = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for i in range(0, len(plist), 2):
+                row, tf = plist[i], plist[i + 1]
+                norm = k1 * (1 - b + b * self.doc_len[row] / avgdl)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 3):
+        """Return [(Document, bm25_score), ...] best first."""
+        scores = self.scores(query)
+        best = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:top_k]
+        return [(self.document(row), score) for row, score in best]
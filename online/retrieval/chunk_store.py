@@ -0,0 +1,150 @@
+# online/retrieval/chunk_store.py
+
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from langchain.schema import Document
+
+# A packed chunk store is two files side by side:
+#   chunks.jsonl  one {"id", "page_content", "metadata"} record per line
+#   chunks.idx    little-endian uint64 byte offsets, one per record plus EOF
+# Chunk ids are row numbers (chunk_0042.json becomes id 42), so a lookup is
+# two offset reads and one json.loads over a memory-mapped slice.
+DATA_SUFFIX  = ".jsonl"
+INDEX_SUFFIX = ".idx"
+OPEN_ATTEMPTS = 3      # a store opened mid-publish is retried this often…
+OPEN_RETRY_S  = 0.05   # …this far apart
+
+
+def _index_path(path: str) -> str:
+    return str(Path(path).with_suffix(INDEX_SUFFIX))
+
+
+class ChunkStoreWriter:
+    """Append chunks to a new packed store; close() publishes both files, each by rename."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._data = open(self.path + ".tmp", "wb")
+        self._offsets = array("Q", [0])
+
+    def add(self, doc) -> int:
+        chunk_id = len(self._offsets) - 1
+        record = {"id": chunk_id, "page_content": doc.page_content, "metadata": doc.metadata}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._data.write(line)
+        self._offsets.append(self._offsets[-1] + len(line))
+        return chunk_id
+
+    def close(self) -> int:
+        self._data.close()
+        offsets = self._offsets
+        if sys.byteorder != "little":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        idx_path = _index_path(self.path)
+        with open(idx_path + ".tmp", "wb") as f:
+            offsets.tofile(f)
+        # two renames, not one atomic step: readers that already opened the store
+        # keep the old files; one opening between the renames sees new data
+        # with the old index, fails the size check and retries (ChunkStore)
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(idx_path + ".tmp", idx_path)
+        return len(self._offsets) - 1
+
+
+def write_chunk_store(path: str, docs) -> int:
+    writer = ChunkStoreWriter(path)
+    for doc in docs:
+        writer.add(doc)
+    return writer.close()
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped packed chunk store with O(1) access by chunk id.
+    Opening checks that the data file ends where the index says; a mismatch
+    (a writer publishing right now) is retried briefly before it is an error.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        for attempt in range(OPEN_ATTEMPTS):
+            size = self._open()
+            if size is not None:
+                break
+            if attempt == OPEN_ATTEMPTS - 1:
+                raise ValueError(f"Chunk store '{self.path}' does not match its offset index")
+            time.sleep(OPEN_RETRY_S)
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def _open(self):
+        """Load the index and open the data file; returns its size, or None if they disagree."""
+        with open(_index_path(self.path), "rb") as f:
+            offsets = array("Q")
+            offsets.frombytes(f.read())
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        self._offsets = offsets
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size != (offsets[-1] if offsets else 0):
+            self._file.close()
+            return None
+        return size
+
+    def __len__(self):
+        return max(len(self._offsets) - 1, 0)
+
+    def record(self, chunk_id: int) -> dict:
+        if not 0 <= chunk_id < len(self):
+            raise KeyError(chunk_id)
+        start, end = self._offsets[chunk_id], self._offsets[chunk_id + 1]
+        return json.loads(self._mm[start:end])
+
+    def get(self, chunk_id: int) -> Document:
+        record = self.record(chunk_id)
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    __getitem__ = get
+
+    def __iter__(self):
+        for chunk_id in range(len(self)):
+            yield self.get(chunk_id)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_directory(chunks_dir: str, out_path: str) -> int:
+    """Pack a legacy data/chunks/chunk_NNNN.json directory into a chunk store."""
+    files = sorted(Path(chunks_dir).glob("chunk_*.json"))
+    writer = ChunkStoreWriter(out_path)
+    for expected, chunk_file in enumerate(files):
+        if int(chunk_file.stem.split("_")[1]) != expected:
+            raise ValueError(f"Gap in chunk numbering at '{chunk_file.name}'")
+        payload = json.loads(chunk_file.read_text(encoding="utf-8"))
+        writer.add(Document(page_content=payload["page_content"], metadata=payload["metadata"]))
+    return writer.close()
+
+
+if __name__ == "__main__":
+    # python online/retrieval/chunk_store.py data/chunks data/chunks.jsonl
+    src = sys.argv[1] if len(sys.argv) > 1 else "data/chunks"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "data/chunks.jsonl"
+    count = convert_directory(src, dst)
+    print(f"Packed {count} chunks from '{src}' into '{dst}' (+ {Path(dst).with_suffix(INDEX_SUFFIX).name})")
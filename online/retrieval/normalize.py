@@ -0,0 +1,49 @@
+# online/retrieval/normalize.py
+
+import re
+import unicodedata
+
+# fold Arabic letter variants so spelling differences don't change matches
+_ARABIC_FOLD = str.maketrans({"أ":"ا","إ":"ا","آ":"ا","ى":"ي","ؤ":"و","ئ":"ي","ة":"ه"})
+
+# words (Latin or Arabic letters, digits); "Mask R-CNN" -> mask, r, cnn
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# definite-article prefixes: "الكشف", "والكشف", "بالكشف" all index as "كشف"
+_ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+STOPWORDS = frozenset(
+    # English question/function words
+    "a an the is are was were be been of in on at to for from by with and or "
+    "what which who whom how why when where do does did can could would should "
+    "this that these those it its as about into than then there their them "
+    "me my i you your we our explain define tell please".split()
+    # Arabic (already normalized: ة→ه, ى→ي, أ/إ/آ→ا)
+    + "ما ماذا من في علي الي عن هل هو هي هذا هذه ذلك تلك كيف لماذا متي اين او و ثم "
+      "ان كان يكون التي الذي اشرح عرف".split()
+)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, fold alef/ya/ta-marbuta variants and strip diacritics."""
+    text = text.lower()
+    text = text.translate(_ARABIC_FOLD)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return text.strip()
+
+
+def _strip_article(token: str) -> str:
+    for prefix in _ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(text: str) -> list:
+    """Normalized search terms for BM25: stopwords dropped, Arabic article stripped."""
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize_text(text)):
+        if token in STOPWORDS:
+            continue
+        tokens.append(_strip_article(token))
+    return tokens
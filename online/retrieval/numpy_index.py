@@ -0,0 +1,142 @@
+# online/retrieval/numpy_index.py
+
+import json
+import os
+
+import numpy as np
+from langchain.schema import Document
+
+# On-disk layout of a NumPy index directory:
+#   embeddings.npy  (n, dim) L2-normalized matrix, float16 or float32
+#   chunks.jsonl    one {"page_content", "metadata"} record per matrix row
+#   index.json      model name, dtype and shape, for sanity checks
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE     = "chunks.jsonl"
+INFO_FILE       = "index.json"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so a dot product equals cosine similarity."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyIndexWriter:
+    """
+    Append-only writer for a NumPy index, for inputs that don't fit in memory.
+
+    Rows are normalized and appended to a raw scratch file as they arrive;
+    close() wraps them into embeddings.npy block by block, so peak memory
+    stays at one batch regardless of corpus size.
+    """
+
+    RAW_FILE = "embeddings.raw"
+    COPY_ROWS = 4096
+
+    def __init__(self, out_dir: str, dtype: str = "float16"):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.dtype   = np.dtype(dtype)
+        self.count   = 0
+        self.dim     = None
+        self._raw    = open(os.path.join(out_dir, self.RAW_FILE), "wb")
+        self._chunks = open(os.path.join(out_dir, CHUNKS_FILE), "w", encoding="utf-8")
+
+    def add(self, docs, vectors):
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32)).astype(self.dtype)
+        if matrix.ndim != 2 or matrix.shape[0] != len(docs):
+            raise ValueError("add() needs one vector per document")
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"vector dim {matrix.shape[1]} != {self.dim}")
+        self._raw.write(matrix.tobytes())
+        for doc in docs:
+            record = {"page_content": doc.page_content, "metadata": doc.metadata}
+            self._chunks.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += len(docs)
+
+    def close(self, model_name: str) -> dict:
+        self._raw.close()
+        self._chunks.close()
+        raw_path = os.path.join(self.out_dir, self.RAW_FILE)
+        dim = self.dim or 0
+        out = np.lib.format.open_memmap(
+            os.path.join(self.out_dir, EMBEDDINGS_FILE), mode="w+",
+            dtype=self.dtype, shape=(self.count, dim),
+        )
+        if self.count and dim:
+            raw = np.memmap(raw_path, dtype=self.dtype, mode="r", shape=(self.count, dim))
+            for start in range(0, self.count, self.COPY_ROWS):
+                out[start : start + self.COPY_ROWS] = raw[start : start + self.COPY_ROWS]
+            del raw
+        out.flush()
+        del out
+        os.remove(raw_path)
+
+        info = {
+            "model_name": model_name,
+            "dtype": str(self.dtype),
+            "count": self.count,
+            "dim": dim,
+        }
+        with open(os.path.join(self.out_dir, INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+        return info
+
+
+def write_numpy_index(
+    out_dir: str,
+    docs,
+    vectors,
+    model_name: str,
+    dtype: str = "float16",
+):
+    """Persist documents and their embeddings as a NumPy index in out_dir."""
+    writer = NumpyIndexWriter(out_dir, dtype=dtype)
+    if len(docs):
+        writer.add(docs, vectors)
+    return writer.close(model_name)
+
+
+def load_matrix(index_dir: str) -> np.ndarray:
+    """Memory-map the embedding matrix of an index directory (rows are read on access)."""
+    return np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+
+
+class NumpyIndex:
+    """Exact top-k search over a memory-mapped, row-normalized embedding matrix."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, INFO_FILE), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self.matrix = load_matrix(index_dir)
+        with open(os.path.join(index_dir, CHUNKS_FILE), "r", encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        if len(self.records) != self.matrix.shape[0]:
+            raise ValueError(
+                f"NumPy index at '{index_dir}' is inconsistent: "
+                f"{self.matrix.shape[0]} vectors vs {len(self.records)} chunks"
+            )
+
+    def __len__(self):
+        return len(self.records)
+
+    def document(self, row: int) -> Document:
+        record = self.records[row]
+        return Document(page_content=record["page_content"], metadata=dict(record["metadata"]))
+
+    def search_by_vector(self, vector, top_k: int = 3):
+        """Return [(Document, cosine_similarity), ...] best first."""
+        n = len(self.records)
+        if n == 0 or top_k <= 0:
+            return []
+        query = normalize_rows(np.asarray(vector, dtype=np.float32))
+        scores = self.matrix @ query
+        k = min(top_k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.document(int(i)), float(scores[i])) for i in top]
@@ -1,41 +1,441 @@
 # online/retrieval/retriever.py
 
+import os
+import sys
+import json
+import time
+import logging
+import threading
 import warnings
 # Silence all warnings (including LangChain deprecation warnings)
 warnings.filterwarnings("ignore")
 
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 
+from config import get_section
+from online.cache import LRUCache
+from online.retrieval.normalize import normalize_text
+from online.retrieval.numpy_index import NumpyIndex
+from online.retrieval.bm25 import BM25Index, INDEX_FILE as BM25_INDEX_FILE
+from online.retrieval.versions import resolve_index_dir
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PERSIST_DIR = "db/chroma_index"
+DEFAULT_NUMPY_DIR   = "db/numpy_index"
+DEFAULT_BM25_DIR    = "db/bm25_index"
+DEFAULT_MODEL_NAME  = "multi-qa-mpnet-base-dot-v1"
+
+# Chroma collections are built with cosine distance (1 - cosine similarity),
+# so every dense backend scores hits as cosine similarity, higher is closer.
+CHROMA_SPACE = "cosine"
+
+# ─ Process-wide caches ─
+# Sentence-transformer weights are shared by every index that uses the same
+# model; retrievers are keyed by (backend, persist_dir, model_name).
+_embeddings: dict = {}
+_retrievers: dict = {}
+_registry_lock = threading.Lock()
+
+# ─ Query caches ─
+# Keys use server-side normalization (alef/ya/ta-marbuta folding, diacritics,
+# case), so "What is object detection" and "what is Object Detection" share
+# one embedding and one result list.
+_cache_cfg = get_section("retrieval")
+_query_vectors = LRUCache(
+    maxsize=_cache_cfg.get("query_cache_size", 512),
+    ttl=_cache_cfg.get("query_cache_ttl", 3600),
+)
+
+
+def get_embeddings(model_name: str = DEFAULT_MODEL_NAME) -> HuggingFaceEmbeddings:
+    """Return the shared embedding model for model_name, loading it once."""
+    emb = _embeddings.get(model_name)
+    if emb is None:
+        with _registry_lock:
+            emb = _embeddings.get(model_name)
+            if emb is None:
+                emb = HuggingFaceEmbeddings(model_name=model_name)
+                _embeddings[model_name] = emb
+    return emb
+
+
+def embed_query(query: str, model_name: str = DEFAULT_MODEL_NAME):
+    """Embed a question, reusing the cached vector for its normalized form."""
+    key = (model_name, normalize_text(query))
+    vector = _query_vectors.get(key)
+    if vector is None:
+        vector = get_embeddings(model_name).embed_query(query)
+        _query_vectors.put(key, vector)
+    return vector
+
+
+def resolve_backend(backend: str = None, persist_dir: str = None):
+    """Fill in backend type and index location from config/settings.yaml."""
+    cfg = get_section("vector_db")
+    backend = backend or cfg.get("type", "chroma")
+    if persist_dir is None:
+        if backend == "numpy":
+            persist_dir = cfg.get("numpy_dir", DEFAULT_NUMPY_DIR)
+        elif backend == "bm25":
+            persist_dir = cfg.get("bm25_dir", DEFAULT_BM25_DIR)
+        else:
+            persist_dir = cfg.get("persist_dir", DEFAULT_PERSIST_DIR)
+    return backend, persist_dir
+
+
+class Retriever:
+    """
+    Long-lived handle on a persisted vector index.
+
+    The store is opened lazily on first use and then shared by every request.
+    reload() opens a fresh store from disk and swaps it in atomically, so
+    in-flight searches finish against the old one. persist_dir may be
+    versioned (online/retrieval/versions.py); the version its pointer names
+    is the one opened. Top-k results are cached per retriever and dropped
+    whenever the index is reloaded; a new version or a changed stamp file on
+    disk triggers that reload automatically.
+    """
+
+    backend    = None
+    stamp_file = None  # file whose mtime changes when the index is rebuilt
+    similarity = True  # scores are cosine similarities, so min_score applies
+
+    def __init__(self, persist_dir: str, model_name: str = DEFAULT_MODEL_NAME):
+        self.persist_dir = persist_dir
+        self.model_name  = model_name
+        self._store = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock  = threading.Lock()
+        self._refresh_lock = threading.RLock()  # held while checking for / loading a rebuilt index
+        self._results = LRUCache(
+            maxsize=_cache_cfg.get("result_cache_size", 512),
+            ttl=_cache_cfg.get("query_cache_ttl", 3600),
+        )
+
+    def _open(self, index_dir: str):
+        raise NotImplementedError
+
+    def _read_stamp(self, index_dir: str):
+        try:
+            return index_dir, os.stat(os.path.join(index_dir, self.stamp_file)).st_mtime_ns
+        except OSError:
+            return None
+
+    @property
+    def store(self):
+        store = self._store
+        if store is None:
+            with self._lock:
+                if self._store is None:
+                    index_dir = resolve_index_dir(self.persist_dir)
+                    stamp = self._read_stamp(index_dir)
+                    self._store = self._open(index_dir)
+                    self._stamp = stamp
+                    self._checked_at = time.monotonic()
+                store = self._store
+        return store
+
+    def reload(self):
+        """Re-open the index from disk, e.g. after offline/indexer.py rebuilt it."""
+        with self._refresh_lock:
+            index_dir = resolve_index_dir(self.persist_dir)
+            stamp = self._read_stamp(index_dir)
+            store = self._open(index_dir)
+            with self._lock:
+                self._store = store
+                self._stamp = stamp
+                self._checked_at = time.monotonic()
+                self._results.clear()
+
+    def refresh_if_stale(self):
+        """Reload when the on-disk index changed; checks at most every few seconds."""
+        interval = _cache_cfg.get("index_check_interval", 5)
+        if self._store is None or time.monotonic() - self._checked_at < interval:
+            return
+        # one request checks and reloads; concurrent ones keep using the current store
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            if now - self._checked_at < interval:
+                return
+            self._checked_at = now
+            stamp = self._read_stamp(resolve_index_dir(self.persist_dir))
+            if stamp is None or stamp == self._stamp:
+                return
+            try:
+                self.reload()
+                log.info(f"Reloaded rebuilt index at '{self.persist_dir}'")
+            except Exception as e:
+                # keep serving the previous index until the rebuild is complete
+                log.error(f"Reloading index at '{self.persist_dir}' failed: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def search(self, query: str, top_k: int = 3):
+        """Return [(Document, score), ...] for the top_k nearest chunks."""
+        self.refresh_if_stale()
+        key = (normalize_text(query), top_k)
+        results = self._results.get(key)
+        if results is None:
+            results = self._search(query, top_k)
+            self._results.put(key, results)
+        return list(results)
+
+    def _search(self, query: str, top_k: int):
+        vector = embed_query(query, self.model_name)
+        return self.search_by_vector(vector, top_k=top_k)
+
+    def search_by_vector(self, vector, top_k: int = 3):
+        raise NotImplementedError
+
+    def cache_stats(self) -> dict:
+        return self._results.stats()
+
+
+class ChromaRetriever(Retriever):
+    """
+    Chroma-backed retriever. Chroma returns distances; on cosine indexes they
+    are turned into cosine similarities (higher is closer) so min_score means
+    the same thing as for the NumPy backend. Legacy l2 indexes hold
+    unnormalized vectors whose distances map to no similarity scale: their
+    raw distances are returned and min_score is not applied to them.
+    """
+
+    backend    = "chroma"
+    stamp_file = "manifest.json"  # rewritten by offline/indexer.py on every change
+
+    def _open(self, index_dir: str):
+        # Chroma would silently create an empty store at a missing path
+        if not os.path.isdir(index_dir):
+            raise FileNotFoundError(f"No Chroma index at '{index_dir}'")
+        self.space = self._read_space(index_dir)
+        self.similarity = self.space == CHROMA_SPACE
+        if not self.similarity:
+            log.warning(
+                f"Chroma index at '{self.persist_dir}' uses '{self.space}' distance; min_score is "
+                f"ignored until offline/indexer.py rebuilds it with '{CHROMA_SPACE}'"
+            )
+        return Chroma(
+            persist_directory=index_dir,
+            embedding_function=get_embeddings(self.model_name),
+        )
+
+    def _read_space(self, index_dir: str) -> str:
+        """Distance function recorded in the index manifest (indexes predating it used l2)."""
+        try:
+            with open(os.path.join(index_dir, self.stamp_file), "r", encoding="utf-8") as f:
+                return json.load(f).get("space") or "l2"
+        except (OSError, ValueError):
+            return "l2"
+
+    def search_by_vector(self, vector, top_k: int = 3):
+        hits = self.store.similarity_search_by_vector_with_relevance_scores(vector, k=top_k)
+        if self.space == CHROMA_SPACE:
+            return [(doc, 1.0 - distance) for doc, distance in hits]
+        return hits
+
+
+class NumpyRetriever(Retriever):
+    """Exact in-memory search; scores are cosine similarities (higher is closer)."""
+
+    backend    = "numpy"
+    stamp_file = "index.json"
+
+    def _open(self, index_dir: str):
+        index = NumpyIndex(index_dir)
+        built_with = index.info.get("model_name")
+        if built_with and built_with != self.model_name:
+            raise ValueError(
+                f"NumPy index at '{self.persist_dir}' was built with '{built_with}', "
+                f"not '{self.model_name}'"
+            )
+        return index
+
+    def search_by_vector(self, vector, top_k: int = 3):
+        return self.store.search_by_vector(vector, top_k=top_k)
+
+
+class BM25Retriever(Retriever):
+    """Lexical retriever over the inverted index; needs no embedding forward pass."""
+
+    backend    = "bm25"
+    stamp_file = BM25_INDEX_FILE
+
+    def _open(self, index_dir: str):
+        return BM25Index(index_dir)
+
+    def _search(self, query: str, top_k: int):
+        return self.store.search(query, top_k=top_k)
+
+
+RETRIEVER_TYPES = {
+    "chroma": ChromaRetriever,
+    "numpy":  NumpyRetriever,
+    "bm25":   BM25Retriever,
+}
+
+
+def get_retriever(
+    persist_dir: str = None,
+    model_name: str = DEFAULT_MODEL_NAME,
+    backend: str = None,
+) -> Retriever:
+    """Return the process-wide Retriever for (backend, persist_dir, model_name)."""
+    backend, persist_dir = resolve_backend(backend, persist_dir)
+    if backend not in RETRIEVER_TYPES:
+        raise ValueError(f"Unknown vector_db type '{backend}'")
+    key = (backend, persist_dir, model_name)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        with _registry_lock:
+            retriever = _retrievers.get(key)
+            if retriever is None:
+                retriever = RETRIEVER_TYPES[backend](persist_dir, model_name)
+                _retrievers[key] = retriever
+    return retriever
+
+
+def reload_retrievers():
+    """Re-open every live retriever so a rebuilt index is picked up without a restart."""
+    with _registry_lock:
+        retrievers = list(_retrievers.values())
+    for retriever in retrievers:
+        retriever.reload()
+    return len(retrievers)
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for the query-embedding and per-index result caches."""
+    with _registry_lock:
+        retrievers = dict(_retrievers)
+    return {
+        "query_embeddings": _query_vectors.stats(),
+        "results": {
+            f"{backend}:{persist_dir}": r.cache_stats()
+            for (backend, persist_dir, _), r in retrievers.items()
+        },
+    }
+
+
+def reciprocal_rank_fusion(rankings, top_k: int = 3, k: int = 60):
+    """Fuse several [(Document, score), ...] rankings by reciprocal rank."""
+    fused, docs = {}, {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking):
+            key = doc.page_content
+            docs.setdefault(key, doc)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    best = sorted(fused.items(), key=lambda kv: -kv[1])[:top_k]
+    return [(docs[key], score) for key, score in best]
+
+
+def _lexical_confident(hits) -> bool:
+    """True when the top BM25 hit is both strong and well ahead of the runner-up."""
+    if not hits:
+        return False
+    top = hits[0][1]
+    if top < _cache_cfg.get("bm25_confident_score", 8.0):
+        return False
+    runner_up = hits[1][1] if len(hits) > 1 else 0.0
+    return top >= _cache_cfg.get("bm25_margin", 1.5) * runner_up
+
+
+def dense_above(retriever: Retriever, hits, min_score: float):
+    """Drop dense hits scoring below min_score, when the scores are cosine similarities."""
+    if not retriever.similarity:
+        return hits
+    return [(doc, score) for doc, score in hits if score >= min_score]
+
+
+def hybrid_search(
+    query: str,
+    top_k: int = 3,
+    persist_dir: str = None,
+    model_name: str = DEFAULT_MODEL_NAME,
+    backend: str = None,
+    min_score: float = 0.0,
+):
+    """
+    BM25 first; if its best hit is confident, skip the embedding pass entirely.
+    Otherwise fuse the BM25 and dense rankings with reciprocal rank fusion.
+    min_score filters the dense ranking only; BM25 and fused scores are on
+    scales of their own.
+    """
+    dense_retriever = get_retriever(persist_dir, model_name, backend)
+    pool = max(top_k, _cache_cfg.get("fusion_pool", 10))
+    try:
+        lexical = get_retriever(model_name=model_name, backend="bm25").search(query, top_k=pool)
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        # missing, or unreadable / inconsistent (a corrupt index.json or docs file)
+        log.error(f"BM25 index unavailable ({e!r}), using dense retrieval only.")
+        return dense_above(dense_retriever, dense_retriever.search(query, top_k=top_k), min_score)
+    if _lexical_confident(lexical):
+        return lexical[:top_k]
+    dense = dense_above(dense_retriever, dense_retriever.search(query, top_k=pool), min_score)
+    return reciprocal_rank_fusion([dense, lexical], top_k=top_k, k=_cache_cfg.get("rrf_k", 60))
+
+
 def get_relevant_chunks(
     query: str,
-    persist_dir: str = "db/chroma_index",
-    model_name: str = "multi-qa-mpnet-base-dot-v1",
+    persist_dir: str = None,
+    model_name: str = DEFAULT_MODEL_NAME,
     top_k: int = 3,
-    min_score: float = 0.0  # only keep chunks with score ≥ this threshold
+    min_score: float = 0.0,  # only keep dense hits with cosine similarity ≥ this
+    backend: str = None,     # "chroma" | "numpy"; defaults to settings.yaml
+    mode: str = None,        # "dense" | "bm25" | "hybrid"; defaults to settings.yaml
 ):
     """
-    Given a text query, load your local Chroma index and return the top_k
-    most similar Document chunks whose similarity score ≥ min_score.
+    Given a text query, search the shared retriever(s) for your local index
+    and return the top_k most relevant Document chunks. min_score is a cosine
+    similarity, so it filters dense hits only (before fusion in hybrid mode);
+    BM25 scores are unbounded term weights and are never compared with it.
     """
-    # 1) Initialize the same embedding model you used offline
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    mode = mode or _cache_cfg.get("mode", "dense")
 
-    # 2) Load your persisted Chroma store
-    vectordb = Chroma(
-        persist_directory=persist_dir,
-        embedding_function=embeddings
-    )
+    # 1-2) Reuse the warm index(es) and search with scores
+    if mode == "hybrid":
+        results = hybrid_search(query, top_k, persist_dir, model_name, backend, min_score)
+    elif mode == "bm25":
+        results = get_retriever(model_name=model_name, backend="bm25").search(query, top_k=top_k)
+    else:
+        # 3) Filter out dense hits below the min_score threshold
+        retriever = get_retriever(persist_dir, model_name, backend)
+        results = dense_above(retriever, retriever.search(query, top_k=top_k), min_score)
 
-    # 3) Perform similarity search with scores (cosine similarity by default)
-    results = vectordb.similarity_search_with_score(query, k=top_k)
+    return [doc for doc, _ in results]
 
-    # 4) Filter out chunks below the min_score threshold
-    filtered_docs = [doc for doc, score in results if score >= min_score]
-    return filtered_docs
+
+def compare_backends(query: str, top_k: int = 5):
+    """Run one query through the Chroma and NumPy indexes side by side."""
+    rankings = {}
+    for backend in RETRIEVER_TYPES:
+        hits = get_retriever(backend=backend).search(query, top_k=top_k)
+        rankings[backend] = [doc.page_content for doc, _ in hits]
+        print(f"[{backend}]")
+        for doc, score in hits:
+            print(f"  {score:.4f}  {doc.page_content[:80]!r}")
+    chroma, numpy_ = rankings["chroma"], rankings["numpy"]
+    print("[hybrid]")
+    for doc, score in hybrid_search(query, top_k=top_k, backend="chroma"):
+        print(f"  {score:.4f}  {doc.page_content[:80]!r}")
+    print(f"overlap@{top_k}: {len(set(chroma) & set(numpy_))}/{top_k}, "
+          f"same order: {chroma == numpy_}")
+    return rankings
 
 
 if __name__ == "__main__":
+    if "--compare" in sys.argv:
+        compare_backends("What is the class recognition?")
+        sys.exit(0)
+
     # Quick test with adjustable minimum score
     hits = get_relevant_chunks(
         "What is the class recognition?",
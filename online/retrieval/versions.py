@@ -0,0 +1,78 @@
+# online/retrieval/versions.py
+
+"""
+Versioned index directories.
+
+offline/indexer.py never renames a directory a server may have open. Every
+build goes into a fresh sibling "<index>@<version>" and is published by
+rewriting the pointer file "<index>.current" with os.replace, a single atomic
+step: a reader resolves either the old version or the new one. Indexes built
+before versioning have no pointer and resolve to the plain directory.
+"""
+
+import os
+import uuid
+import shutil
+from datetime import datetime
+
+POINTER_SUFFIX = ".current"
+VERSION_SEP    = "@"
+
+
+def pointer_file(index_dir: str) -> str:
+    return os.path.normpath(index_dir) + POINTER_SUFFIX
+
+
+def resolve_index_dir(index_dir: str) -> str:
+    """The directory holding the live version of index_dir."""
+    index_dir = os.path.normpath(index_dir)
+    try:
+        with open(pointer_file(index_dir), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return index_dir
+    if not version:
+        return index_dir
+    return os.path.join(os.path.dirname(index_dir), version)
+
+
+def new_version_dir(index_dir: str) -> str:
+    """A fresh, not yet existing directory to build the next version in."""
+    index_dir = os.path.normpath(index_dir)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return f"{index_dir}{VERSION_SEP}{stamp}-{uuid.uuid4().hex[:8]}"
+
+
+def publish(version_dir: str, index_dir: str):
+    """
+    Point index_dir at the fully built version_dir.
+
+    Only the pointer file is replaced, so readers never see a missing or
+    half-written index. The version it replaces is kept for servers still
+    reading it until their next reload; older ones are removed.
+    """
+    index_dir = os.path.normpath(index_dir)
+    previous = resolve_index_dir(index_dir)
+    pointer = pointer_file(index_dir)
+    tmp = pointer + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(os.path.normpath(version_dir)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+    prune_versions(index_dir, keep={os.path.normpath(version_dir), previous})
+
+
+def prune_versions(index_dir: str, keep):
+    """Delete versions of index_dir (and a pre-versioning plain dir) not in keep."""
+    index_dir = os.path.normpath(index_dir)
+    parent = os.path.dirname(index_dir) or "."
+    prefix = os.path.basename(index_dir) + VERSION_SEP
+    candidates = [index_dir] + [
+        os.path.join(os.path.dirname(index_dir), name)
+        for name in os.listdir(parent) if name.startswith(prefix)
+    ]
+    for path in candidates:
+        if path not in keep and os.path.isdir(path):
+            # a version still open elsewhere (Windows) is retried on the next build
+            shutil.rmtree(path, ignore_errors=True)
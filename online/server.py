@@ -1,19 +1,20 @@
 import os
 import sys
 import uuid
+import asyncio
+import random
 import json
 import subprocess
 import logging
 import shutil
+import glob
 import difflib
-import unicodedata
 import secrets
 from datetime import datetime, timedelta
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, unquote_plus
 
 from fastapi import (
     FastAPI,
-    File,
     UploadFile,
     Request,
     Response,
@@ -21,9 +22,8 @@ from fastapi import (
     Depends,
     status
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from passlib.hash import bcrypt
@@ -36,10 +36,26 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
 
 # ─ Pipeline imports ─
-from online.stt.whisper_stt     import transcribe
-from online.retrieval.retriever import get_relevant_chunks
-from online.llm.inference       import generate_answer, llm
-from online.tts.tts_service     import synthesize, detect_language
+from online.stt.whisper_stt     import decode_upload
+from online.stt.pool            import STTPool, STTBusy
+from online.retrieval.retriever import (
+    get_relevant_chunks, get_retriever, reload_retrievers, cache_stats,
+    embed_query, DEFAULT_MODEL_NAME,
+)
+from online.retrieval.normalize import normalize_text
+from online.llm.inference       import agenerate_answer, stream_answer, format_citations, complete, scheduler, inflight, llm
+from online.llm.scheduler       import TRANSLATE
+from online.llm.answer_cache    import AnswerCache
+from online.llm.history         import HistoryManager
+from online.llm.translation_cache import TranslationCache
+from online.llm.titles          import SessionTitler
+from online.tts.tts_service     import (
+    synthesize, speak, detect_language, SentencePipeline, join_segments, audio_ext, tts_stats, get_router,
+)
+from online.tts.audio_store     import AudioStore
+from online.janitor             import AudioJanitor
+from online.cache               import link_or_copy
+from config import get_section
 
 # ─ Logging ─
 logger = logging.getLogger("uvicorn.error")
@@ -65,6 +81,92 @@ history_dir = os.path.join(project_root, "online", "temp", "history")
 os.makedirs(audio_dir,   exist_ok=True)
 os.makedirs(history_dir, exist_ok=True)
 
+llm_cfg = get_section("llm")
+tts_cfg = get_section("tts")
+audio_format = tts_cfg.get("format", "mp3")   # mp3 | opus | wav, as served to clients
+audio_suffix = audio_ext(audio_format)
+
+# ─ Content-addressed store of rendered speech (repeated text is voiced once) ─
+tts_store = None
+if tts_cfg.get("store", True):
+    tts_store = AudioStore(
+        os.path.join(audio_dir, "cache", "tts"),
+        max_bytes=int(tts_cfg.get("store_max_mb", 200) * 1024 * 1024),
+    )
+
+# ─ Semantic answer cache (answer + citation + audio for near-duplicate questions) ─
+answer_cache_cfg = get_section("answer_cache")
+answer_cache = None
+if answer_cache_cfg.get("enabled", True):
+    answer_cache = AnswerCache(
+        os.path.join(audio_dir, "cache", "answers"),
+        model_name=DEFAULT_MODEL_NAME,
+        max_entries=answer_cache_cfg.get("max_entries", 500),
+        similarity=answer_cache_cfg.get("similarity", 0.92),
+        ttl=answer_cache_cfg.get("ttl_days", 30) * 24 * 3600,
+        flush_interval=answer_cache_cfg.get("flush_interval_s", 5),
+    )
+
+# ─ Translation cache (translated text + audio per source text and target language) ─
+translation_cache_cfg = get_section("translation_cache")
+translation_cache = None
+if translation_cache_cfg.get("enabled", True):
+    translation_cache = TranslationCache(
+        os.path.join(audio_dir, "cache", "translations"),
+        max_entries=translation_cache_cfg.get("max_entries", 2000),
+        ttl=translation_cache_cfg.get("ttl_days", 90) * 24 * 3600,
+        flush_interval=translation_cache_cfg.get("flush_interval_s", 5),
+    )
+
+# ─ STT: Whisper workers behind a bounded queue (full queue -> 503 + Retry-After) ─
+stt_cfg = get_section("stt")
+stt_pool = STTPool(
+    workers=stt_cfg.get("workers", 1),
+    mode=stt_cfg.get("mode", "thread"),
+    queue_size=stt_cfg.get("queue_size", 8),
+    retry_after=stt_cfg.get("retry_after_s", 5),
+    language=stt_cfg.get("language", "en"),
+    model_kwargs={
+        "model_size_or_path": stt_cfg.get("model", "medium"),
+        "device":             stt_cfg.get("device", "cpu"),
+        "compute_type":       stt_cfg.get("compute_type", "int8"),
+        "cpu_threads":        stt_cfg.get("cpu_threads", 0),
+        "num_workers":        stt_cfg.get("num_workers", 1),
+    },
+)
+
+# ─ Audio janitor: outputs go after a TTL (unless in a history), under a quota ─
+janitor_cfg = get_section("audio_janitor")
+audio_janitor = None
+if janitor_cfg.get("enabled", True):
+    audio_janitor = AudioJanitor(
+        audio_dir, history_dir,
+        ttl=janitor_cfg.get("ttl_hours", 24) * 3600,
+        max_bytes=int(janitor_cfg.get("max_mb", 2048) * 1024 * 1024),
+        input_grace=janitor_cfg.get("input_grace_s", 600),
+        min_age=janitor_cfg.get("min_age_s", 120),
+    )
+
+# ─ Prompt history: recent turns verbatim, older ones as a rolling summary ─
+history_cfg = get_section("history")
+history_manager = HistoryManager(
+    max_turns=history_cfg.get("max_turns", 8),
+    token_budget=history_cfg.get("token_budget", 1200),
+    summarize=history_cfg.get("summarize", True),
+    min_fold=history_cfg.get("summary_min_turns", 4),
+    timeout=history_cfg.get("summary_timeout", 60),
+)
+
+# ─ Session auto-titles: background, bounded window, retitled on topic change ─
+titles_cfg = get_section("titles")
+session_titler = SessionTitler(
+    min_messages=titles_cfg.get("min_messages", 3),
+    window=titles_cfg.get("window", 6),
+    recheck_every=titles_cfg.get("recheck_every", 4),
+    topic_overlap=titles_cfg.get("topic_overlap", 0.2),
+    timeout=llm_cfg.get("title_timeout", 30),
+)
+
 # ─ Persist SECRET_KEY across restarts ─
 SECRET_FILE = os.path.join(history_dir, "secret_key.txt")
 if os.path.exists(SECRET_FILE):
@@ -141,6 +243,23 @@ async def get_current_user(request: Request) -> str:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return verify_token(token)
 
+# ─ Admins: listed in auth.admin_emails / ADMIN_EMAILS (comma-separated), or "role": "admin" in users.json ─
+auth_cfg = get_section("auth")
+ADMIN_EMAILS = {
+    email.strip().lower()
+    for email in [*(auth_cfg.get("admin_emails") or []), *os.getenv("ADMIN_EMAILS", "").split(",")]
+    if email.strip()
+}
+
+def is_admin(email: str) -> bool:
+    return email.lower() in ADMIN_EMAILS or load_users().get(email, {}).get("role") == "admin"
+
+async def get_admin_user(user: str = Depends(get_current_user)) -> str:
+    """Like get_current_user, but only for admin accounts (see is_admin)."""
+    if not is_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only")
+    return user
+
 # ─ Google OAuth config ─
 GOOGLE_CLIENT_ID = os.getenv(
     "GOOGLE_CLIENT_ID",
@@ -155,21 +274,43 @@ ffmpeg_bin = (
 )
 
 # ─ Typing simulation helper ─
+responses_cfg = get_section("responses")
+RESPONSE_FORMAT_VERSION = int(responses_cfg.get("format_version", 2))
+
 def make_typing_simulation(answer_text: str):
+    # legacy (format 1): every prefix of the answer, O(n²) characters on the wire
     sim, cur = [], ""
     for c in answer_text:
         cur += c
         sim.append(cur)
     return sim
 
-# ─ Text normalization & greetings ─
-def normalize_text(text: str) -> str:
-    text = text.lower()
-    mapping = str.maketrans({"أ":"ا","إ":"ا","آ":"ا","ى":"ي","ؤ":"و","ئ":"ي","ة":"ه"})
-    text = text.translate(mapping)
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    return text.strip()
+def response_format(request: Request, form=None) -> int:
+    """Format version asked for by the client (form field or ?format=), else the configured one."""
+    raw = (form.get("format") if form is not None else None) or request.query_params.get("format")
+    try:
+        return int(raw) if raw else RESPONSE_FORMAT_VERSION
+    except ValueError:
+        return RESPONSE_FORMAT_VERSION
+
+def typing_fields(answer_text: str, version: int) -> dict:
+    """
+    Typing-animation fields of a /chat/ or /ask/ response. Version 2 sends a
+    schedule the client replays over the answer text (chars_per_tick
+    characters every interval_ms); version 1 also adds typing_simulation.
+    """
+    fields = {
+        "format_version": version,
+        "typing": {
+            "interval_ms":    responses_cfg.get("typing_interval_ms", 25),
+            "chars_per_tick": responses_cfg.get("typing_chars_per_tick", 1),
+        },
+    }
+    if version < 2:
+        fields["typing_simulation"] = make_typing_simulation(answer_text)
+    return fields
 
+# ─ Greetings ─
 GREETINGS = [
     "hello","hi","hey","good morning","good evening","good afternoon","how are you",
     "السلام عليكم","مرحبا","صباح الخير","مساء الخير","أهلا","أهلا وسهلا","كيف حالك","كيف حالكم"
@@ -201,6 +342,259 @@ def is_greeting(text: str) -> bool:
     ): return True
     return False
 
+# ─ Answer pipeline shared by /chat/ and /ask/ ─
+def audio_url_for(path: str) -> str:
+    rel = os.path.relpath(path, audio_dir).replace(os.sep, "/")
+    return f"/audio/{rel}"
+
+def prior_turns(chat_history, question: str):
+    """Conversation before this question (the client appends the question itself)."""
+    turns = list(chat_history or [])
+    if turns and turns[-1].get("role") == "user" and turns[-1].get("text", "").strip() == question:
+        turns = turns[:-1]
+    return turns
+
+def prompt_history(question: str, chat_history, hist_path: str):
+    """(summary, recent_turns) of the conversation before this question, within the history budget."""
+    return history_manager.context(hist_path, prior_turns(chat_history, question))
+
+background_tasks: set = set()
+
+def run_in_background(coro):
+    """Fire-and-forget a coroutine, keeping a reference until it finishes."""
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+NOT_UNDERSTOOD = {"en": "Sorry, I couldn't understand the question.", "ar": "عذراً، لم أتمكن من الفهم."}
+NO_ANSWER_TEXT = {"en": "Sorry, I don’t know.", "ar": "عذراً، لا أعرف."}
+
+def canned_answer(question: str, lang: str):
+    """Reply to empty questions and greetings, or None when the question needs the RAG pipeline."""
+    if not question.strip():
+        return NOT_UNDERSTOOD["en" if lang=="en" else "ar"]
+    if is_greeting(question):
+        return random.choice(GREETINGS_RESPONSES_AR if lang=="ar" else GREETINGS_RESPONSES_EN)
+    return None
+
+def no_answer(lang: str) -> str:
+    return NO_ANSWER_TEXT["en" if lang=="en" else "ar"]
+
+# fixed replies, voiced once at startup and then served straight from the TTS store
+FIXED_REPLIES = [
+    *GREETINGS_RESPONSES_EN, *GREETINGS_RESPONSES_AR,
+    *NOT_UNDERSTOOD.values(), *NO_ANSWER_TEXT.values(),
+]
+
+def retrieve(question: str, lang: str, chat_history):
+    """
+    Chunks for a question plus, when the answer cache applies, the query
+    vector and any cached entry with live audio; hit["audio_path"] is this
+    request's own copy of that audio. Returns (chunks, vector, hit).
+    Blocking (embedding, index search): call it through asyncio.to_thread.
+    """
+    chunks = get_relevant_chunks(question, top_k=3)
+    vector = hit = None
+    if chunks and answer_cache is not None and not (
+        answer_cache_cfg.get("skip_with_history", True)
+        and prior_turns(chat_history, question)
+    ):
+        vector = embed_query(question)
+        hit = answer_cache.lookup(vector, lang, chunks)
+        if hit:
+            # history keeps this URL, so it must outlive the cache entry
+            ext = os.path.splitext(hit["audio_file"] or "")[1]
+            path = answer_cache.copy_audio(hit, os.path.join(audio_dir, f"{uuid.uuid4().hex}_out{ext}"))
+            hit = dict(hit, audio_path=path) if path else None
+    return chunks, vector, hit
+
+async def voice_answer(question: str, lang: str, answer: str, citation: str, chunks, vector,
+                       segments=None) -> str:
+    """
+    Synthesize the answer (or join its already voiced sentence segments),
+    remember it in the answer cache, return its audio URL.
+    """
+    uid     = uuid.uuid4().hex
+    out_path = os.path.join(audio_dir, f"{uid}_out.{audio_suffix}")
+    if tts_store is not None and not chunks and not segments:
+        # greetings and fallbacks: the shared rendering, linked to a file the
+        # store cannot evict, since history keeps the URL (see online/janitor.py)
+        shared = await speak(answer, tts_store, fmt=audio_format)
+        await asyncio.to_thread(link_or_copy, shared, out_path)
+        return audio_url_for(out_path)
+
+    if segments:
+        await asyncio.to_thread(join_segments, segments, out_path, audio_format)
+    else:
+        await synthesize(answer, out_path, tts_store, audio_format)
+
+    if vector is not None:
+        try:
+            await asyncio.to_thread(answer_cache.store, vector, question, lang, chunks, answer, citation, out_path)
+        except Exception as e:
+            logger.error(f"Answer cache store failed: {e}")
+    return audio_url_for(out_path)
+
+def client_gone(request: Request):
+    """Abandon hook for the LLM scheduler: resolves once the client has disconnected."""
+    async def watch():
+        while not await request.is_disconnected():
+            await asyncio.sleep(0.5)
+    return watch
+
+async def answer_question(question: str, lang: str, chat_history, abandon=None, hist_path: str = None):
+    """Retrieve, answer and voice a question. Returns (answer, citation, audio_url)."""
+    chunks, vector = [], None
+    answer, citation = canned_answer(question, lang), ""
+    if answer is None:
+        chunks, vector, hit = await asyncio.to_thread(retrieve, question, lang, chat_history)
+        if hit:
+            return hit["answer"], hit["citation"], audio_url_for(hit["audio_path"])
+        if chunks:
+            summary, recent = prompt_history(question, chat_history, hist_path)
+            try:
+                result = await agenerate_answer(
+                    chunks, question, recent, target_lang=lang, abandon=abandon, summary=summary
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"LLM timed out answering {question!r}")
+                raise HTTPException(status_code=504, detail="The tutor took too long to answer.")
+            answer, citation = result if isinstance(result, tuple) else (result, "")
+        else:
+            answer = no_answer(lang)
+
+    audio_url = await voice_answer(question, lang, answer, citation, chunks, vector)
+    return answer, citation, audio_url
+
+async def answer_question_events(question: str, lang: str, chat_history, result: dict, hist_path: str = None):
+    """
+    Streaming twin of answer_question. Yields ("token", text) as the LLM
+    produces the answer (a single piece for greetings and cache hits), then
+    ("citation", text) and ("audio", url). With tts.pipelined, each sentence
+    is voiced as soon as it is complete and ("audio_segment", {index, url})
+    events arrive in order between the others, ahead of the full audio.
+    The final answer, citation and audio_url are left in result.
+    """
+    chunks, vector, hit = [], None, None
+    pipeline = None
+    answer, citation = canned_answer(question, lang), ""
+    if answer is None:
+        chunks, vector, hit = await asyncio.to_thread(retrieve, question, lang, chat_history)
+        if hit:
+            answer, citation = hit["answer"], hit["citation"]
+        elif chunks:
+            if tts_cfg.get("pipelined", True):
+                pipeline = SentencePipeline(
+                    audio_dir, uuid.uuid4().hex,
+                    min_chars=tts_cfg.get("min_sentence_chars", 40), store=tts_store, fmt=audio_format,
+                )
+            summary, recent = prompt_history(question, chat_history, hist_path)
+            pieces = []
+            try:
+                async for token in stream_answer(chunks, question, recent, target_lang=lang, summary=summary):
+                    pieces.append(token)
+                    yield "token", token
+                    if pipeline:
+                        pipeline.feed(token)
+                        for index, path in pipeline.ready():
+                            yield "audio_segment", {"index": index, "url": audio_url_for(path)}
+            except BaseException:
+                if pipeline:
+                    pipeline.cancel()
+                raise
+            answer, citation = "".join(pieces).strip(), format_citations(chunks)
+        else:
+            answer = no_answer(lang)
+    if hit or not chunks:
+        yield "token", answer
+    result.update(answer=answer, citation=citation)
+    yield "citation", citation
+
+    if hit:
+        audio_url = audio_url_for(hit["audio_path"])
+    else:
+        if pipeline:
+            async for index, path in pipeline.remaining():
+                yield "audio_segment", {"index": index, "url": audio_url_for(path)}
+        # a sentence that failed to voice would be missing from the joined audio
+        segments = pipeline.paths if pipeline and pipeline.complete else None
+        audio_url = await voice_answer(question, lang, answer, citation, chunks, vector, segments)
+    result["audio_url"] = audio_url
+    yield "audio", audio_url
+
+def append_history(hist_path: str, question: str, answer: str, citation: str, audio_url: str):
+    existing = []
+    if os.path.exists(hist_path):
+        with open(hist_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+    existing.extend([
+        {"role": "user",      "text": question},
+        {"role": "assistant", "text": answer, "citation": citation, "audio_url": audio_url}
+    ])
+    with open(hist_path, "w", encoding="utf-8") as f:
+        json.dump(existing, f, ensure_ascii=False, indent=2)
+    # fold turns that left the verbatim window into the session summary
+    run_in_background(history_manager.refresh(hist_path))
+    run_in_background(auto_title(hist_path))
+
+async def auto_title(hist_path: str, force: bool = False):
+    """
+    Give the session a title (or a new one on a topic change) in session
+    metadata; returns the session's name afterwards. A rename made while the
+    title was being generated wins, except on a forced (explicit) request.
+    """
+    email = unquote_plus(os.path.basename(os.path.dirname(hist_path)))
+    session_id = os.path.basename(hist_path)[: -len(".json")]
+    name = load_metadata(email).get(session_id)
+    title = await session_titler.refresh(hist_path, name, force=force)
+    meta = load_metadata(email)
+    if title and os.path.exists(hist_path) and (force or meta.get(session_id) == name):
+        meta[session_id] = title
+        save_metadata(email, meta)
+    return meta.get(session_id, session_id[:8])
+
+def sse(event: str, data) -> str:
+    """One Server-Sent Events frame; data is JSON so newlines survive."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_response(question: str, lang: str, chat_history, session_id: str, hist_path: str,
+                    version: int = RESPONSE_FORMAT_VERSION):
+    """
+    SSE response for /chat/stream and /ask/stream. Events, in order:
+    session, token (repeated), citation, audio, done, with audio_segment
+    events interleaved when TTS is pipelined. done carries the typing
+    schedule, for answers that arrive in one piece (greetings, cache hits).
+    History is written once the answer is complete, exactly as the blocking
+    endpoints do.
+    """
+    async def events():
+        yield sse("session", {"session_id": session_id, "transcript": question})
+        result = {}
+        try:
+            async for event, data in answer_question_events(question, lang, chat_history, result, hist_path):
+                yield sse(event, {"text": data} if event == "token" else data)
+        except Exception as e:
+            logger.error(f"Streaming answer failed: {e}")
+            yield sse("error", {"detail": "Answer generation failed"})
+            return
+        append_history(hist_path, question, result["answer"], result["citation"], result["audio_url"])
+        yield sse("done", {
+            "session_id":      session_id,
+            "answer":          result["answer"],
+            "citation":        result["citation"],
+            "audio_url":       result["audio_url"],
+            "avatar_waiting":  "/static/avatar waiting.mp4",
+            "avatar_speaking": "/static/avatar talking.mp4",
+            **typing_fields(result["answer"], version),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.on_event("startup")
 def verify_ffmpeg():
     if not ffmpeg_bin or not os.path.isfile(ffmpeg_bin):
@@ -215,6 +609,55 @@ def verify_ffmpeg():
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg test failed:\n{e.stderr}")
 
+@app.on_event("startup")
+async def start_stt_pool():
+    stt_pool.start()
+
+@app.on_event("shutdown")
+def stop_stt_pool():
+    stt_pool.shutdown()
+
+@app.on_event("startup")
+async def start_audio_janitor():
+    if audio_janitor is not None:
+        run_in_background(audio_janitor.run(janitor_cfg.get("interval_s", 300)))
+
+@app.on_event("shutdown")
+def save_caches():
+    if answer_cache is not None:
+        answer_cache.save()
+    if translation_cache is not None:
+        translation_cache.save()
+
+@app.on_event("startup")
+async def warm_tts_store():
+    # start the TTS engines off the event loop, then voice the fixed replies
+    # in the background; they stay pinned in the store
+    async def prewarm():
+        try:
+            await asyncio.to_thread(get_router)
+        except Exception as e:
+            logger.error(f"TTS start-up failed: {e}")
+            return
+        if tts_store is None:
+            return
+        for text in FIXED_REPLIES:
+            try:
+                await speak(text, tts_store, pin=True, fmt=audio_format)
+            except Exception as e:
+                logger.error(f"TTS pre-warm failed for {text!r}: {e}")
+        logger.info(f"TTS store pre-warmed with {len(FIXED_REPLIES)} fixed replies")
+    run_in_background(prewarm())
+
+@app.on_event("startup")
+def warm_retriever():
+    # load the embedding model + index once, before the first question arrives
+    try:
+        get_retriever().store
+        logger.info("Retriever warmed up")
+    except Exception as e:
+        logger.error(f"Retriever warm-up failed: {e}")
+
 # ─ Serve index.html ─
 @app.get("/", response_class=FileResponse)
 async def serve_index():
@@ -307,37 +750,8 @@ async def chat(request: Request, user: str = Depends(get_current_user)):
         chat_history = []
 
     lang = detect_language(question)
-    if is_greeting(question):
-        import random
-        answer   = random.choice(GREETINGS_RESPONSES_AR if lang=="ar" else GREETINGS_RESPONSES_EN)
-        citation = ""
-    else:
-        chunks = get_relevant_chunks(question, top_k=3)
-        if chunks:
-            result = generate_answer(chunks, question, chat_history, target_lang=lang)
-            answer, citation = result if isinstance(result, tuple) else (result, "")
-        else:
-            answer, citation = (
-                ("Sorry, I don’t know.", "") if lang=="en"
-                else ("عذراً، لا أعرف.", "")
-            )
-
-    uid     = uuid.uuid4().hex
-    out_wav = os.path.join(audio_dir, f"{uid}_out.wav")
-    await synthesize(answer, out_wav)
-    audio_url = f"/audio/{uid}_out.wav"
-
-    entry = [
-        {"role": "user",      "text": question},
-        {"role": "assistant", "text": answer, "citation": citation, "audio_url": audio_url}
-    ]
-    existing = []
-    if os.path.exists(hist_path):
-        with open(hist_path, "r", encoding="utf-8") as f:
-            existing = json.load(f)
-    existing.extend(entry)
-    with open(hist_path, "w", encoding="utf-8") as f:
-        json.dump(existing, f, ensure_ascii=False, indent=2)
+    answer, citation, audio_url = await answer_question(question, lang, chat_history, client_gone(request), hist_path)
+    append_history(hist_path, question, answer, citation, audio_url)
 
     return {
         "session_id":        session_id,
@@ -347,50 +761,55 @@ async def chat(request: Request, user: str = Depends(get_current_user)):
         "audio_url":         audio_url,
         "avatar_waiting":    "/static/avatar waiting.mp4",
         "avatar_speaking":   "/static/avatar talking.mp4",
-        "typing_simulation": make_typing_simulation(answer),
+        **typing_fields(answer, response_format(request, form)),
     }
 
 # ─── /transcribe/ endpoint ───
-@app.post("/transcribe/")
-async def transcribe_audio(
-    audio: UploadFile = File(...),
-    user: str = Depends(get_current_user)
-):
-    uid     = uuid.uuid4().hex
-    in_webm = os.path.join(audio_dir, f"{uid}_in.webm")
-    in_wav  = os.path.join(audio_dir, f"{uid}_in.wav")
-
-    with open(in_webm, "wb") as f:
-        f.write(await audio.read())
-
-    audio_path = in_webm
-    if ffmpeg_bin and os.path.isfile(ffmpeg_bin):
-        try:
-            subprocess.run(
-                [ffmpeg_bin, "-y", "-i", in_webm, "-ac", "1", "-ar", "16000", in_wav],
-                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
-            )
-            if os.path.getsize(in_wav) > 0:
-                audio_path = in_wav
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg STT conversion failed:\n{e.stderr}")
+def stt_busy(e: STTBusy) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Speech recognition is busy, please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
 
+async def stt_form(request: Request):
+    """
+    Parse an upload form for the STT endpoints, checking STT capacity first:
+    a full queue is a 503 before the multipart body is read at all. Returns
+    (form, audio).
+    """
     try:
-        transcript = transcribe(audio_path)
+        stt_pool.check()
+    except STTBusy as e:
+        raise stt_busy(e)
+    form  = await request.form()
+    audio = form.get("audio")
+    if audio is None or isinstance(audio, str):
+        raise HTTPException(status_code=422, detail="An 'audio' file is required.")
+    return form, audio
+
+async def transcribe_upload(audio: UploadFile) -> str:
+    """Decode an uploaded recording in memory (16 kHz mono float32) and queue it for the STT workers."""
+    data = await audio.read()
+    try:
+        samples = await decode_upload(data, ffmpeg_bin)
+        return await stt_pool.transcribe(samples)
+    except STTBusy as e:
+        raise stt_busy(e)
     except Exception as e:
         logger.error(f"STT failed: {e}")
-        transcript = ""
+        return ""
 
+@app.post("/transcribe/")
+async def transcribe_audio(request: Request, user: str = Depends(get_current_user)):
+    _, audio = await stt_form(request)
+    transcript = await transcribe_upload(audio)
     return {"transcript": transcript}
 
 # ─── /ask/ endpoint ───
 @app.post("/ask/")
-async def ask(
-    request: Request,
-    audio: UploadFile = File(...),
-    user: str = Depends(get_current_user)
-):
-    form        = await request.form()
+async def ask(request: Request, user: str = Depends(get_current_user)):
+    form, audio = await stt_form(request)
     history_raw = form.get("history", "[]")
     session_id  = form.get("session_id") or uuid.uuid4().hex
 
@@ -401,70 +820,12 @@ async def ask(
     except json.JSONDecodeError:
         chat_history = []
 
-    uid     = uuid.uuid4().hex
-    in_webm = os.path.join(audio_dir, f"{uid}_in.webm")
-    in_wav  = os.path.join(audio_dir, f"{uid}_in.wav")
-    out_wav = os.path.join(audio_dir, f"{uid}_out.wav")
-
-    with open(in_webm, "wb") as f:
-        f.write(await audio.read())
-
-    audio_path = in_webm
-    if ffmpeg_bin and os.path.isfile(ffmpeg_bin):
-        try:
-            subprocess.run(
-                [ffmpeg_bin, "-y", "-i", in_webm, "-ac", "1", "-ar", "16000", in_wav],
-                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
-            )
-            if os.path.getsize(in_wav) > 0:
-                audio_path = in_wav
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg conversion failed:\n{e.stderr}")
-
-    try:
-        question = transcribe(audio_path)
-    except Exception as e:
-        logger.error(f"STT failed: {e}")
-        question = ""
+    question = await transcribe_upload(audio)
     logger.info(f"[STT] Transcript: {question!r}")
 
     lang = detect_language(question)
-
-    if not question.strip():
-        answer, citation = (
-            ("Sorry, I couldn't understand the question.", "")
-            if lang=="en" else ("عذراً، لم أتمكن من الفهم.", "")
-        )
-    elif is_greeting(question):
-        import random
-        answer = random.choice(
-            GREETINGS_RESPONSES_EN if lang=="en" else GREETINGS_RESPONSES_AR
-        )
-        citation = ""
-    else:
-        chunks = get_relevant_chunks(question, top_k=3)
-        if chunks:
-            result = generate_answer(chunks, question, chat_history, target_lang=lang)
-            answer, citation = result if isinstance(result, tuple) else (result, "")
-        else:
-            answer, citation = (
-                ("Sorry, I don’t know.", "") if lang=="en"
-                else ("عذراً، لا أعرف.", "")
-            )
-
-    await synthesize(answer, out_wav)
-    audio_url = f"/audio/{uid}_out.wav"
-
-    existing = []
-    if os.path.exists(hist_path):
-        with open(hist_path, "r", encoding="utf-8") as f:
-            existing = json.load(f)
-    existing.extend([
-        {"role": "user",      "text": question},
-        {"role": "assistant", "text": answer, "citation": citation, "audio_url": audio_url}
-    ])
-    with open(hist_path, "w", encoding="utf-8") as f:
-        json.dump(existing, f, ensure_ascii=False, indent=2)
+    answer, citation, audio_url = await answer_question(question, lang, chat_history, client_gone(request), hist_path)
+    append_history(hist_path, question, answer, citation, audio_url)
 
     return {
         "session_id":        session_id,
@@ -474,10 +835,79 @@ async def ask(
         "audio_url":         audio_url,
         "avatar_waiting":    "/static/avatar waiting.mp4",
         "avatar_speaking":   "/static/avatar talking.mp4",
-        "typing_simulation": make_typing_simulation(answer),
+        **typing_fields(answer, response_format(request, form)),
     }
 
+# ─── Streaming /chat/ and /ask/ (Server-Sent Events) ───
+@app.post("/chat/stream")
+async def chat_stream(request: Request, user: str = Depends(get_current_user)):
+    form        = await request.form()
+    question    = form.get("question", "").strip()
+    history_raw = form.get("history", "[]")
+    session_id  = form.get("session_id") or uuid.uuid4().hex
+
+    hist_path = os.path.join(user_dir(user), f"{session_id}.json")
+    try:
+        chat_history = json.loads(history_raw)
+    except json.JSONDecodeError:
+        chat_history = []
+
+    lang = detect_language(question)
+    return stream_response(question, lang, chat_history, session_id, hist_path, response_format(request, form))
+
+@app.post("/ask/stream")
+async def ask_stream(request: Request, user: str = Depends(get_current_user)):
+    form, audio = await stt_form(request)
+    history_raw = form.get("history", "[]")
+    session_id  = form.get("session_id") or uuid.uuid4().hex
+
+    hist_path = os.path.join(user_dir(user), f"{session_id}.json")
+    try:
+        chat_history = json.loads(history_raw)
+    except json.JSONDecodeError:
+        chat_history = []
+
+    question = await transcribe_upload(audio)
+    logger.info(f"[STT] Transcript: {question!r}")
+
+    lang = detect_language(question)
+    return stream_response(question, lang, chat_history, session_id, hist_path, response_format(request, form))
+
 # ─── /translate/ endpoint ───
+def translation_prompt(text: str, target: str) -> str:
+    return (
+        f"{'Translate the following English text into Arabic. Only return the translated text' if target=='ar' else 'Translate the following text into English. Only return the translated text'}:\n\n"
+        f"{text}\n\n"
+        f"{'الترجمة:' if target=='ar' else 'Translation:'}"
+    )
+
+async def voice_translation(text: str, target: str, translation: str, ok: bool):
+    """Render the translation's audio and, if the LLM succeeded, cache both. Returns the audio URL."""
+    uid     = uuid.uuid4().hex
+    out_path = os.path.join(audio_dir, f"{uid}_trans.{audio_suffix}")
+    audio_url = None
+    try:
+        await synthesize(translation, out_path, tts_store, audio_format)
+        audio_url = audio_url_for(out_path)
+    except Exception as e:
+        logger.error(f"TTS for translation failed: {e}")
+    if ok and translation_cache is not None:
+        try:
+            await asyncio.to_thread(
+                translation_cache.put, text, target, translation, out_path if audio_url else None
+            )
+        except Exception as e:
+            logger.error(f"Translation cache store failed: {e}")
+    return audio_url
+
+def cached_translation(text: str, target: str):
+    """(translation, audio_url) from the cache, or None."""
+    hit = translation_cache.get(text, target) if translation_cache is not None else None
+    if not hit:
+        return None
+    path = translation_cache.audio_path(hit)
+    return hit["translation"], audio_url_for(path) if path else None
+
 @app.post("/translate/")
 async def translate_text(
     request: Request,
@@ -488,29 +918,119 @@ async def translate_text(
 
     orig   = detect_language(text)
     target = "ar" if orig=="en" else "en"
-    prompt = (
-        f"{'Translate the following English text into Arabic. Only return the translated text' if target=='ar' else 'Translate the following text into English. Only return the translated text'}:\n\n"
-        f"{text}\n\n"
-        f"{'الترجمة:' if target=='ar' else 'Translation:'}"
-    )
+    cached = cached_translation(text, target)
+    if cached:
+        translation, audio_url = cached
+        return {"translation": translation, "citation": "- Translated by AI", "audio_url": audio_url}
 
     try:
-        resp = llm.generate([prompt])
-        translation = resp.generations[0][0].text.strip()
+        translation = await complete(
+            translation_prompt(text, target), TRANSLATE,
+            timeout=llm_cfg.get("translate_timeout", 60), abandon=client_gone(request)
+        )
+        ok = True
     except Exception as e:
         logger.error(f"Translation failed: {e}")
-        translation = text
+        translation, ok = text, False
 
-    uid     = uuid.uuid4().hex
-    out_wav = os.path.join(audio_dir, f"{uid}_trans.wav")
-    audio_url = None
+    audio_url = await voice_translation(text, target, translation, ok)
+    return {"translation": translation, "citation": "- Translated by AI", "audio_url": audio_url}
+
+@app.post("/translate/batch")
+async def translate_batch(
+    request: Request,
+    user: str = Depends(get_current_user)
+):
+    """
+    Translate many texts at once: either {"texts": [...]} or {"session_id": ...}
+    for every assistant message of a session. Cached translations are served
+    directly; the rest run back to back as ONE job on the LLM scheduler
+    (a single queue slot) and are then voiced concurrently. Pass
+    "audio": false to skip TTS for new translations.
+    """
+    body = await request.json()
+    texts = body.get("texts")
+    if texts is None and body.get("session_id"):
+        hist_path = os.path.join(user_dir(user), f"{body['session_id']}.json")
+        if not os.path.exists(hist_path):
+            raise HTTPException(status_code=404, detail="Session not found")
+        with open(hist_path, "r", encoding="utf-8") as f:
+            texts = [m["text"] for m in json.load(f) if m.get("role") == "assistant" and m.get("text")]
+    if not isinstance(texts, list):
+        raise HTTPException(status_code=400, detail="Send a list of texts or a session_id.")
+    if not all(isinstance(text, str) for text in texts):
+        raise HTTPException(status_code=422, detail="Every item of texts must be a string.")
+    with_audio = body.get("audio", True)
+
+    results, pending = {}, {}
+    for text in texts:
+        target = "ar" if detect_language(text)=="en" else "en"
+        if (text, target) in results or (text, target) in pending:
+            continue
+        cached = cached_translation(text, target)
+        if cached:
+            results[(text, target)] = cached
+        else:
+            pending[(text, target)] = translation_prompt(text, target)
+
+    async def translate_pending():
+        out = {}
+        for key, prompt in pending.items():
+            try:
+                out[key] = ((await llm.ainvoke(prompt)).strip(), True)
+            except Exception as e:
+                logger.error(f"Batch translation failed: {e}")
+                out[key] = (key[0], False)
+        return out
+
+    if pending:
+        timeout = llm_cfg.get("translate_timeout", 60) * len(pending)
+        try:
+            translated = await scheduler.run(
+                TRANSLATE, translate_pending, timeout=timeout, abandon=client_gone(request)
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Batch translation took too long.")
+
+        async def finish(key, translation, ok):
+            audio_url = None
+            if with_audio:
+                audio_url = await voice_translation(key[0], key[1], translation, ok)
+            elif ok and translation_cache is not None:
+                await asyncio.to_thread(translation_cache.put, key[0], key[1], translation)
+            results[key] = (translation, audio_url)
+
+        await asyncio.gather(*(finish(key, *value) for key, value in translated.items()))
+
+    items = []
+    for text in texts:
+        target = "ar" if detect_language(text)=="en" else "en"
+        translation, audio_url = results[(text, target)]
+        items.append({"text": text, "translation": translation, "audio_url": audio_url})
+    return {"translations": items, "citation": "- Translated by AI"}
+
+# ─── Index management ───
+@app.post("/index/reload")
+async def reload_index(user: str = Depends(get_admin_user)):
     try:
-        await synthesize(translation, out_wav)
-        audio_url = f"/audio/{uid}_trans.wav"
+        count = reload_retrievers()
     except Exception as e:
-        logger.error(f"TTS for translation failed: {e}")
+        logger.error(f"Index reload failed: {e}")
+        raise HTTPException(status_code=500, detail="Index reload failed")
+    return {"status": "reloaded", "retrievers": count}
 
-    return {"translation": translation, "citation": "- Translated by AI", "audio_url": audio_url}
+@app.get("/stats")
+async def get_stats(user: str = Depends(get_admin_user)):
+    return {
+        "retrieval":         cache_stats(),
+        "answer_cache":      answer_cache.stats() if answer_cache else None,
+        "translation_cache": translation_cache.stats() if translation_cache else None,
+        "tts_store":         tts_store.stats() if tts_store else None,
+        "tts":               tts_stats(),
+        "audio_janitor":     audio_janitor.stats() if audio_janitor else None,
+        "stt":               stt_pool.stats(),
+        "llm":               {**scheduler.stats(), "single_flight": inflight.stats()},
+    }
 
 # ─── Session management ───
 @app.post("/sessions/new")
@@ -533,6 +1053,8 @@ async def list_sessions(user: str = Depends(get_current_user)):
         if not fname.endswith(".json") or fname == "metadata.json":
             continue
         sid   = fname[:-5]
+        if "." in sid:
+            continue  # sidecar files such as <sid>.summary.json
         fpath = os.path.join(ud, fname)
         mtime = os.path.getmtime(fpath)
         name  = meta.get(sid, sid[:8])
@@ -577,8 +1099,9 @@ async def delete_session_endpoint(
 ):
     ud = user_dir(user)
     hist_path = os.path.join(ud, f"{session_id}.json")
-    if os.path.exists(hist_path):
-        os.remove(hist_path)
+    for path in [hist_path, *glob.glob(os.path.join(ud, f"{glob.escape(session_id)}.*.json"))]:
+        if os.path.exists(path):
+            os.remove(path)
     meta = load_metadata(user)
     if session_id in meta:
         del meta[session_id]
@@ -594,23 +1117,9 @@ async def autosummarize_session(
     hist_path = os.path.join(ud, f"{session_id}.json")
     if not os.path.exists(hist_path):
         raise HTTPException(status_code=404, detail="Session not found")
-    with open(hist_path, "r", encoding="utf-8") as f:
-        conv = json.load(f)
-    transcript = "\n".join(f"{m['role'].title()}: {m['text']}" for m in conv)
-    prompt = (
-        "Please provide a very short, descriptive title (5 words or fewer) "
-        "for the following conversation:\n\n"
-        f"{transcript}\n\nTitle:"
-    )
-    try:
-        resp = llm.generate([prompt])
-        title = resp.generations[0][0].text.strip()
-    except Exception:
-        title = session_id[:8]
-    meta = load_metadata(user)
-    meta[session_id] = title
-    save_metadata(user, meta)
-    return {"session_id": session_id, "name": title}
+    # an explicit request always retitles, and waits for the result
+    name = await auto_title(hist_path, force=True)
+    return {"session_id": session_id, "name": name}
 
 # ─── Static mounts ───
 app.mount("/static",
@@ -0,0 +1,163 @@
+# online/stt/pool.py
+
+import asyncio
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from online.stt.whisper_stt import load_model, transcribe
+
+log = logging.getLogger(__name__)
+
+
+class STTBusy(Exception):
+    """The STT queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"STT queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# each worker (thread or process) keeps its own model
+_local = threading.local()
+
+def _init_worker(model_kwargs: dict):
+    _local.model = load_model(**model_kwargs)
+
+def _run_in_worker(samples, language: str) -> str:
+    return transcribe(samples, _local.model, language)
+
+
+def _summary(values) -> dict:
+    if not values:
+        return {"avg": None, "p95": None, "max": None}
+    ordered = sorted(values)
+    return {
+        "avg": round(sum(ordered) / len(ordered), 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+class STTPool:
+    """
+    Whisper workers behind a bounded queue.
+
+    Each worker is a single-threaded executor (a thread, or a process to
+    sidestep the GIL) holding its own model, sized by cpu_threads /
+    num_workers in model_kwargs. Jobs wait in a queue of at most queue_size;
+    when it is full, callers get STTBusy right away with a Retry-After
+    estimate instead of piling up. Wait and run times of the last 100 jobs
+    are kept for /stats.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        mode: str = "thread",
+        queue_size: int = 8,
+        retry_after: int = 5,
+        language: str = "en",
+        model_kwargs: dict = None,
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown stt.mode '{mode}' (expected 'thread' or 'process')")
+        self.workers      = max(1, int(workers))
+        self.mode         = mode
+        self.queue_size   = max(1, int(queue_size))
+        self.retry_after  = retry_after
+        self.language     = language
+        self.model_kwargs = model_kwargs or {}
+        self._queue       = None
+        self._executors: list = []
+        self._tasks: list = []
+        self._busy        = 0
+        self._recent      = deque(maxlen=100)   # (wait_ms, run_ms)
+        self.completed = self.failed = self.rejected = 0
+
+    def start(self):
+        """Spawn the workers and start loading their models (needs a running loop)."""
+        if self._queue is not None:
+            return
+        Executor = ProcessPoolExecutor if self.mode == "process" else ThreadPoolExecutor
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        for _ in range(self.workers):
+            executor = Executor(max_workers=1, initializer=_init_worker, initargs=(self.model_kwargs,))
+            executor.submit(int)   # runs the initializer now: models load before the first question
+            self._executors.append(executor)
+            self._tasks.append(asyncio.ensure_future(self._work(executor)))
+        log.info(f"STT pool: {self.workers} {self.mode} worker(s), queue of {self.queue_size}")
+
+    def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._tasks, self._executors, self._queue = [], [], None
+
+    def _estimate_wait(self) -> int:
+        runs = [run for _, run in self._recent]
+        if not runs:
+            return self.retry_after
+        per_job = sum(runs) / len(runs) / 1000
+        return max(1, math.ceil(per_job * (self._queue.qsize() + self._busy) / self.workers))
+
+    def check(self):
+        """Raise STTBusy if a job submitted now would not fit in the queue."""
+        self.start()
+        if self._queue.full():
+            self.rejected += 1
+            raise STTBusy(self._estimate_wait())
+
+    async def transcribe(self, samples) -> str:
+        self.check()
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((samples, fut, time.monotonic()))
+        return await fut
+
+    async def _work(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            samples, fut, queued = await self._queue.get()
+            if fut.done():
+                continue   # the caller went away while queued
+            started = time.monotonic()
+            self._busy += 1
+            try:
+                text = await loop.run_in_executor(executor, _run_in_worker, samples, self.language)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                self.completed += 1
+                if not fut.done():
+                    fut.set_result(text)
+            finally:
+                self._busy -= 1
+                self._recent.append(((started - queued) * 1000, (time.monotonic() - started) * 1000))
+
+    def stats(self) -> dict:
+        return {
+            "mode":        self.mode,
+            "workers":     self.workers,
+            "busy":        self._busy,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size":  self.queue_size,
+            "completed":   self.completed,
+            "failed":      self.failed,
+            "rejected":    self.rejected,
+            "wait_ms":     _summary([wait for wait, _ in self._recent]),
+            "run_ms":      _summary([run for _, run in self._recent]),
+        }
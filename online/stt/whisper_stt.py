@@ -1,26 +1,80 @@
 # online/stt/whisper_stt.py
 
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
+import asyncio
+import io
+import logging
+import os
+import shutil
 import sys
 
+import numpy as np
 
-# Initialize the Faster Whisper model once
-model = WhisperModel(
-    model_size_or_path="medium",  # tiny/small/medium/large-v2...
-    device="cpu",                 # or "cuda"
-    compute_type="int8"           # reduces memory
-)
+log = logging.getLogger(__name__)
 
-def transcribe(audio_path: str) -> str:
+SAMPLE_RATE = 16000   # what Whisper expects: 16 kHz mono float32
+
+
+def load_model(model_size_or_path: str = "medium", device: str = "cpu", compute_type: str = "int8", **kwargs):
+    """
+    One Faster Whisper model. cpu_threads / num_workers (in kwargs) size
+    its own parallelism; each STT worker loads its own.
+    """
+    return WhisperModel(
+        model_size_or_path=model_size_or_path,  # tiny/small/medium/large-v2...
+        device=device,                          # or "cuda"
+        compute_type=compute_type,              # int8 reduces memory
+        **kwargs,
+    )
+
+_model = None
+
+def transcribe(audio, model=None, language: str = "en") -> str:
     """
-    Transcribe the given audio file, forcing English only.
+    Transcribe an audio file path or a 16 kHz mono float32 array, forcing
+    English by default. Without a model, a default one is loaded on first use.
     """
+    global _model
+    if model is None:
+        if _model is None:
+            _model = load_model()
+        model = _model
     segments, _ = model.transcribe(
-        audio_path,
-        language="en"   # <<< force English
+        audio,
+        language=language   # <<< forced, no detection pass
     )
     return "".join(segment.text for segment in segments)
 
+async def _ffmpeg_decode(data: bytes, ffmpeg: str) -> np.ndarray:
+    """Pipe the recording through an ffmpeg child process: container in, raw f32le PCM out."""
+    proc = await asyncio.create_subprocess_exec(
+        ffmpeg, "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+        "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    out, err = await proc.communicate(data)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {err.decode('utf-8', 'ignore').strip()}")
+    return np.frombuffer(out, dtype=np.float32)
+
+async def decode_upload(data: bytes, ffmpeg: str = None) -> np.ndarray:
+    """
+    Decode an uploaded recording (webm/ogg/wav/...) in memory to the array
+    Whisper takes. PyAV (faster-whisper's decoder) runs in a worker thread;
+    if it cannot read the upload, an ffmpeg pipe is tried. No temp files,
+    nothing blocking the event loop.
+    """
+    try:
+        return await asyncio.to_thread(decode_audio, io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+    except Exception as e:
+        ffmpeg = ffmpeg or os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+        if not ffmpeg or not os.path.isfile(ffmpeg):
+            raise
+        log.warning(f"In-process decode failed ({e}), falling back to ffmpeg")
+        return await _ffmpeg_decode(data, ffmpeg)
+
 
 
 if __name__ == "__main__":
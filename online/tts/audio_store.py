@@ -0,0 +1,126 @@
+# online/tts/audio_store.py
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def speech_key(text: str, voice: str, rate: str, fmt: str) -> str:
+    """Content address of a rendering: the cleaned text and everything that changes its sound."""
+    raw = "\x1f".join((text, voice, rate, fmt))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src: str, dst: str):
+    """Hardlink src to dst (copy across filesystems), replacing dst."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class AudioStore:
+    """
+    Content-addressed store of rendered speech: one file per speech_key,
+    named <key>.<fmt> in store_dir, so identical text in the same voice is
+    rendered once and then linked or served directly. The total size is
+    kept under max_bytes by evicting the least recently used files; pinned
+    keys (the pre-warmed fixed replies) are never evicted. Recency is the
+    file mtime, so it survives restarts.
+    """
+
+    def __init__(self, store_dir: str, max_bytes: int = 200 * 1024 * 1024):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._files: OrderedDict = OrderedDict()   # name -> size, least recently used first
+        self._bytes  = 0
+        self._pinned: set = set()
+        self._lock   = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.store_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        for name in list(self._files):
+            if self._bytes <= self.max_bytes:
+                break
+            if name in self._pinned:
+                continue
+            self._bytes -= self._files.pop(name)
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.store_dir, name))
+            except OSError:
+                pass
+
+    def path(self, key: str, fmt: str = "wav") -> str:
+        return os.path.join(self.store_dir, f"{key}.{fmt}")
+
+    def get(self, key: str, fmt: str = "wav"):
+        """Path of the stored rendering, or None."""
+        name = f"{key}.{fmt}"
+        with self._lock:
+            if name in self._files and os.path.exists(os.path.join(self.store_dir, name)):
+                self._files.move_to_end(name)
+                self.hits += 1
+            else:
+                if name in self._files:
+                    self._bytes -= self._files.pop(name)   # removed behind our back
+                self.misses += 1
+                return None
+        path = os.path.join(self.store_dir, name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key: str, src_path: str, fmt: str = "wav", pin: bool = False) -> str:
+        """Link (or copy) a finished rendering into the store; returns its stored path."""
+        name = f"{key}.{fmt}"
+        path = os.path.join(self.store_dir, name)
+        link_or_copy(src_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._bytes += size - self._files.pop(name, 0)
+            self._files[name] = size
+            if pin:
+                self._pinned.add(name)
+            self._evict()
+        return path
+
+    def pin(self, key: str, fmt: str = "wav"):
+        with self._lock:
+            self._pinned.add(f"{key}.{fmt}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "files":     len(self._files),
+            "bytes":     self._bytes,
+            "max_bytes": self.max_bytes,
+            "pinned":    len(self._pinned),
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+            "hit_rate":  round(self.hits / lookups, 4) if lookups else 0.0,
+        }
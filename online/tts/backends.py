@@ -0,0 +1,264 @@
+# online/tts/backends.py
+
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+EN_VOICE = "en-US-AvaNeural"
+AR_VOICE = "ar-EG-SalmaNeural"
+
+
+class TTSBackend:
+    """
+    What the TTS service needs from a speech engine: render cleaned text in
+    a language to audio bytes (in the container named by `fmt`), and say
+    which (voice, rate) that is, so renderings can be content-addressed.
+    """
+
+    name = None
+    fmt  = "mp3"
+
+    def supports(self, lang: str) -> bool:
+        return True
+
+    def voice(self, lang: str):
+        raise NotImplementedError
+
+    async def render(self, text: str, lang: str) -> bytes:
+        raise NotImplementedError
+
+
+class EdgeBackend(TTSBackend):
+    """Microsoft edge-tts neural voices (network); mp3 buffered in memory."""
+
+    name = "edge"
+    VOICES = {"en": (EN_VOICE, "+0%"), "ar": (AR_VOICE, "+10%")}
+
+    def __init__(self, **_):
+        from edge_tts import Communicate
+        from edge_tts.exceptions import NoAudioReceived
+
+        self._communicate = Communicate
+        self._no_audio    = NoAudioReceived
+
+    def voice(self, lang: str):
+        # the Arabic voice reads both Arabic & English
+        return self.VOICES.get(lang, self.VOICES["en"])
+
+    async def render(self, text: str, lang: str) -> bytes:
+        voice, rate = self.voice(lang)
+        buf = bytearray()
+        async for chunk in self._communicate(text=text, voice=voice, rate=rate).stream():
+            if chunk["type"] == "audio":
+                buf += chunk["data"]
+        if not buf:
+            raise self._no_audio("No audio was received.")
+        return bytes(buf)
+
+
+class Pyttsx3Backend(TTSBackend):
+    """
+    Offline system voices (SAPI5 / NSSpeechSynthesizer / eSpeak) through
+    pyttsx3. The engine is not thread-safe, so every call runs on one
+    dedicated worker thread. A language is only supported if the system
+    has a voice for it.
+    """
+
+    name = "pyttsx3"
+    fmt  = "wav"
+
+    def __init__(self, rate: int = 175, **_):
+        import pyttsx3
+
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyttsx3")
+        self._engine = self._pool.submit(pyttsx3.init).result()
+        self.rate = rate
+        self._voices = {}
+        for v in self._engine.getProperty("voices"):
+            tags = " ".join([v.id, v.name or ""] + [
+                l.decode("utf-8", "ignore") if isinstance(l, bytes) else str(l) for l in (v.languages or [])
+            ]).lower()
+            for lang, hints in (("en", ("en", "english")), ("ar", ("ar", "arabic"))):
+                if lang not in self._voices and any(h in tags for h in hints):
+                    self._voices[lang] = v.id
+
+    def supports(self, lang: str) -> bool:
+        return lang in self._voices
+
+    def voice(self, lang: str):
+        return f"pyttsx3:{self._voices.get(lang)}", str(self.rate)
+
+    def _render_sync(self, text: str, lang: str) -> bytes:
+        # pyttsx3 has no in-memory output: save_to_file() is its only way to
+        # capture speech, so the rendering goes through a temp file that is
+        # read back and deleted here; callers still only ever see bytes
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self._engine.setProperty("voice", self._voices[lang])
+            self._engine.setProperty("rate", self.rate)
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.unlink(path)
+        if not data:
+            raise RuntimeError("pyttsx3 produced no audio")
+        return data
+
+    async def render(self, text: str, lang: str) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._render_sync, text, lang)
+
+
+class StubBackend(TTSBackend):
+    """
+    Deterministic stand-in for load testing: silence whose length follows
+    the text (ms_per_char), after an optional delay emulating the engine's
+    latency. No network, no ffmpeg.
+    """
+
+    name = "stub"
+    fmt  = "wav"
+
+    def __init__(self, delay: float = 0.0, ms_per_char: int = 60, sample_rate: int = 16000, **_):
+        self.delay       = delay
+        self.ms_per_char = ms_per_char
+        self.sample_rate = sample_rate
+
+    def voice(self, lang: str):
+        return f"stub:{lang}", "+0%"
+
+    async def render(self, text: str, lang: str) -> bytes:
+        await asyncio.sleep(self.delay)
+        frames = self.sample_rate * len(text) * self.ms_per_char // 1000
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(b"\x00\x00" * frames)
+        return buf.getvalue()
+
+
+BACKENDS = {
+    EdgeBackend.name:    EdgeBackend,
+    Pyttsx3Backend.name: Pyttsx3Backend,
+    StubBackend.name:    StubBackend,
+}
+
+
+class TTSRouter:
+    """
+    Per-language chains of backends, tried in order. A backend that errors,
+    or does not answer within `budget` seconds, hands the text to the next
+    one (the last in the chain is always waited for). A backend that failed,
+    or whose average latency exceeds the budget, is moved to the back of
+    the chains for `cooldown` seconds, so a slow network voice stops
+    delaying every answer.
+    """
+
+    def __init__(self, chains: dict, budget: float = 6.0, cooldown: float = 60.0):
+        self.chains   = chains
+        self.budget   = budget
+        self.cooldown = cooldown
+        self._stats   = {}
+
+    def _stat(self, backend):
+        return self._stats.setdefault(backend.name, {
+            "calls": 0, "failures": 0, "timeouts": 0, "latency_ms": None, "slow_until": 0.0,
+        })
+
+    def _order(self, lang: str):
+        now = time.monotonic()
+        chain = [b for b in self.chains.get(lang) or self.chains.get("en", []) if b.supports(lang)]
+        return sorted(chain, key=lambda b: self._stat(b)["slow_until"] > now)
+
+    def preferred(self, lang: str):
+        """The backend a text in lang is expected to be rendered by (for cache lookups)."""
+        chain = self._order(lang)
+        if not chain:
+            raise RuntimeError(f"No TTS backend configured for '{lang}'")
+        return chain[0]
+
+    async def render(self, text: str, lang: str):
+        """Returns (audio_bytes, fmt, voice, rate) from the first backend that delivers."""
+        chain = self._order(lang)
+        if not chain:
+            raise RuntimeError(f"No TTS backend configured for '{lang}'")
+        for i, backend in enumerate(chain):
+            stat = self._stat(backend)
+            stat["calls"] += 1
+            last = i == len(chain) - 1
+            start = time.monotonic()
+            try:
+                call = backend.render(text, lang)
+                data = await (call if last or not self.budget else asyncio.wait_for(call, self.budget))
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                stat["timeouts" if timed_out else "failures"] += 1
+                stat["slow_until"] = time.monotonic() + self.cooldown
+                if last:
+                    raise
+                log.warning(
+                    f"TTS backend '{backend.name}' {'too slow' if timed_out else f'failed ({e})'}, "
+                    f"trying '{chain[i + 1].name}'"
+                )
+                continue
+            elapsed = (time.monotonic() - start) * 1000
+            avg = stat["latency_ms"]
+            stat["latency_ms"] = elapsed if avg is None else 0.7 * avg + 0.3 * elapsed
+            if self.budget and stat["latency_ms"] > self.budget * 1000:
+                stat["slow_until"] = time.monotonic() + self.cooldown
+            return (data, backend.fmt, *backend.voice(lang))
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "chains": {lang: [b.name for b in self._order(lang)] for lang in self.chains},
+            "backends": {
+                name: {
+                    "calls":      s["calls"],
+                    "failures":   s["failures"],
+                    "timeouts":   s["timeouts"],
+                    "latency_ms": round(s["latency_ms"], 1) if s["latency_ms"] is not None else None,
+                    "demoted":    s["slow_until"] > now,
+                }
+                for name, s in self._stats.items()
+            },
+        }
+
+
+def create_router(cfg: dict) -> TTSRouter:
+    """
+    Build the per-language chains from tts.backends in settings.yaml
+    (default: edge for both languages). A backend that cannot be created
+    (e.g. pyttsx3 not installed) is left out with an error in the log.
+    """
+    options = cfg.get("backend_options") or {}
+    created, chains = {}, {}
+    for lang, names in (cfg.get("backends") or {"en": ["edge"], "ar": ["edge"]}).items():
+        chains[lang] = []
+        for name in names if isinstance(names, list) else [names]:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown TTS backend '{name}' (expected one of {sorted(BACKENDS)})")
+            if name not in created:
+                try:
+                    created[name] = BACKENDS[name](**(options.get(name) or {}))
+                except Exception as e:
+                    log.error(f"TTS backend '{name}' unavailable: {e}")
+                    created[name] = None
+            if created[name] is not None:
+                chains[lang].append(created[name])
+    return TTSRouter(
+        chains,
+        budget=cfg.get("fallback_after_s", 6.0),
+        cooldown=cfg.get("fallback_cooldown_s", 60.0),
+    )
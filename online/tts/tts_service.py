@@ -1,13 +1,29 @@
+import io
 import os
+import sys
 import shutil
 import re
-import tempfile
+import uuid
+import asyncio
 import logging
-import unicodedata
+import threading
 
 from pydub import AudioSegment
-from edge_tts import Communicate
-from edge_tts.exceptions import NoAudioReceived
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from online.tts.audio_store import speech_key, link_or_copy
+from online.tts.backends import create_router
+from config import get_section
+
+tts_cfg = get_section("tts")
+PARALLEL_MIN_CHARS = tts_cfg.get("parallel_min_chars", 300)   # longer texts are voiced in segments…
+SEGMENT_CHARS      = tts_cfg.get("segment_chars", 250)        # …of whole sentences up to this long…
+MAX_PARALLEL       = tts_cfg.get("max_parallel", 4)           # …at most this many at a time
+SEGMENT_RETRIES    = tts_cfg.get("segment_retries", 2)
+CROSSFADE_MS       = tts_cfg.get("crossfade_ms", 0)           # overlap between joined segments
 
 log = logging.getLogger(__name__)
 
@@ -22,8 +38,22 @@ os.environ["PATH"] = f"{ffmpeg_dir}{os.pathsep}{os.environ.get('PATH','')}"
 os.environ["FFMPEG_BINARY"]  = ffmpeg_bin
 os.environ["FFPROBE_BINARY"] = shutil.which("ffprobe") or ffmpeg_bin
 
-EN_VOICE = "en-US-AvaNeural"
-AR_VOICE = "ar-EG-SalmaNeural"
+# per-language backend chains (edge-tts, pyttsx3, stub) with latency-based fallback,
+# built on first use: engines such as pyttsx3 start up when created, not on import
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = create_router(tts_cfg)
+    return _router
+
+# served audio formats -> file extension. A rendering already in the served
+# format (edge-tts mp3) is written as received; others are transcoded in memory.
+AUDIO_FORMATS = {"mp3": "mp3", "opus": "opus", "wav": "wav"}
 
 # Unicode range for Arabic script detection
 ARABIC_RANGE = (
@@ -38,54 +68,261 @@ RE_ARABIC = re.compile(f"[{ARABIC_RANGE}]")
 # keep only English letters, Arabic letters, and whitespace
 CLEAN_RE = re.compile(r"[^A-Za-z\u0600-\u06FF\s]+")
 
+# a sentence ends at . ! ? … or Arabic ؟ followed by whitespace, or at a line break
+SENTENCE_END = re.compile(r"(?<=[.!?…؟])\s+|\s*\n\s*")
+
 
 def detect_language(text: str) -> str:
     return "ar" if re.search(r'[\u0600-\u06FF]', text) else "en"
 
-def _mp3_to_wav(mp3_path: str, wav_path: str):
-    """Convert mp3 → wav and delete the temporary mp3."""
-    wav = AudioSegment.from_file(mp3_path, format="mp3")
-    os.makedirs(os.path.dirname(wav_path), exist_ok=True)
-    wav.export(wav_path, format="wav")
-    os.unlink(mp3_path)
+def audio_ext(fmt: str) -> str:
+    if fmt not in AUDIO_FORMATS:
+        raise ValueError(f"Unknown TTS format '{fmt}' (expected one of {sorted(AUDIO_FORMATS)})")
+    return AUDIO_FORMATS[fmt]
 
-async def _synth_mixed(text: str, outpath: str):
-    # 1) strip out ALL ASCII punctuation & digits
-    text = CLEAN_RE.sub("", text).strip()
-    if not text:
-        raise RuntimeError("Empty text for TTS after cleaning!")
+def tts_stats() -> dict:
+    return _router.stats() if _router is not None else {"chains": {}, "backends": {}}
+
+def _concat(segments):
+    """Join AudioSegments in order, overlapping neighbours by CROSSFADE_MS."""
+    combined = segments[0]
+    for seg in segments[1:]:
+        combined = combined.append(seg, crossfade=min(CROSSFADE_MS, len(combined), len(seg)))
+    return combined
 
-    # 2) detect Arabic presence
-    has_ar = bool(RE_ARABIC.search(text))
+def _export(audio, outpath: str, fmt: str):
+    if fmt == "opus":
+        audio.export(outpath, format="opus", codec="libopus", bitrate="32k")
+    else:
+        audio.export(outpath, format=fmt)
 
-    # 3) choose voice
-    if has_ar:
-        # Arabic voice will read both Arabic & English
-        tf = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-        tf.close()
+def _write_audio(parts, outpath: str, fmt: str):
+    """
+    Write (audio_bytes, source_fmt) renderings, in order, as one file in the
+    served format. Renderings already in that format are written as
+    received (mp3 frames simply concatenate); crossfades and everything else
+    go through pydub, in memory.
+    """
+    os.makedirs(os.path.dirname(outpath) or ".", exist_ok=True)
+    if all(src == fmt for _, src in parts) and (
+        len(parts) == 1 or (fmt == "mp3" and not CROSSFADE_MS)
+    ):
+        with open(outpath, "wb") as f:
+            for data, _ in parts:
+                f.write(data)
+        return
+    segments = [AudioSegment.from_file(io.BytesIO(data), format=src) for data, src in parts]
+    _export(_concat(segments), outpath, fmt)
+
+def split_segments(text: str, max_chars: int):
+    """Sentences of text, merged greedily into pieces of at most max_chars."""
+    pieces, current = [], ""
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def speech_params(text: str):
+    """(cleaned_text, lang) the text will be spoken with."""
+    # strip out ALL ASCII punctuation & digits
+    text = CLEAN_RE.sub("", text).strip()
+    # the Arabic voices read both Arabic & English
+    return text, "ar" if RE_ARABIC.search(text) else "en"
+
+async def _render_segment(text: str, lang: str):
+    """
+    Render one segment, retrying it on its own.
+    Returns (audio_bytes, fmt, voice, rate).
+    """
+    error = None
+    for attempt in range(SEGMENT_RETRIES + 1):
         try:
-            await Communicate(text=text, voice=AR_VOICE, rate="+10%").save(tf.name)
-            _mp3_to_wav(tf.name, outpath)
-            return
+            return await get_router().render(text, lang)
         except Exception as e:
-            log.error(f"Arabic-voice mixed TTS failed ({e}), falling back to English.")
-            try: os.unlink(tf.name)
-            except: pass
+            error = e
+            log.warning(f"TTS segment failed ({e}), attempt {attempt + 1}/{SEGMENT_RETRIES + 1}")
+            if attempt < SEGMENT_RETRIES:
+                await asyncio.sleep(0.25 * (attempt + 1))
+    raise error
+
+async def _render_pieces(pieces, lang: str):
+    """Render every piece in lang, at most MAX_PARALLEL at once; all or nothing."""
+    gate = asyncio.Semaphore(MAX_PARALLEL)
 
-    # 4) fallback to pure English
-    tf = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-    tf.close()
+    async def render(piece: str):
+        async with gate:
+            return await _render_segment(piece, lang)
+
+    tasks = [asyncio.ensure_future(render(piece)) for piece in pieces]
     try:
-        await Communicate(text=text, voice=EN_VOICE, rate="+0%").save(tf.name)
-        _mp3_to_wav(tf.name, outpath)
-    except NoAudioReceived:
-        log.error("English TTS produced no audio!")
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
         raise
+
+async def _synth_mixed(text: str, outpath: str, fmt: str = "wav"):
+    """
+    Render text into outpath; returns the (voice, rate) used, or that of a
+    fallback if any segment needed one. Texts longer than PARALLEL_MIN_CHARS
+    are split at sentence boundaries and the segments rendered concurrently
+    (at most MAX_PARALLEL at once), then joined in order. For Arabic, the
+    English chain is the last resort, and then for the whole text, so an
+    answer is never read in two voices.
+    """
+    cleaned, lang = speech_params(text)
+    if not cleaned:
+        raise RuntimeError("Empty text for TTS after cleaning!")
+    audio_ext(fmt)
+    expected = get_router().preferred(lang).voice(lang)
+
+    pieces = [cleaned]
+    if len(cleaned) > PARALLEL_MIN_CHARS:
+        pieces = [p for p in (CLEAN_RE.sub("", p).strip() for p in split_segments(text, SEGMENT_CHARS)) if p]
+
+    try:
+        results = await _render_pieces(pieces, lang)
     except Exception as e:
-        log.error(f"English TTS failed ({e})")
-        try: os.unlink(tf.name)
-        except: pass
-        raise
+        if lang == "en":
+            log.error(f"English TTS failed ({e})")
+            raise
+        log.error(f"Arabic-voice mixed TTS failed ({e}), falling back to English for the whole text.")
+        results = await _render_pieces(pieces, "en")
+    await asyncio.to_thread(_write_audio, [(data, src) for data, src, _, _ in results], outpath, fmt)
+    for _, _, voice, rate in results:
+        if (voice, rate) != expected:
+            return voice, rate
+    return expected
+
+async def speak(text: str, store, pin: bool = False, fmt: str = "wav") -> str:
+    """
+    Path of text's rendering in the AudioStore, synthesizing it on a miss.
+    A rendering that needed a fallback voice is stored under that voice's
+    key, so the preferred voice is tried again next time.
+    """
+    ext = audio_ext(fmt)
+    cleaned, lang = speech_params(text)
+    voice, rate = get_router().preferred(lang).voice(lang)
+    key = speech_key(cleaned, voice, rate, fmt)
+    path = store.get(key, ext)
+    if path:
+        if pin:
+            store.pin(key, ext)
+        return path
+    tmp = f"{store.path(key, ext)}.{uuid.uuid4().hex}.tmp"
+    try:
+        voice, rate = await _synth_mixed(text, tmp, fmt)
+        return store.put(speech_key(cleaned, voice, rate, fmt), tmp, ext, pin=pin)
+    finally:
+        try: os.unlink(tmp)
+        except OSError: pass
+
+async def synthesize(text: str, output_path: str, store=None, fmt: str = "wav"):
+    if store is None:
+        await _synth_mixed(text, output_path, fmt)
+    else:
+        link_or_copy(await speak(text, store, fmt=fmt), output_path)
+
+
+# ──────────────────────────────────────────────────────────────
+# Sentence pipelining: voice a streamed answer sentence by sentence
+
+class SentencePipeline:
+    """
+    Feed LLM text as it streams; every complete sentence (short ones are
+    merged until min_chars) is synthesized in the background, each with
+    its own voice choice, into out_dir/<prefix>_segNN.<ext> (reusing the
+    AudioStore's rendering of a repeated sentence, if a store is given).
+    Segments are handed back strictly in order via ready() and remaining().
+    A segment that fails is skipped in that stream and counted in `failed`;
+    paths then misses a sentence, so the answer's full audio must be
+    synthesized from the text instead of joined (see `complete`).
+    """
+
+    def __init__(self, out_dir: str, prefix: str, min_chars: int = 40, store=None, fmt: str = "wav"):
+        self.out_dir   = out_dir
+        self.prefix    = prefix
+        self.min_chars = min_chars
+        self.store     = store
+        self.fmt       = fmt
+        self.paths: list = []      # successfully voiced segments, in order
+        self.failed    = 0
+        self._buf      = ""
+        self._pending  = ""
+        self._tasks: list = []
+        self._next     = 0
+
+    def feed(self, text: str):
+        self._buf += text
+        parts = SENTENCE_END.split(self._buf)
+        self._buf = parts.pop()    # the unfinished tail
+        for sentence in parts:
+            self._pending = f"{self._pending} {sentence}".strip()
+            if len(self._pending) >= self.min_chars:
+                self._start(self._pending)
+                self._pending = ""
+
+    def _start(self, sentence: str):
+        if not CLEAN_RE.sub("", sentence).strip():
+            return  # nothing speakable (numbers, punctuation)
+        path = os.path.join(self.out_dir, f"{self.prefix}_seg{len(self._tasks):02d}.{audio_ext(self.fmt)}")
+        self._tasks.append((path, asyncio.ensure_future(synthesize(sentence, path, self.store, self.fmt))))
+
+    def _collect(self, index: int):
+        path, task = self._tasks[index]
+        if task.cancelled() or task.exception() is not None:
+            log.error(f"TTS for segment {index} failed: {None if task.cancelled() else task.exception()}")
+            self.failed += 1
+            return None
+        self.paths.append(path)
+        return path
+
+    def ready(self):
+        """Segments finished since the last call, as [(index, path)], without waiting."""
+        out = []
+        while self._next < len(self._tasks) and self._tasks[self._next][1].done():
+            path = self._collect(self._next)
+            if path:
+                out.append((self._next, path))
+            self._next += 1
+        return out
+
+    async def remaining(self):
+        """Flush the tail and yield the outstanding (index, path) segments in order."""
+        tail = f"{self._pending} {self._buf}".strip()
+        self._pending = self._buf = ""
+        if tail:
+            self._start(tail)
+        while self._next < len(self._tasks):
+            await asyncio.wait([self._tasks[self._next][1]])
+            for item in self.ready():
+                yield item
+
+    @property
+    def complete(self) -> bool:
+        """True when every sentence was voiced, so joining paths gives the whole answer."""
+        return not self.failed and self._next == len(self._tasks)
+
+    def cancel(self):
+        for _, task in self._tasks[self._next:]:
+            task.cancel()
 
-async def synthesize(text: str, output_path: str):
-    await _synth_mixed(text, output_path)
+def join_segments(paths, output_path: str, fmt: str = "wav"):
+    """Concatenate voiced segments into one file (the answer's full audio)."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if fmt == "mp3" and not CROSSFADE_MS:
+        # mp3 is a plain sequence of frames: same-voice segments join byte for byte
+        with open(output_path, "wb") as out:
+            for path in paths:
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, out)
+        return
+    _export(_concat([AudioSegment.from_file(path, format=fmt) for path in paths]), output_path, fmt)
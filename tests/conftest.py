@@ -0,0 +1,13 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from config import load_settings
+
+# the serving path runs on the deterministic offline backend under test
+load_settings()["llm"] = {**load_settings().get("llm", {}), "backend": "fake", "backend_options": {}}
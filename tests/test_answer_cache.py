@@ -0,0 +1,78 @@
+# tests/test_answer_cache.py
+
+import os
+import time
+
+from langchain.schema import Document
+
+from online.llm.answer_cache import AnswerCache, ENTRIES_FILE, VECTORS_FILE, chunk_key
+
+CHUNKS = [Document(page_content="one"), Document(page_content="two")]
+
+
+def cache(path, **kwargs):
+    return AnswerCache(str(path), model_name="m", **{"flush_interval": 60, **kwargs})
+
+
+def test_near_duplicates_hit_on_the_same_chunks_and_language(tmp_path):
+    c = cache(tmp_path)
+    c.store([1.0, 0.0, 0.0], "what is one?", "en", CHUNKS, "One.", "- a.pdf")
+    assert c.lookup([0.99, 0.05, 0.0], "en", list(reversed(CHUNKS)))["answer"] == "One."
+    assert c.lookup([0.99, 0.05, 0.0], "ar", CHUNKS) is None
+    assert c.lookup([0.99, 0.05, 0.0], "en", CHUNKS[:1]) is None
+    assert c.lookup([0.0, 1.0, 0.0], "en", CHUNKS) is None
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 3
+
+
+def test_store_does_not_write_to_disk(tmp_path):
+    c = cache(tmp_path)
+    c.store([1.0, 0.0], "q", "en", CHUNKS, "a", "")
+    assert not os.path.exists(tmp_path / ENTRIES_FILE)
+    assert not os.path.exists(tmp_path / VECTORS_FILE)
+
+
+def test_save_round_trips_atomically(tmp_path):
+    c = cache(tmp_path)
+    c.store([1.0, 0.0], "q", "en", CHUNKS, "a", "")
+    c.save()
+    assert sorted(os.listdir(tmp_path)) == [ENTRIES_FILE, VECTORS_FILE]
+    assert cache(tmp_path).lookup([1.0, 0.0], "en", CHUNKS)["answer"] == "a"
+
+
+def test_changes_are_written_back_in_the_background(tmp_path):
+    c = cache(tmp_path, flush_interval=0.05)
+    c.store([1.0, 0.0], "q", "en", CHUNKS, "a", "")
+    deadline = time.time() + 5
+    while not os.path.exists(tmp_path / ENTRIES_FILE) and time.time() < deadline:
+        time.sleep(0.02)
+    assert cache(tmp_path).stats()["size"] == 1
+
+
+def test_audio_is_kept_and_evicted_with_its_entry(tmp_path):
+    audio = tmp_path / "out.mp3"
+    audio.write_bytes(b"mp3")
+    c = cache(tmp_path / "cache", max_entries=1)
+    first = c.store([1.0, 0.0], "q1", "en", CHUNKS, "a1", "", str(audio))
+    cached = c.audio_path(first)
+    assert open(cached, "rb").read() == b"mp3"
+    c.store([0.0, 1.0], "q2", "en", CHUNKS, "a2", "")
+    assert not os.path.exists(cached) and c.audio_path(first) is None
+    assert c.stats()["size"] == 1
+
+
+def test_a_hit_gets_audio_that_survives_eviction(tmp_path):
+    audio = tmp_path / "out.mp3"
+    audio.write_bytes(b"mp3")
+    c = cache(tmp_path / "cache", max_entries=1)
+    c.store([1.0, 0.0], "q1", "en", CHUNKS, "a1", "", str(audio))
+    hit = c.lookup([1.0, 0.0], "en", CHUNKS)
+    copy = c.copy_audio(hit, str(tmp_path / "hit.mp3"))
+    assert copy == str(tmp_path / "hit.mp3")
+    c.store([0.0, 1.0], "q2", "en", CHUNKS, "a2", "")
+    assert open(copy, "rb").read() == b"mp3"
+    assert c.copy_audio(hit, str(tmp_path / "late.mp3")) is None
+
+
+def test_chunk_key_ignores_order():
+    assert chunk_key(CHUNKS) == chunk_key(list(reversed(CHUNKS)))
+    assert chunk_key(CHUNKS) != chunk_key(CHUNKS[:1])
@@ -0,0 +1,81 @@
+# tests/test_bm25.py
+
+from langchain.schema import Document
+
+from online.retrieval.bm25 import BM25Builder, BM25Index, build_bm25_index
+from online.retrieval.normalize import normalize_text, tokenize
+from online.retrieval.retriever import reciprocal_rank_fusion
+
+DOCS = [
+    Document(page_content="الشبكة العصبية تتعلم من البيانات", metadata={"source": "ar.pdf", "page": 1}),
+    Document(page_content="Mask R-CNN detects objects and predicts masks", metadata={"source": "cv.pdf", "page": 2}),
+    Document(page_content="Gradient descent minimizes the loss", metadata={"source": "ml.pdf", "page": 3}),
+    Document(page_content="The loss of a neural network", metadata={"source": "ml.pdf", "page": 4}),
+]
+
+
+# ─ normalization ─
+def test_arabic_letter_variants_and_diacritics_fold():
+    assert normalize_text("أحمد إلى آخر مدرسة مستشفى") == "احمد الي اخر مدرسه مستشفي"
+    assert normalize_text("مُعَلِّم") == "معلم"
+    assert normalize_text("  Neural ") == "neural"
+
+
+def test_tokenize_strips_articles_and_stopwords():
+    assert tokenize("والكشف بالكشف الكشف") == ["كشف", "كشف", "كشف"]
+    assert tokenize("ما هي الشبكة؟") == ["شبكه"]
+    assert tokenize("What is Mask R-CNN?") == ["mask", "r", "cnn"]
+    # a short word that only looks like it starts with an article is kept
+    assert tokenize("الم") == ["الم"]
+
+
+# ─ BM25 ─
+def test_search_ranks_matching_chunks(tmp_path):
+    build_bm25_index(str(tmp_path), DOCS)
+    index = BM25Index(str(tmp_path))
+    assert len(index) == 4
+    hits = index.search("explain mask r-cnn", top_k=2)
+    assert hits[0][0].page_content == DOCS[1].page_content
+    assert len(hits) == 1
+    assert index.search("photosynthesis") == []
+
+
+def test_arabic_query_matches_across_spelling_and_article(tmp_path):
+    build_bm25_index(str(tmp_path), DOCS)
+    hits = BM25Index(str(tmp_path)).search("ما هي شبكة عصبيه؟")
+    assert hits[0][0].metadata == {"source": "ar.pdf", "page": 1}
+
+
+def test_rarer_terms_weigh_more(tmp_path):
+    build_bm25_index(str(tmp_path), DOCS)
+    index = BM25Index(str(tmp_path))
+    # "loss" appears in two chunks, "gradient" in one
+    assert index.idf["gradient"] > index.idf["loss"] > 0
+    assert index.search("gradient loss")[0][0].page_content == DOCS[2].page_content
+
+
+def test_incremental_builder_matches_one_shot_build(tmp_path):
+    builder = BM25Builder(str(tmp_path / "inc"))
+    builder.add(DOCS[:2])
+    builder.add(DOCS[2:])
+    assert builder.close() == build_bm25_index(str(tmp_path / "all"), DOCS)
+    inc, full = BM25Index(str(tmp_path / "inc")), BM25Index(str(tmp_path / "all"))
+    assert inc.scores("neural loss") == full.scores("neural loss")
+
+
+# ─ fusion ─
+def doc(text):
+    return Document(page_content=text, metadata={})
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    dense   = [(doc("a"), 0.9), (doc("b"), 0.8), (doc("c"), 0.7)]
+    lexical = [(doc("b"), 12.0), (doc("d"), 9.0), (doc("c"), 1.0)]
+    fused = reciprocal_rank_fusion([dense, lexical], top_k=3, k=60)
+    assert [d.page_content for d, _ in fused] == ["b", "c", "a"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+
+
+def test_rrf_scores_ignore_raw_scales():
+    fused = reciprocal_rank_fusion([[(doc("x"), 1000.0)], [(doc("y"), 0.01)]], top_k=2, k=1)
+    assert fused[0][1] == fused[1][1] == 0.5
@@ -0,0 +1,99 @@
+# tests/test_chunk_store.py
+
+import json
+import os
+
+import pytest
+from langchain.schema import Document
+
+from online.retrieval.chunk_store import ChunkStore, ChunkStoreWriter, convert_directory, write_chunk_store
+
+DOCS = [
+    Document(page_content="first chunk", metadata={"source": "a.pdf", "page": 1}),
+    Document(page_content="الفصل الثاني\nمع سطر جديد", metadata={"source": "b.pptx", "page": 7}),
+    Document(page_content="", metadata={}),
+    Document(page_content="last one", metadata={"source": "a.pdf", "page": 2}),
+]
+
+
+def test_round_trip_by_id(tmp_path):
+    path = str(tmp_path / "chunks.jsonl")
+    assert write_chunk_store(path, DOCS) == 4
+    with ChunkStore(path) as store:
+        assert len(store) == 4
+        for chunk_id in (3, 0, 2, 1):
+            assert store[chunk_id].page_content == DOCS[chunk_id].page_content
+            assert store[chunk_id].metadata == DOCS[chunk_id].metadata
+        assert store.record(1)["id"] == 1
+        assert [d.page_content for d in store] == [d.page_content for d in DOCS]
+        with pytest.raises(KeyError):
+            store.get(4)
+        with pytest.raises(KeyError):
+            store.get(-1)
+
+
+def test_offsets_are_eight_byte_entries_one_past_the_last_record(tmp_path):
+    path = tmp_path / "chunks.jsonl"
+    write_chunk_store(str(path), DOCS)
+    idx = (tmp_path / "chunks.idx").read_bytes()
+    assert len(idx) == 8 * (len(DOCS) + 1)
+    assert int.from_bytes(idx[-8:], "little") == path.stat().st_size
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "chunks.jsonl")
+    assert write_chunk_store(path, []) == 0
+    with ChunkStore(path) as store:
+        assert len(store) == 0 and list(store) == []
+
+
+def test_nothing_is_published_until_close(tmp_path):
+    path = tmp_path / "chunks.jsonl"
+    writer = ChunkStoreWriter(str(path))
+    writer.add(DOCS[0])
+    assert not path.exists() and not (tmp_path / "chunks.idx").exists()
+    writer.close()
+    assert path.exists() and (tmp_path / "chunks.idx").exists()
+
+
+def test_mismatched_index_is_rejected(tmp_path):
+    path = tmp_path / "chunks.jsonl"
+    write_chunk_store(str(path), DOCS)
+    with open(path, "ab") as f:
+        f.write(b"{}\n")
+    with pytest.raises(ValueError):
+        ChunkStore(str(path))
+
+
+def test_convert_directory(tmp_path):
+    src = tmp_path / "chunks"
+    src.mkdir()
+    for i, doc in enumerate(DOCS):
+        payload = {"page_content": doc.page_content, "metadata": doc.metadata}
+        (src / f"chunk_{i:04d}.json").write_text(json.dumps(payload), encoding="utf-8")
+    out = str(tmp_path / "chunks.jsonl")
+    assert convert_directory(str(src), out) == 4
+    with ChunkStore(out) as store:
+        assert store[1].page_content == DOCS[1].page_content
+
+    (src / "chunk_0002.json").unlink()
+    with pytest.raises(ValueError):
+        convert_directory(str(src), str(tmp_path / "gap.jsonl"))
+
+
+def test_a_store_opened_between_the_renames_retries(tmp_path):
+    import threading
+
+    path = tmp_path / "chunks.jsonl"
+    write_chunk_store(str(path), DOCS[:1])
+    writer = ChunkStoreWriter(str(path))
+    for doc in DOCS:
+        writer.add(doc)
+    writer._data.close()
+    # the state close() leaves after its first rename: new data, old index
+    os.replace(str(path) + ".tmp", path)
+    finish = threading.Timer(0.02, lambda: write_chunk_store(str(path), DOCS))
+    finish.start()
+    with ChunkStore(str(path)) as store:
+        assert len(store) == len(DOCS)
+    finish.join()
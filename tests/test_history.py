@@ -0,0 +1,85 @@
+# tests/test_history.py
+
+import asyncio
+import json
+
+from online.llm.history import HistoryManager, summary_path
+
+
+def turns_upto(n):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "text": f"{'q' if i % 2 == 0 else 'a'}{i // 2}"}
+        for i in range(n)
+    ]
+
+
+def manager(**kwargs):
+    kwargs = {"max_turns": 8, "token_budget": 10_000, "min_fold": 4, **kwargs}
+    hm = HistoryManager(**kwargs)
+
+    async def fold(summary, turns):
+        return " ".join(filter(None, [summary, *(t["text"] for t in turns)]))
+
+    hm._fold = fold
+    return hm
+
+
+def save(path, turns):
+    path.write_text(json.dumps(turns), encoding="utf-8")
+
+
+def test_short_history_goes_in_verbatim(tmp_path):
+    hm, path = manager(), tmp_path / "s.json"
+    save(path, turns_upto(6))
+    assert hm.context(str(path), []) == ("", turns_upto(6))
+
+
+def test_no_turn_is_lost_between_window_and_summary(tmp_path):
+    hm, path = manager(), tmp_path / "s.json"
+    for n in range(2, 31, 2):
+        save(path, turns_upto(n))
+        asyncio.run(hm.refresh(str(path)))
+        summary, recent = hm.context(str(path), [])
+        covered = hm.load_summary(str(path))["covered"]
+        assert recent == turns_upto(n)[covered:], n
+        assert summary.split() == [t["text"] for t in turns_upto(covered)]
+
+
+def test_unfolded_turns_stay_verbatim(tmp_path):
+    hm, path = manager(), tmp_path / "s.json"
+    save(path, turns_upto(10))
+    asyncio.run(hm.refresh(str(path)))
+    # only two turns aged out, fewer than min_fold: nothing folded yet
+    assert not (tmp_path / "s.summary.json").exists()
+    assert hm.context(str(path), [])[1] == turns_upto(10)
+
+
+def test_saved_session_wins_over_client_turns(tmp_path):
+    hm, path = manager(), tmp_path / "s.json"
+    save(path, turns_upto(14))
+    (tmp_path / "s.summary.json").write_text(json.dumps({"summary": "early", "covered": 4}))
+    summary, recent = hm.context(str(path), turns_upto(30))
+    assert summary == "early"
+    assert recent == turns_upto(14)[4:]
+
+
+def test_client_turns_used_for_new_session(tmp_path):
+    hm = manager()
+    assert hm.context(str(tmp_path / "new.json"), turns_upto(12)) == ("", turns_upto(12)[4:])
+
+
+def test_without_summaries_only_the_window_is_kept(tmp_path):
+    hm, path = manager(summarize=False), tmp_path / "s.json"
+    save(path, turns_upto(12))
+    assert hm.context(str(path), []) == ("", turns_upto(12)[4:])
+
+
+def test_token_budget_limits_the_window():
+    hm = manager(token_budget=5)
+    turns = [{"role": "user", "text": "x" * 8}] * 6
+    # each turn costs 3 estimated tokens: only one fits
+    assert hm.window_start(turns) == 5
+
+
+def test_summary_path_sits_beside_the_session():
+    assert summary_path("/h/abc.json") == "/h/abc.summary.json"
@@ -0,0 +1,146 @@
+# tests/test_indexer.py
+
+import os
+import queue
+import sys
+import threading
+
+import numpy as np
+from langchain.schema import Document
+
+# offline/ scripts import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "offline"))
+
+from indexer import NumpyIndexBuilder, iter_batches
+from pipeline import _DONE, _produce, _put
+from online.retrieval.numpy_index import NumpyIndex
+from online.retrieval.versions import resolve_index_dir
+
+
+class CountingEmbeddings:
+    """Deterministic 4-d vectors derived from the text, counting what gets embedded."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[len(t), t.count("a") + 1, t.count("e") + 1, 1.0] for t in texts]
+
+
+def docs(*texts):
+    return [Document(page_content=t, metadata={"source": "x.pdf"}) for t in texts]
+
+
+def build(persist_dir, batches, embeddings):
+    builder = NumpyIndexBuilder(persist_dir, embeddings, "test-model", dtype="float32")
+    for batch in batches:
+        builder.add(batch)
+    return builder.commit()
+
+
+def test_iter_batches():
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches([], 2)) == []
+
+
+def test_numpy_rebuild_reuses_vectors_by_id(tmp_path):
+    persist_dir = str(tmp_path / "index")
+    first = CountingEmbeddings()
+    assert build(persist_dir, [docs("alpha", "beta"), docs("gamma")], first) == (3, 0)
+
+    second = CountingEmbeddings()
+    # reordered, one chunk gone, one new
+    assert build(persist_dir, [docs("gamma", "delta", "alpha")], second) == (1, 1)
+    assert second.embedded == ["delta"]
+
+    index = NumpyIndex(resolve_index_dir(persist_dir))
+    assert [index.document(i).page_content for i in range(len(index))] == ["gamma", "delta", "alpha"]
+    expected = np.asarray(first.embed_documents(["gamma"])[0], dtype=np.float32)
+    expected /= np.linalg.norm(expected)
+    assert np.allclose(index.matrix[0], expected)
+
+
+def test_unchanged_rebuild_keeps_the_live_index(tmp_path):
+    persist_dir = str(tmp_path / "index")
+    build(persist_dir, [docs("alpha", "beta")], CountingEmbeddings())
+    live = resolve_index_dir(persist_dir)
+    again = CountingEmbeddings()
+    assert build(persist_dir, [docs("alpha", "beta")], again) == (0, 0)
+    assert again.embedded == []
+    assert resolve_index_dir(persist_dir) == live
+    assert sorted(os.listdir(tmp_path)) == sorted(["index.current", os.path.basename(live)])
+
+
+def test_rebuild_publishes_a_new_version_and_keeps_the_previous(tmp_path):
+    persist_dir = str(tmp_path / "index")
+    build(persist_dir, [docs("alpha")], CountingEmbeddings())
+    first = resolve_index_dir(persist_dir)
+    # a server holding the first version open keeps reading it after the rebuild
+    reader = NumpyIndex(first)
+    build(persist_dir, [docs("alpha", "beta")], CountingEmbeddings())
+    second = resolve_index_dir(persist_dir)
+    assert second != first and len(NumpyIndex(second)) == 2
+    assert len(reader) == 1 and os.path.isdir(first)
+
+    build(persist_dir, [docs("gamma")], CountingEmbeddings())
+    assert not os.path.exists(first)
+    assert os.path.isdir(second)
+
+
+def test_unversioned_index_resolves_to_itself_until_replaced(tmp_path):
+    from online.retrieval.numpy_index import write_numpy_index
+
+    persist_dir = str(tmp_path / "index")
+    write_numpy_index(persist_dir, docs("alpha"), [[1.0, 0.0, 0.0, 1.0]], "test-model")
+    assert resolve_index_dir(persist_dir) == os.path.normpath(persist_dir)
+
+    build(persist_dir, [docs("alpha", "beta")], CountingEmbeddings())
+    assert resolve_index_dir(persist_dir) != os.path.normpath(persist_dir)
+    assert os.path.isdir(persist_dir)  # previous version, still readable
+    build(persist_dir, [docs("beta")], CountingEmbeddings())
+    assert not os.path.exists(persist_dir)
+
+
+def test_put_gives_up_once_the_consumer_stops():
+    out_q, stop = queue.Queue(maxsize=1), threading.Event()
+    assert _put(out_q, "first", stop)
+    stop.set()
+    assert not _put(out_q, "second", stop)
+
+
+def test_producer_does_not_hang_on_a_stopped_consumer(tmp_path, monkeypatch):
+    import pipeline
+
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda data_dir, **kw: iter(docs("a")))
+    monkeypatch.setattr(pipeline, "persist_chunks", lambda chunks, data_dir: chunks)
+    out_q, stop = queue.Queue(maxsize=1), threading.Event()
+    producer = threading.Thread(target=_produce, args=(str(tmp_path), 1, out_q, stop, {}), daemon=True)
+    producer.start()
+    # the only batch fills the queue; _DONE waits behind it until the consumer stops
+    producer.join(timeout=0.2)
+    assert producer.is_alive()
+    stop.set()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+
+
+def test_producer_finishes_with_done(tmp_path, monkeypatch):
+    import pipeline
+
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda data_dir, **kw: iter(docs("a", "b", "c")))
+    monkeypatch.setattr(pipeline, "persist_chunks", lambda chunks, data_dir: chunks)
+    out_q, stop = queue.Queue(), threading.Event()
+    _produce(str(tmp_path), 2, out_q, stop, {})
+    items = [out_q.get_nowait() for _ in range(3)]
+    assert [len(b) for b in items[:2]] == [2, 1] and items[2] is _DONE
+
+
+def test_manifest_is_only_reused_with_the_same_distance(tmp_path):
+    from indexer import reusable_manifest, write_manifest
+
+    write_manifest(str(tmp_path), "chroma", "m", ["a"])
+    assert reusable_manifest(str(tmp_path), "chroma", "m", "cosine") is None
+    write_manifest(str(tmp_path), "chroma", "m", ["a"], "cosine")
+    assert reusable_manifest(str(tmp_path), "chroma", "m", "cosine")["ids"] == ["a"]
+    assert reusable_manifest(str(tmp_path), "chroma", "other", "cosine") is None
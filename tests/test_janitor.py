@@ -0,0 +1,90 @@
+# tests/test_janitor.py
+
+import json
+import os
+import time
+
+from online.janitor import AudioJanitor
+
+HOUR = 3600
+
+
+def audio(audio_dir, name, age=0.0, size=10):
+    path = audio_dir / name
+    path.write_bytes(b"x" * size)
+    when = time.time() - age
+    os.utime(path, (when, when))
+    return path
+
+
+def history(history_dir, *names):
+    user = history_dir / "a%40b.c"
+    user.mkdir(parents=True, exist_ok=True)
+    turns = [{"role": "assistant", "text": "t", "audio_url": f"/audio/{name}"} for name in names]
+    (user / "0123456789abcdef.json").write_text(json.dumps(turns), encoding="utf-8")
+
+
+def janitor(tmp_path, **kwargs):
+    audio_dir, history_dir = tmp_path / "audio", tmp_path / "history"
+    audio_dir.mkdir(exist_ok=True)
+    history_dir.mkdir(exist_ok=True)
+    options = {"ttl": HOUR, "max_bytes": 0, "input_grace": 60, "min_age": 30, **kwargs}
+    return AudioJanitor(str(audio_dir), str(history_dir), **options), audio_dir, history_dir
+
+
+def test_expired_outputs_go_unless_a_history_links_them(tmp_path):
+    j, audio_dir, history_dir = janitor(tmp_path)
+    old = audio(audio_dir, "old_out.mp3", age=2 * HOUR)
+    kept = audio(audio_dir, "kept_out.mp3", age=2 * HOUR)
+    fresh = audio(audio_dir, "fresh_out.mp3", age=60)
+    history(history_dir, "kept_out.mp3")
+    j.sweep()
+    assert not old.exists() and kept.exists() and fresh.exists()
+    assert j.stats()["expired"] == 1
+
+
+def test_leftover_uploads_go_after_the_grace_period(tmp_path):
+    j, audio_dir, _ = janitor(tmp_path)
+    stale = audio(audio_dir, "a_in.webm", age=120)
+    live = audio(audio_dir, "b_in.webm", age=10)
+    j.sweep()
+    assert not stale.exists() and live.exists()
+    assert j.stats()["inputs_removed"] == 1
+
+
+def test_quota_evicts_oldest_unreferenced_first_and_spares_young_files(tmp_path):
+    j, audio_dir, history_dir = janitor(tmp_path, max_bytes=25)
+    linked = audio(audio_dir, "linked_out.mp3", age=300)
+    oldest = audio(audio_dir, "oldest_out.mp3", age=200)
+    newer = audio(audio_dir, "newer_out.mp3", age=100)
+    young = audio(audio_dir, "young_out.mp3", age=5)
+    history(history_dir, "linked_out.mp3")
+    j.sweep()
+    # 40 bytes over a 25-byte quota: the two unreferenced, old enough files go first
+    assert not oldest.exists() and not newer.exists()
+    assert linked.exists() and young.exists()
+    assert j.stats()["over_quota"] == 2 and j.stats()["bytes"] == 20
+
+
+def test_referenced_files_go_last_when_still_over_quota(tmp_path):
+    j, audio_dir, history_dir = janitor(tmp_path, max_bytes=15)
+    linked = audio(audio_dir, "linked_out.mp3", age=300)
+    young = audio(audio_dir, "young_out.mp3", age=5)
+    history(history_dir, "linked_out.mp3")
+    j.sweep()
+    assert not linked.exists() and young.exists()
+    assert j.stats()["referenced_evicted"] == 1
+
+
+def test_cache_directories_and_deleted_sessions(tmp_path):
+    j, audio_dir, history_dir = janitor(tmp_path)
+    (audio_dir / "cache").mkdir()
+    cached = audio(audio_dir / "cache", "entry.mp3", age=2 * HOUR)
+    linked = audio(audio_dir, "linked_out.mp3", age=2 * HOUR)
+    history(history_dir, "linked_out.mp3")
+    j.sweep()
+    assert cached.exists() and linked.exists()
+    for path in history_dir.glob("*/*.json"):
+        path.unlink()
+    j.sweep()
+    assert cached.exists() and not linked.exists()
@@ -0,0 +1,181 @@
+# tests/test_llm_backends.py
+
+import asyncio
+
+import pytest
+from langchain.schema import Document
+
+from online.llm import inference
+from online.llm.backends import FakeBackend, LLMBackend, create_backend
+from online.llm.scheduler import SingleFlight, INTERACTIVE
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+# ─ fake backend ─
+def test_fake_backend_is_deterministic_and_streams_the_same_text():
+    llm = FakeBackend()
+    prompt = "Student's new question: What is a neuron?\n\nAnswer (in English only):"
+    text = llm.invoke(prompt)
+    assert text == llm.invoke(prompt) == run(llm.ainvoke(prompt))
+    assert "about What is a neuron" in text
+    assert "".join(run(collect(llm.astream(prompt)))) == text
+    assert llm.invoke(prompt + " ") != text
+
+
+def test_fake_backend_answers_an_empty_prompt():
+    assert "about nothing" in FakeBackend().invoke("")
+    assert "about nothing" in FakeBackend().invoke("  \n ")
+
+
+def test_a_backend_with_only_invoke_gets_async_calls():
+    class EchoBackend(LLMBackend):
+        def invoke(self, prompt):
+            return prompt.upper()
+
+    llm = EchoBackend()
+    assert run(llm.ainvoke("hi")) == "HI"
+    assert run(collect(llm.astream("hi"))) == ["HI"]
+
+
+def test_create_backend():
+    assert isinstance(create_backend({"backend": "fake", "delay": 0.5}), FakeBackend)
+    with pytest.raises(ValueError):
+        create_backend({"backend": "nope"})
+
+
+# ─ single flight ─
+def test_concurrent_identical_calls_share_one_run():
+    async def main():
+        sf, calls = SingleFlight(), 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(sf.do("k", call) for _ in range(5)))
+        return results, calls, sf.stats()
+
+    results, calls, stats = run(main())
+    assert results == ["answer"] * 5 and calls == 1
+    assert stats == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_one_caller_leaving_does_not_cancel_the_others():
+    async def main():
+        sf, gone = SingleFlight(), asyncio.Event()
+        call = lambda: asyncio.sleep(0.05, "answer")
+        leaver = asyncio.ensure_future(sf.do("k", call, abandon=gone.wait))
+        stayer = asyncio.ensure_future(sf.do("k", call))
+        await asyncio.sleep(0.01)
+        gone.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaver
+        return await stayer
+
+    assert run(main()) == "answer"
+
+
+def test_shared_call_is_cancelled_when_every_caller_leaves():
+    async def main():
+        sf, started = SingleFlight(), asyncio.Event()
+        cancelled = False
+
+        async def call():
+            nonlocal cancelled
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+        callers = [asyncio.ensure_future(sf.do("k", call)) for _ in range(2)]
+        await started.wait()
+        for c in callers:
+            c.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return cancelled, sf.stats()
+
+    cancelled, stats = run(main())
+    assert cancelled and stats["in_flight"] == 0
+
+
+def test_late_stream_listener_replays_from_the_start():
+    async def main():
+        sf, runs = SingleFlight(), 0
+
+        async def tokens():
+            nonlocal runs
+            runs += 1
+            for t in ["a", "b", "c", "d"]:
+                await asyncio.sleep(0.01)
+                yield t
+
+        first = asyncio.ensure_future(collect(sf.stream("k", tokens)))
+        await asyncio.sleep(0.025)
+        second = asyncio.ensure_future(collect(sf.stream("k", tokens)))
+        return await first, await second, runs
+
+    first, second, runs = run(main())
+    assert first == second == ["a", "b", "c", "d"] and runs == 1
+
+
+def test_stream_error_reaches_every_listener():
+    async def main():
+        sf = SingleFlight()
+
+        async def broken():
+            yield "a"
+            raise RuntimeError("model died")
+
+        return await asyncio.gather(
+            collect(sf.stream("k", broken)), collect(sf.stream("k", broken)),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(r, RuntimeError) for r in run(main()))
+
+
+# ─ serving path on the fake backend ─
+CHUNKS = [
+    Document(page_content="Neurons pass signals through synapses.", metadata={"source": "bio.pdf", "page": 3}),
+    Document(page_content="Synapses can be chemical or electrical.", metadata={"source": "bio.pdf", "page": 4}),
+]
+
+
+def test_serving_path_runs_on_the_fake_backend():
+    assert isinstance(inference.llm, FakeBackend)
+
+    async def main():
+        answer, citation = await inference.agenerate_answer(CHUNKS, "What is a synapse?")
+        streamed = await collect(inference.stream_answer(CHUNKS, "What is a synapse?"))
+        return answer, citation, "".join(streamed).strip()
+
+    answer, citation, streamed = run(main())
+    assert "about What is a synapse" in answer
+    assert streamed == answer
+    assert citation == "- bio.pdf (page 3)\n- bio.pdf (page 4)"
+
+
+def test_serving_path_without_chunks_does_not_call_the_llm():
+    assert run(inference.agenerate_answer([], "anything")) == (inference.NO_ANSWER, "")
+
+
+def test_identical_prompts_are_coalesced_on_the_serving_path():
+    async def main():
+        before = inference.inflight.stats()["coalesced"]
+        texts = await asyncio.gather(*(inference.complete("same prompt", INTERACTIVE) for _ in range(3)))
+        return texts, inference.inflight.stats()["coalesced"] - before
+
+    texts, coalesced = run(main())
+    assert len(set(texts)) == 1 and coalesced == 2
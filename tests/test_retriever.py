@@ -0,0 +1,156 @@
+# tests/test_retriever.py
+
+import json
+
+import numpy as np
+from langchain.schema import Document
+
+from online.retrieval.numpy_index import write_numpy_index
+from online.retrieval import retriever as retrieval
+from online.retrieval.retriever import CHROMA_SPACE, ChromaRetriever, NumpyRetriever
+
+DOC = Document(page_content="chunk", metadata={})
+
+
+class FakeChroma:
+    """Returns fixed (Document, distance) pairs, as Chroma does."""
+
+    def __init__(self, distances):
+        self.distances = distances
+
+    def similarity_search_by_vector_with_relevance_scores(self, vector, k=3):
+        return [(DOC, d) for d in self.distances[:k]]
+
+
+def chroma(tmp_path, manifest, distances):
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    retriever = ChromaRetriever(str(tmp_path))
+    retriever.space = retriever._read_space(str(tmp_path))
+    retriever._store = FakeChroma(distances)
+    return retriever
+
+
+def test_cosine_distances_become_similarities(tmp_path):
+    retriever = chroma(tmp_path, {"space": CHROMA_SPACE}, [0.1, 0.6])
+    scores = [score for _, score in retriever.search_by_vector([1.0, 0.0])]
+    assert np.allclose(scores, [0.9, 0.4])
+
+
+def test_legacy_l2_indexes_keep_raw_distances(tmp_path):
+    retriever = chroma(tmp_path, {"backend": "chroma"}, [7.0, 51.0])
+    assert retriever.space == "l2"
+    assert [score for _, score in retriever.search_by_vector([1.0, 0.0])] == [7.0, 51.0]
+
+
+def test_legacy_unnormalized_index_still_answers(tmp_path, monkeypatch):
+    # the shipped index: no manifest, mpnet vectors with norms around 6
+    (tmp_path / "chroma.sqlite3").write_bytes(b"")
+    monkeypatch.setattr(retrieval, "Chroma", lambda **kw: FakeChroma([7.0, 23.5, 51.0]))
+    monkeypatch.setattr(retrieval, "get_embeddings", lambda model_name=None: None)
+    retriever = ChromaRetriever(str(tmp_path))
+    monkeypatch.setattr(retrieval, "get_retriever", lambda *a, **kw: retriever)
+    monkeypatch.setattr(retrieval, "embed_query", lambda query, model_name=None: [6.0, 0.0])
+    docs = retrieval.get_relevant_chunks("what is a neuron?", top_k=3, mode="dense", min_score=0.0)
+    assert len(docs) == 3
+
+
+def test_both_dense_backends_score_higher_for_closer_chunks(tmp_path):
+    write_numpy_index(str(tmp_path / "np"), [DOC, DOC], [[1.0, 0.0], [0.6, 0.8]], "m")
+    numpy_scores = [s for _, s in NumpyRetriever(str(tmp_path / "np"), "m").search_by_vector([1.0, 0.0], 2)]
+    chroma_scores = [s for _, s in chroma(tmp_path, {"space": "cosine"}, [0.0, 0.4]).search_by_vector([1.0, 0.0])]
+    assert np.allclose(numpy_scores, chroma_scores, atol=1e-3)
+
+
+def test_retriever_follows_a_published_version(tmp_path, monkeypatch):
+    from online.retrieval.versions import new_version_dir, publish
+
+    index_dir = str(tmp_path / "np")
+    first = new_version_dir(index_dir)
+    write_numpy_index(first, [DOC], [[1.0, 0.0]], "m")
+    publish(first, index_dir)
+    retriever = NumpyRetriever(index_dir, "m")
+    assert len(retriever.search_by_vector([1.0, 0.0], 5)) == 1
+
+    second = new_version_dir(index_dir)
+    write_numpy_index(second, [DOC, DOC], [[1.0, 0.0], [0.0, 1.0]], "m")
+    publish(second, index_dir)
+    monkeypatch.setitem(retrieval._cache_cfg, "index_check_interval", 0)
+    retriever.refresh_if_stale()
+    assert len(retriever.search_by_vector([1.0, 0.0], 5)) == 2
+
+
+class FixedRetriever:
+    """Returns fixed (Document, score) hits, or raises what an unreadable index would."""
+
+    def __init__(self, hits, similarity=True, error=None):
+        self.hits, self.similarity, self.error = hits, similarity, error
+
+    def search(self, query, top_k=3):
+        if self.error:
+            raise self.error
+        return self.hits[:top_k]
+
+
+def retrievers(monkeypatch, dense, lexical):
+    pick = lambda persist_dir=None, model_name=None, backend=None: lexical if backend == "bm25" else dense
+    monkeypatch.setattr(retrieval, "get_retriever", pick)
+
+
+def doc(text):
+    return Document(page_content=text, metadata={})
+
+
+def test_min_score_filters_dense_hits_only(monkeypatch):
+    dense = FixedRetriever([(doc("close"), 0.8), (doc("far"), 0.1)])
+    lexical = FixedRetriever([(doc("term"), 3.0), (doc("close"), 2.0)])
+    retrievers(monkeypatch, dense, lexical)
+    monkeypatch.setitem(retrieval._cache_cfg, "bm25_confident_score", 100.0)
+    texts = lambda **kw: [d.page_content for d in retrieval.get_relevant_chunks("q", top_k=5, min_score=0.5, **kw)]
+    assert texts(mode="dense") == ["close"]
+    # BM25 scores and RRF scores are never compared with a cosine threshold
+    assert texts(mode="bm25") == ["term", "close"]
+    assert texts(mode="hybrid") == ["close", "term"]
+
+
+def test_hybrid_falls_back_to_dense_on_a_corrupt_bm25_index(tmp_path, monkeypatch):
+    (tmp_path / "index.json").write_text("{not json", encoding="utf-8")
+    dense = FixedRetriever([(doc("close"), 0.8), (doc("far"), 0.1)])
+    retrievers(monkeypatch, dense, retrieval.BM25Retriever(str(tmp_path)))
+    hits = retrieval.hybrid_search("q", top_k=3, min_score=0.5)
+    assert [d.page_content for d, _ in hits] == ["close"]
+    retrievers(monkeypatch, dense, FixedRetriever([], error=KeyError("doc_len")))
+    assert [d.page_content for d, _ in retrieval.hybrid_search("q", top_k=3)] == ["close", "far"]
+
+
+def test_concurrent_requests_reload_a_rebuilt_index_once(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    from online.retrieval.versions import new_version_dir, publish
+
+    index_dir = str(tmp_path / "np")
+    for rows in (1, 2):
+        version = new_version_dir(index_dir)
+        write_numpy_index(version, [DOC] * rows, [[1.0, 0.0]] * rows, "m")
+        if rows == 1:
+            publish(version, index_dir)
+            retriever = NumpyRetriever(index_dir, "m")
+            retriever.store
+    publish(version, index_dir)
+
+    opened, open_index = [], NumpyRetriever._open
+
+    def slow_open(self, path):
+        opened.append(path)
+        time.sleep(0.05)
+        return open_index(self, path)
+
+    monkeypatch.setattr(NumpyRetriever, "_open", slow_open)
+    monkeypatch.setitem(retrieval._cache_cfg, "index_check_interval", 0)
+    threads = [threading.Thread(target=retriever.refresh_if_stale) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert opened == [version]
+    assert len(retriever.store) == 2
@@ -0,0 +1,143 @@
+# tests/test_scheduler.py
+
+import asyncio
+
+import pytest
+
+from online.llm.scheduler import LLMScheduler, INTERACTIVE, TRANSLATE, TITLE, SUMMARY
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_waiters_are_served_by_priority_then_fifo():
+    async def main():
+        sched, order = LLMScheduler(max_concurrent=1), []
+        gate = asyncio.Event()
+
+        async def job(name, priority):
+            async def call():
+                order.append(name)
+                await gate.wait()
+            await sched.run(priority, call)
+
+        first = asyncio.ensure_future(job("first", SUMMARY))
+        await asyncio.sleep(0.01)
+        rest = [
+            asyncio.ensure_future(job(name, priority))
+            for name, priority in [("summary", SUMMARY), ("title", TITLE),
+                                   ("chat1", INTERACTIVE), ("translate", TRANSLATE), ("chat2", INTERACTIVE)]
+        ]
+        await asyncio.sleep(0.01)
+        assert sched.stats()["waiting"] == {"interactive": 2, "translate": 1, "title": 1, "summary": 1}
+        gate.set()
+        await asyncio.gather(first, *rest)
+        return order, sched.stats()
+
+    order, stats = run(main())
+    assert order == ["first", "chat1", "chat2", "translate", "title", "summary"]
+    assert stats["completed"] == 6 and stats["active"] == 0
+
+
+def test_concurrency_is_capped():
+    async def main():
+        sched, running, peak = LLMScheduler(max_concurrent=2), 0, 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(sched.run(INTERACTIVE, call) for _ in range(6)))
+        return peak
+
+    assert run(main()) == 2
+
+
+def test_deadline_covers_queueing():
+    async def main():
+        sched = LLMScheduler(max_concurrent=1)
+        blocker = asyncio.ensure_future(sched.run(INTERACTIVE, lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await sched.run(INTERACTIVE, lambda: asyncio.sleep(0), timeout=0.05)
+        await blocker
+        return sched.stats()
+
+    stats = run(main())
+    assert stats["timeouts"] == 1 and stats["completed"] == 1
+    assert stats["active"] == 0 and stats["waiting"]["interactive"] == 0
+
+
+def test_abandoned_call_gives_its_slot_back():
+    async def main():
+        sched, gone = LLMScheduler(max_concurrent=1), asyncio.Event()
+        slow = asyncio.ensure_future(
+            sched.run(INTERACTIVE, lambda: asyncio.sleep(10), abandon=gone.wait)
+        )
+        await asyncio.sleep(0.01)
+        gone.set()
+        with pytest.raises(asyncio.CancelledError):
+            await slow
+        # the next call gets the slot straight away
+        assert await sched.run(INTERACTIVE, lambda: asyncio.sleep(0, "ok"), timeout=1) == "ok"
+        return sched.stats()
+
+    stats = run(main())
+    assert stats["cancelled"] == 1 and stats["active"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        sched, gate = LLMScheduler(max_concurrent=1), asyncio.Event()
+        holder = asyncio.ensure_future(sched.run(INTERACTIVE, gate.wait))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(sched.run(TITLE, lambda: asyncio.sleep(0)))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert sched.stats()["waiting"]["title"] == 0
+        gate.set()
+        await holder
+        return sched.stats()
+
+    assert run(main())["active"] == 0
+
+
+def test_stream_yields_items_and_frees_the_slot_when_closed():
+    async def main():
+        sched = LLMScheduler(max_concurrent=1)
+
+        async def tokens():
+            for t in ["a", "b", "c", "d"]:
+                yield t
+
+        assert [t async for t in sched.stream(INTERACTIVE, tokens)] == ["a", "b", "c", "d"]
+        stream = sched.stream(INTERACTIVE, tokens)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        return sched.stats()
+
+    stats = run(main())
+    assert stats["completed"] == 1 and stats["cancelled"] == 1 and stats["active"] == 0
+
+
+def test_stream_deadline_covers_the_whole_stream():
+    async def main():
+        sched = LLMScheduler(max_concurrent=1)
+
+        async def slow():
+            while True:
+                await asyncio.sleep(0.02)
+                yield "x"
+
+        with pytest.raises(asyncio.TimeoutError):
+            async for _ in sched.stream(INTERACTIVE, slow, timeout=0.1):
+                pass
+        return sched.stats()
+
+    stats = run(main())
+    assert stats["timeouts"] == 1 and stats["active"] == 0
@@ -0,0 +1,66 @@
+# tests/test_sentence_pipeline.py
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydub")  # tts_service transcodes through pydub
+
+from online.tts import tts_service
+from online.tts.tts_service import SentencePipeline
+
+
+@pytest.fixture
+def voiced(monkeypatch):
+    """Replace synthesis: writes the sentence to the path, fails on sentences containing FAIL."""
+    spoken = []
+
+    async def synthesize(text, path, store=None, fmt="wav"):
+        await asyncio.sleep(0.01 if "slow" in text else 0)
+        if "FAIL" in text:
+            raise RuntimeError("engine down")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        spoken.append(text)
+
+    monkeypatch.setattr(tts_service, "synthesize", synthesize)
+    return spoken
+
+
+def run_pipeline(tmp_path, tokens, min_chars=1):
+    async def main():
+        pipeline = SentencePipeline(str(tmp_path), "a", min_chars=min_chars)
+        for token in tokens:
+            pipeline.feed(token)
+        out = [item async for item in pipeline.remaining()]
+        return pipeline, out
+
+    return asyncio.run(main())
+
+
+def text(path):
+    return open(path, encoding="utf-8").read()
+
+
+def test_segments_come_back_in_order(tmp_path, voiced):
+    pipeline, out = run_pipeline(tmp_path, ["A slow one. ", "Second one. Third", " one"])
+    assert [i for i, _ in out] == [0, 1, 2]
+    assert [text(p) for _, p in out] == ["A slow one.", "Second one.", "Third one"]
+    assert pipeline.paths == [p for _, p in out] and pipeline.complete
+
+
+def test_short_sentences_are_merged_up_to_min_chars(tmp_path, voiced):
+    _, out = run_pipeline(tmp_path, ["Hi. Yes. This one is long enough. End."], min_chars=20)
+    assert [text(p) for _, p in out] == ["Hi. Yes. This one is long enough.", "End."]
+
+
+def test_a_failed_sentence_marks_the_pipeline_incomplete(tmp_path, voiced):
+    pipeline, out = run_pipeline(tmp_path, ["First one. ", "Then FAIL here. ", "Last one."])
+    assert [i for i, _ in out] == [0, 2]
+    assert pipeline.failed == 1 and not pipeline.complete
+    assert len(pipeline.paths) == 2
+
+
+def test_unspeakable_sentences_are_skipped(tmp_path, voiced):
+    pipeline, out = run_pipeline(tmp_path, ["123. ", "Words here."])
+    assert [text(p) for _, p in out] == ["Words here."] and pipeline.complete
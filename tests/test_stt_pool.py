@@ -0,0 +1,116 @@
+# tests/test_stt_pool.py
+
+import asyncio
+import threading
+
+import pytest
+
+from online.stt import pool as stt
+from online.stt.pool import STTPool, STTBusy
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Workers load a stand-in model and block on the gate while transcribing."""
+    gate = threading.Event()
+
+    def transcribe(samples, model, language):
+        gate.wait(5)
+        if samples == "bad":
+            raise RuntimeError("undecodable")
+        return f"{model}:{language}:{samples}"
+
+    monkeypatch.setattr(stt, "load_model", lambda **kwargs: kwargs.get("model_size_or_path", "model"))
+    monkeypatch.setattr(stt, "transcribe", transcribe)
+    yield gate
+    gate.set()
+
+
+def test_jobs_run_on_the_worker_model(gate):
+    async def main():
+        pool = STTPool(language="ar", model_kwargs={"model_size_or_path": "tiny"})
+        gate.set()
+        try:
+            return await asyncio.gather(pool.transcribe("one"), pool.transcribe("two")), pool.stats()
+        finally:
+            pool.shutdown()
+
+    texts, stats = asyncio.run(main())
+    assert texts == ["tiny:ar:one", "tiny:ar:two"]
+    assert stats["completed"] == 2 and stats["run_ms"]["max"] is not None
+
+
+def test_full_queue_rejects_with_retry_after(gate):
+    async def main():
+        pool = STTPool(workers=1, queue_size=1, retry_after=7)
+        try:
+            running = asyncio.ensure_future(pool.transcribe("running"))
+            await asyncio.sleep(0.05)          # picked up by the worker
+            queued = asyncio.ensure_future(pool.transcribe("queued"))
+            await asyncio.sleep(0)
+            with pytest.raises(STTBusy) as busy:
+                await pool.transcribe("rejected")
+            stats = pool.stats()
+            gate.set()
+            return busy.value.retry_after, stats, await running, await queued
+        finally:
+            pool.shutdown()
+
+    retry_after, stats, running, queued = asyncio.run(main())
+    assert retry_after == 7
+    assert stats["rejected"] == 1 and stats["busy"] == 1 and stats["queue_depth"] == 1
+    assert (running, queued) == ("model:en:running", "model:en:queued")
+
+
+def test_check_does_not_queue_anything(gate):
+    async def main():
+        pool = STTPool(queue_size=1)
+        try:
+            pool.check()
+            pool.check()
+            return pool.stats()
+        finally:
+            pool.shutdown()
+
+    stats = asyncio.run(main())
+    assert stats["queue_depth"] == 0 and stats["rejected"] == 0
+
+
+def test_failures_reach_the_caller_and_the_worker_carries_on(gate):
+    async def main():
+        pool = STTPool()
+        gate.set()
+        try:
+            with pytest.raises(RuntimeError):
+                await pool.transcribe("bad")
+            return await pool.transcribe("fine"), pool.stats()
+        finally:
+            pool.shutdown()
+
+    text, stats = asyncio.run(main())
+    assert text == "model:en:fine" and stats["failed"] == 1 and stats["completed"] == 1
+
+
+def test_caller_that_left_the_queue_is_skipped(gate):
+    async def main():
+        pool = STTPool(queue_size=2)
+        try:
+            running = asyncio.ensure_future(pool.transcribe("running"))
+            await asyncio.sleep(0.05)
+            gone = asyncio.ensure_future(pool.transcribe("gone"))
+            await asyncio.sleep(0)
+            gone.cancel()
+            gate.set()
+            await running
+            await asyncio.sleep(0.05)
+            return pool.stats()
+        finally:
+            pool.shutdown()
+
+    stats = asyncio.run(main())
+    assert stats["completed"] == 1 and stats["failed"] == 0
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        STTPool(mode="fiber")
@@ -0,0 +1,46 @@
+# tests/test_titles.py
+
+import asyncio
+import json
+
+from online.llm.titles import SessionTitler, title_state_path
+
+SID = "0123456789abcdef"
+
+
+def session(tmp_path, *texts):
+    path = tmp_path / f"{SID}.json"
+    turns = [{"role": "user" if i % 2 == 0 else "assistant", "text": t} for i, t in enumerate(texts)]
+    path.write_text(json.dumps(turns), encoding="utf-8")
+    return str(path)
+
+
+def refresh(titler, path, name=None, force=False):
+    return asyncio.run(titler.refresh(path, name, force=force))
+
+
+def test_short_sessions_are_only_titled_when_forced(tmp_path):
+    path = session(tmp_path, "What is a neuron?")
+    titler = SessionTitler(min_messages=3)
+    assert refresh(titler, path) is None
+    assert refresh(titler, path, force=True)
+
+
+def test_a_renamed_session_keeps_its_name_unless_forced(tmp_path):
+    path = session(tmp_path, "What is a neuron?", "A cell.", "And a synapse?")
+    titler = SessionTitler(min_messages=3)
+    assert refresh(titler, path, name="My biology notes") is None
+    assert refresh(titler, path, name="My biology notes", force=True)
+
+
+def test_first_title_is_recorded_and_not_redone_until_due(tmp_path):
+    path = session(tmp_path, "What is a neuron?", "A cell.", "And a synapse?")
+    titler = SessionTitler(min_messages=3, recheck_every=4)
+    title = refresh(titler, path, name=SID[:8])
+    assert title
+    assert json.loads(open(title_state_path(path), encoding="utf-8").read())["title"] == title
+    assert refresh(titler, path, name=title) is None
+
+
+def test_empty_session_gets_no_title_even_when_forced(tmp_path):
+    assert refresh(SessionTitler(), session(tmp_path), force=True) is None
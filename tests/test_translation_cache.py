@@ -0,0 +1,72 @@
+# tests/test_translation_cache.py
+
+import os
+import time
+
+from online.llm.translation_cache import INDEX_FILE, TranslationCache, translation_key
+
+
+def cache(path, **kwargs):
+    return TranslationCache(str(path), **{"flush_interval": 60, **kwargs})
+
+
+def test_hits_by_text_and_target(tmp_path):
+    c = cache(tmp_path)
+    c.put("Hello there", "ar", "مرحبا")
+    assert c.get("  Hello there ", "ar")["translation"] == "مرحبا"
+    assert c.get("Hello there", "en") is None
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 1
+
+
+def test_key_ignores_surrounding_whitespace():
+    assert translation_key(" a ", "ar") == translation_key("a", "ar") != translation_key("a", "en")
+
+
+def test_put_does_not_write_the_index(tmp_path):
+    cache(tmp_path).put("a", "ar", "b")
+    assert not os.path.exists(tmp_path / INDEX_FILE)
+
+
+def test_save_round_trips(tmp_path):
+    c = cache(tmp_path)
+    c.put("a", "ar", "b")
+    c.save()
+    assert cache(tmp_path).get("a", "ar")["translation"] == "b"
+
+
+def test_changes_are_written_back_in_the_background(tmp_path):
+    cache(tmp_path, flush_interval=0.05).put("a", "ar", "b")
+    deadline = time.time() + 5
+    while not os.path.exists(tmp_path / INDEX_FILE) and time.time() < deadline:
+        time.sleep(0.02)
+    assert cache(tmp_path).stats()["size"] == 1
+
+
+def test_audio_is_kept_and_evicted_with_its_entry(tmp_path):
+    audio = tmp_path / "out.mp3"
+    audio.write_bytes(b"mp3")
+    c = cache(tmp_path / "cache", max_entries=1)
+    first = c.put("one", "ar", "واحد", str(audio))
+    path = c.audio_path(first)
+    assert open(path, "rb").read() == b"mp3"
+    time.sleep(0.01)
+    c.put("two", "ar", "اثنان")
+    assert not os.path.exists(path)
+    assert c.get("one", "ar") is None and c.stats()["size"] == 1
+
+
+def test_missing_audio_file_is_reported_as_none(tmp_path):
+    audio = tmp_path / "out.mp3"
+    audio.write_bytes(b"mp3")
+    c = cache(tmp_path / "cache")
+    entry = c.put("one", "ar", "واحد", str(audio))
+    os.remove(c.audio_path(entry))
+    assert c.audio_path(entry) is None
+
+
+def test_expired_entries_are_dropped_on_load(tmp_path):
+    c = cache(tmp_path, ttl=0.01)
+    c.put("a", "ar", "b")
+    c.save()
+    time.sleep(0.05)
+    assert cache(tmp_path, ttl=0.01).stats()["size"] == 0
@@ -0,0 +1,84 @@
+# tests/test_tts_router.py
+
+import asyncio
+
+import pytest
+
+from online.tts.backends import StubBackend, TTSRouter, create_router
+
+
+class NamedStub(StubBackend):
+    def __init__(self, name, fail=False, **kwargs):
+        super().__init__(**kwargs)
+        self.name, self.fail, self.calls = name, fail, 0
+
+    async def render(self, text, lang):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return await super().render(text, lang)
+
+
+def render(router, lang="en"):
+    return asyncio.run(router.render("hello there", lang))
+
+
+def test_backends_are_tried_in_chain_order():
+    first, second = NamedStub("first"), NamedStub("second")
+    data, fmt, voice, _ = render(TTSRouter({"en": [first, second]}, budget=1))
+    assert data.startswith(b"RIFF") and fmt == "wav" and voice == "stub:en"
+    assert (first.calls, second.calls) == (1, 0)
+
+
+def test_a_failing_backend_hands_over_and_is_demoted():
+    broken, backup = NamedStub("broken", fail=True), NamedStub("backup")
+    router = TTSRouter({"en": [broken, backup]}, budget=1, cooldown=60)
+    render(router)
+    assert (broken.calls, backup.calls) == (1, 1)
+    assert router.preferred("en") is backup
+    render(router)
+    assert (broken.calls, backup.calls) == (1, 2)
+    stats = router.stats()
+    assert stats["chains"]["en"] == ["backup", "broken"]
+    assert stats["backends"]["broken"]["failures"] == 1 and stats["backends"]["broken"]["demoted"]
+
+
+def test_a_backend_over_budget_times_out_to_the_next():
+    slow, fast = NamedStub("slow", delay=0.5), NamedStub("fast")
+    router = TTSRouter({"en": [slow, fast]}, budget=0.05, cooldown=60)
+    render(router)
+    assert router.stats()["backends"]["slow"]["timeouts"] == 1
+    assert router.preferred("en") is fast
+
+
+def test_the_last_backend_is_always_waited_for():
+    slow = NamedStub("slow", delay=0.1)
+    router = TTSRouter({"en": [slow]}, budget=0.01)
+    assert render(router)[0].startswith(b"RIFF")
+    # slower than the budget on average: demoted, but still the only choice
+    assert router.stats()["backends"]["slow"]["demoted"]
+
+
+def test_demotion_ends_after_the_cooldown():
+    broken, backup = NamedStub("broken", fail=True), NamedStub("backup")
+    router = TTSRouter({"en": [broken, backup]}, budget=1, cooldown=0)
+    render(router)
+    assert router.preferred("en") is broken
+
+
+def test_last_backend_errors_propagate():
+    with pytest.raises(RuntimeError):
+        render(TTSRouter({"en": [NamedStub("only", fail=True)]}))
+
+
+def test_other_languages_fall_back_to_the_english_chain():
+    stub = NamedStub("stub")
+    assert render(TTSRouter({"en": [stub]}), lang="ar")[2] == "stub:ar"
+
+
+def test_create_router_builds_chains_from_config():
+    router = create_router({"backends": {"en": ["stub"], "ar": "stub"}, "backend_options": {"stub": {"delay": 0}}})
+    assert router.stats()["chains"] == {"en": ["stub"], "ar": ["stub"]}
+    assert router.chains["en"][0] is router.chains["ar"][0]
+    with pytest.raises(ValueError):
+        create_router({"backends": {"en": ["nope"]}})
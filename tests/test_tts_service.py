@@ -0,0 +1,56 @@
+# tests/test_tts_service.py
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydub")  # tts_service transcodes through pydub
+
+from online.tts import tts_service
+from online.tts.backends import StubBackend, TTSRouter
+
+ARABIC = "الجملة الأولى طويلة بما يكفي. الجملة الثانية تفشل هنا. الجملة الثالثة تعمل."
+
+
+class Voice(StubBackend):
+    def __init__(self, name, lang, fail_on=None):
+        super().__init__()
+        self.name, self.lang, self.fail_on, self.rendered = name, lang, fail_on, []
+
+    def voice(self, lang):
+        return f"{self.name}:{self.lang}", "+0%"
+
+    async def render(self, text, lang):
+        if self.fail_on and self.fail_on in text:
+            raise RuntimeError("no voice for this sentence")
+        self.rendered.append(text)
+        return await super().render(text, lang)
+
+
+@pytest.fixture
+def segmented(monkeypatch):
+    written = []
+    monkeypatch.setattr(tts_service, "PARALLEL_MIN_CHARS", 10)
+    monkeypatch.setattr(tts_service, "SEGMENT_CHARS", 10)
+    monkeypatch.setattr(tts_service, "SEGMENT_RETRIES", 0)
+    monkeypatch.setattr(tts_service, "_write_audio", lambda parts, path, fmt: written.extend(parts))
+    return written
+
+
+def synth(router, monkeypatch, text):
+    monkeypatch.setattr(tts_service, "_router", router)
+    return asyncio.run(tts_service._synth_mixed(text, "unused.wav", "wav"))
+
+
+def test_one_failed_arabic_segment_voices_the_whole_text_in_english(segmented, monkeypatch):
+    arabic, english = Voice("ar-voice", "ar", fail_on="تفشل"), Voice("en-voice", "en")
+    voice = synth(TTSRouter({"ar": [arabic], "en": [english]}), monkeypatch, ARABIC)
+    assert voice == ("en-voice:en", "+0%")
+    assert len(english.rendered) == len(segmented) == 3
+
+
+def test_segments_keep_the_preferred_voice_when_all_succeed(segmented, monkeypatch):
+    arabic, english = Voice("ar-voice", "ar"), Voice("en-voice", "en")
+    voice = synth(TTSRouter({"ar": [arabic], "en": [english]}), monkeypatch, ARABIC)
+    assert voice == ("ar-voice:ar", "+0%")
+    assert len(arabic.rendered) == 3 and english.rendered == []